@@ -1,47 +1,75 @@
 import os
+import tempfile
 from flask import render_template, send_from_directory, jsonify, request, send_file
 from CTFd.models import db, Users
 from CTFd.utils.decorators import admins_only, authed_only
 from CTFd.utils.user import get_current_user, is_admin
 from CTFd.plugins import bypass_csrf_protection
 from .models import MarkingSubmission, MarkingAssignmentHelper, MarkingTutor, MarkingDeadline, StudentReport, SubmissionToken, MarkableExercise, MarkingCategoryRelease
-from .utils.report_generator import generate_and_send_student_report, generate_weekly_reports, get_available_categories
-from .utils.pdf_generator import generate_student_report_pdf
+from .utils.report_generator import generate_and_send_student_report, generate_weekly_reports, get_available_categories, _report_view_args, start_category_prerender
+from .utils.report_cache import get_report_cache
+from .utils.latest_attempts import latest_attempt_filter
+from .utils.grades import load_markable_map, summarize_marks, cached_student_marks, invalidate_student_marks, invalidate_all_marks
+from .utils.timeseries import invalidate_timeseries, invalidate_timeseries_at
 from datetime import datetime
 
 def load(app):
+    def _env_int(name, default):
+        try:
+            return int(os.getenv(name) or default)
+        except ValueError:
+            app.logger.warning(f"Ignoring non-integer {name}={os.getenv(name)!r}, using {default}")
+            return default
+
+    def _env_float(name, default):
+        try:
+            return float(os.getenv(name) or default)
+        except ValueError:
+            app.logger.warning(f"Ignoring non-numeric {name}={os.getenv(name)!r}, using {default}")
+            return default
+
     # Load automarker secret from environment
     app.config['MARKING_HUB_AUTOMARKER_SECRET'] = os.getenv('MARKING_HUB_AUTOMARKER_SECRET')
+    # Issue stateless (signed, unstored) submission tokens by default
+    app.config['MARKING_HUB_STATELESS_TOKENS'] = os.getenv('MARKING_HUB_STATELESS_TOKENS', '').lower() in ('1', 'true', 'yes')
+    # Worker processes used to render PDFs during bulk report runs (opt-in;
+    # 0/1 = in the request process)
+    app.config['MARKING_HUB_PDF_WORKERS'] = max(_env_int('MARKING_HUB_PDF_WORKERS', 1), 0)
+    # Persistent SMTP sessions and send cap (per minute, 0 = none) for bulk report emails
+    app.config['MARKING_HUB_SMTP_CONNECTIONS'] = _env_int('MARKING_HUB_SMTP_CONNECTIONS', 2)
+    app.config['MARKING_HUB_MAIL_RATE_PER_MINUTE'] = _env_int('MARKING_HUB_MAIL_RATE_PER_MINUTE', 0)
+    # On-disk cache of rendered report PDFs, shared by workers on the same host
+    app.config['MARKING_HUB_REPORT_CACHE_DIR'] = os.getenv('MARKING_HUB_REPORT_CACHE_DIR') or os.path.join(
+        tempfile.gettempdir(), 'marking_hub_reports'
+    )
+    app.config['MARKING_HUB_REPORT_CACHE_MAX_BYTES'] = _env_int('MARKING_HUB_REPORT_CACHE_MAX_MB', 256) * 1024 * 1024
+    # Used/expired submission tokens are kept this long, and swept at most
+    # once per interval (seconds, 0 = only on demand)
+    app.config['MARKING_HUB_TOKEN_RETENTION_HOURS'] = _env_float('MARKING_HUB_TOKEN_RETENTION_HOURS', 7 * 24)
+    app.config['MARKING_HUB_TOKEN_COMPACTION_INTERVAL'] = _env_int('MARKING_HUB_TOKEN_COMPACTION_INTERVAL', 60 * 60)
+    # Queue on-behalf submissions for a background worker (202 + ticket) by default
+    app.config['MARKING_HUB_ASYNC_SUBMISSIONS'] = os.getenv('MARKING_HUB_ASYNC_SUBMISSIONS', '').lower() in ('1', 'true', 'yes')
+    # Token-bucket limits for the automarker endpoints (requests/second per
+    # client, 0 = unlimited), keyed by "client" IP or presented "secret";
+    # "local" buckets are per worker, "cache" shares them through CTFd's cache
+    app.config['MARKING_HUB_RATE_LIMIT'] = _env_float('MARKING_HUB_RATE_LIMIT', 20)
+    app.config['MARKING_HUB_RATE_LIMIT_BURST'] = _env_int('MARKING_HUB_RATE_LIMIT_BURST', 40)
+    app.config['MARKING_HUB_RATE_LIMIT_KEY'] = (os.getenv('MARKING_HUB_RATE_LIMIT_KEY') or 'client').lower()
+    app.config['MARKING_HUB_RATE_LIMIT_BACKEND'] = (os.getenv('MARKING_HUB_RATE_LIMIT_BACKEND') or 'local').lower()
+    # Submissions are refused while this many async submissions are pending (0 = never)
+    app.config['MARKING_HUB_MAX_QUEUE_DEPTH'] = _env_int('MARKING_HUB_MAX_QUEUE_DEPTH', 10000)
+    app.config['MARKING_HUB_OVERLOAD_RETRY_AFTER'] = _env_int('MARKING_HUB_OVERLOAD_RETRY_AFTER', 30)
     
-    # Create tables if they don't exist
     with app.app_context():
-        db.create_all()
-        # fix any legacy submissions with NULL type discriminator so future
-        # queries don't blow up (see polymorphic discriminator issue)
-        from .utils.report_generator import _cleanup_null_submission_types
-        _cleanup_null_submission_types()
-        # Add weight column to marking_markable_exercises if it doesn't exist yet
-        # (handles databases created before this column was introduced)
+        # Apply pending schema revisions (a single version check once current)
+        from .utils.schema import ensure_schema
         try:
-            with db.engine.connect() as conn:
-                cols = [row[1] for row in conn.execute(
-                    db.text("PRAGMA table_info(marking_markable_exercises)")
-                )]
-                if cols and "weight" not in cols:
-                    conn.execute(db.text(
-                        "ALTER TABLE marking_markable_exercises ADD COLUMN weight FLOAT"
-                    ))
-                    conn.commit()
-        except Exception:
-            # Non-SQLite databases or table doesn't exist yet — db.create_all() handles the latter
-            try:
-                with db.engine.connect() as conn:
-                    conn.execute(db.text(
-                        "ALTER TABLE marking_markable_exercises ADD COLUMN weight FLOAT"
-                    ))
-                    conn.commit()
-            except Exception:
-                pass  # Column already exists or table not yet created
+            ensure_schema()
+        except Exception as e:
+            app.logger.error(f"Marking hub schema migration failed: {str(e)}")
+        # Recompile cached flag matchers whenever flags are edited
+        from .utils.flags import register_flag_listeners
+        register_flag_listeners()
 
     # Custom asset route
     dir_path = os.path.dirname(os.path.realpath(__file__))
@@ -190,6 +218,7 @@ def load(app):
             except Exception:
                 return jsonify({'message': 'Invalid mark value'}), 400
 
+        previous_marked_at = submission.marked_at
         submission.mark = mark_percent
         submission.comment = data.get('comment')
         submission.marked_at = datetime.utcnow()
@@ -197,6 +226,17 @@ def load(app):
 
         db.session.commit()
 
+        invalidate_student_marks([submission.submission.user_id])
+        # The re-mark leaves the bucket of its previous marked_at
+        invalidate_timeseries_at(previous_marked_at, submission.marked_at)
+
+        # Keep the statistics snapshot in step with this mark
+        try:
+            from .utils.statistics_snapshot import refresh_for_marks
+            refresh_for_marks([submission.submission.challenge_id])
+        except Exception as e:
+            app.logger.error(f"Failed to refresh statistics snapshot: {str(e)}")
+
         return jsonify(submission.to_dict())
     
     # API: Sync CTFd submissions to marking table (with auto-mark for TECH)
@@ -258,29 +298,82 @@ def load(app):
                         db.session.add(existing)
 
         db.session.commit()
+
+        from .utils.statistics_snapshot import invalidate_snapshot
+        invalidate_snapshot()
+        invalidate_all_marks()
+        invalidate_timeseries()
         return jsonify({
             "message": f"Synced {synced} new submissions",
             "auto_marked_tech": auto_marked
         })
 
     # API: Generate secure token for submitting on behalf of student
+    def _automarker_auth_error():
+        """Error response unless the request carries the automarker secret."""
+        import hmac
+
+        automarker_secret = app.config.get('MARKING_HUB_AUTOMARKER_SECRET')
+        if not automarker_secret:
+            return jsonify({"message": "Automarker secret not configured on server"}), 500
+
+        provided_secret = request.headers.get('X-Automarker-Secret', '')
+        if not hmac.compare_digest(provided_secret, automarker_secret):
+            return jsonify({"message": "Invalid or missing automarker secret"}), 403
+        return None
+
+    def _admission_error(name, check_queue=False):
+        """429/503 response with Retry-After unless the request is admitted."""
+        import math
+        from CTFd.utils.user import get_ip
+        from .utils.rate_limit import admit, client_key
+
+        client = client_key(app, request.headers.get('X-Automarker-Secret'), get_ip())
+        outcome, wait = admit(app, name, client, check_queue=check_queue)
+        if outcome is None:
+            return None
+        if outcome == "overloaded":
+            response = jsonify({"message": "Submission queue is full, try again later"})
+            response.status_code = 503
+        else:
+            response = jsonify({"message": "Rate limit exceeded"})
+            response.status_code = 429
+        response.headers["Retry-After"] = str(max(1, math.ceil(wait)))
+        return response
+
+    # API: Automarker admission limits, rejection counters and queue depth
+    @app.route("/api/marking_hub/automarker/limits", methods=["GET"])
+    @admins_only
+    def get_automarker_limits():
+        from .utils.rate_limit import counters, current_queue_depth
+
+        return jsonify({
+            "rate": app.config['MARKING_HUB_RATE_LIMIT'],
+            "burst": app.config['MARKING_HUB_RATE_LIMIT_BURST'],
+            "key": app.config['MARKING_HUB_RATE_LIMIT_KEY'],
+            "backend": app.config['MARKING_HUB_RATE_LIMIT_BACKEND'],
+            "maxQueueDepth": app.config['MARKING_HUB_MAX_QUEUE_DEPTH'],
+            "queueDepth": current_queue_depth(),
+            "pid": os.getpid(),
+            "counters": counters(app),
+        })
+
     @app.route("/api/marking_hub/submissions/generate-token", methods=["POST"])
     @bypass_csrf_protection
     def generate_submission_token():
-        import hmac
-        import hashlib
         import secrets
         from datetime import timedelta
         from .models import SubmissionToken
+        from .utils.submission_tokens import stateless_token, token_hash as make_token_hash
         
+        admission_error = _admission_error("tokens")
+        if admission_error:
+            return admission_error
+
         # Validate automarker secret header
-        automarker_secret = app.config.get('MARKING_HUB_AUTOMARKER_SECRET')
-        if not automarker_secret:
-            return jsonify({"message": "Automarker secret not configured on server"}), 500
-        
-        provided_secret = request.headers.get('X-Automarker-Secret', '')
-        if not hmac.compare_digest(provided_secret, automarker_secret):
-            return jsonify({"message": "Invalid or missing automarker secret"}), 403
+        auth_error = _automarker_auth_error()
+        if auth_error:
+            return auth_error
         
         data = request.get_json() or {}
         user_id = data.get("user_id")
@@ -295,38 +388,40 @@ def load(app):
         user = Users.query.filter_by(id=user_id).first_or_404()
         challenge = Challenges.query.filter_by(id=challenge_id).first_or_404()
 
+        # Create expiration timestamp
+        expires_at = datetime.utcnow() + timedelta(hours=expires_in_hours)
+
+        # Stateless tokens carry their own claims and are not stored
+        stateless = bool(data.get("stateless", app.config.get('MARKING_HUB_STATELESS_TOKENS')))
+
         # Generate random token
-        random_token = secrets.token_urlsafe(32)
+        if stateless:
+            random_token = stateless_token(user_id, challenge_id, expires_at)
+        else:
+            random_token = secrets.token_urlsafe(32)
         
         # Create HMAC hash (this is what the client will send back)
         # Use automarker secret key for signing (must be stable)
         secret = app.config.get('MARKING_HUB_AUTOMARKER_SECRET')
-        if not secret:
-            return jsonify({"message": "Automarker secret not configured on server"}), 500
-        secret_bytes = secret.encode() if isinstance(secret, str) else secret
-        token_hash = hmac.new(
-            secret_bytes,
-            f"{user_id}:{challenge_id}:{random_token}".encode(),
-            hashlib.sha256
-        ).hexdigest()
-
-        # Create expiration timestamp
-        expires_at = datetime.utcnow() + timedelta(hours=expires_in_hours)
-
-        submission_token = SubmissionToken(
-            user_id=user_id,
-            challenge_id=challenge_id,
-            token_hash=token_hash,
-            created_by=None,  # System-generated token, not tied to a specific admin user
-            expires_at=expires_at
-        )
+        token_hash = make_token_hash(secret, user_id, challenge_id, random_token)
+
+        submission_token = None
+        if not stateless:
+            submission_token = SubmissionToken(
+                user_id=user_id,
+                challenge_id=challenge_id,
+                token_hash=token_hash,
+                created_by=None,  # System-generated token, not tied to a specific admin user
+                expires_at=expires_at
+            )
 
-        db.session.add(submission_token)
-        db.session.commit()
+            db.session.add(submission_token)
+            db.session.commit()
+            _schedule_token_compaction()
 
         return jsonify({
             "token": random_token,
-            "token_id": submission_token.id,
+            "token_id": submission_token.id if submission_token else None,
             "user_id": user_id,
             "user_name": user.name,
             "challenge_id": challenge_id,
@@ -335,14 +430,105 @@ def load(app):
             "expires_at": expires_at.strftime("%Y-%m-%d %H:%M:%S")
         })
 
+    def _schedule_token_compaction():
+        # Issuance is what grows the token table, so it also drives the sweep
+        from .utils.token_retention import start_token_compaction
+        try:
+            start_token_compaction(app)
+        except Exception as e:
+            app.logger.warning(f"Could not schedule token compaction: {str(e)}")
+
+    # API: Submission token table size and the last compaction
+    @app.route("/api/marking_hub/submissions/tokens/retention", methods=["GET"])
+    @admins_only
+    def get_token_retention():
+        from .utils.token_retention import last_compaction, token_table_stats
+
+        return jsonify({
+            "retentionHours": app.config['MARKING_HUB_TOKEN_RETENTION_HOURS'],
+            "compactionInterval": app.config['MARKING_HUB_TOKEN_COMPACTION_INTERVAL'],
+            "table": token_table_stats(),
+            "lastCompaction": last_compaction(),
+        })
+
+    # API: Start a submission token compaction now
+    @app.route("/api/marking_hub/submissions/tokens/compact", methods=["POST"])
+    @admins_only
+    def compact_submission_tokens():
+        from .utils.token_retention import start_token_compaction
+
+        start_token_compaction(app, force=True)
+        return jsonify({"success": True, "message": "Token compaction started"}), 202
+
+    # API: Generate tokens for many (student, challenge) pairs at once
+    @app.route("/api/marking_hub/submissions/generate-tokens", methods=["POST"])
+    @bypass_csrf_protection
+    def generate_submission_tokens():
+        from .utils.submission_tokens import MAX_BULK_TOKENS, issue_tokens
+
+        admission_error = _admission_error("tokens")
+        if admission_error:
+            return admission_error
+
+        auth_error = _automarker_auth_error()
+        if auth_error:
+            return auth_error
+
+        data = request.get_json(silent=True) or {}
+        items = data.get("items")
+        expires_in_hours = data.get("expires_in_hours", 24)
+        if not isinstance(items, list) or not items:
+            return jsonify({"message": "items must be a non-empty list of {user_id, challenge_id}"}), 400
+        if len(items) > MAX_BULK_TOKENS:
+            return jsonify({"message": f"At most {MAX_BULK_TOKENS} tokens per request"}), 400
+        try:
+            expires_in_hours = float(expires_in_hours)
+        except (TypeError, ValueError):
+            return jsonify({"message": "expires_in_hours must be a number"}), 400
+
+        pairs = []
+        for item in items:
+            try:
+                pairs.append((int(item["user_id"]), int(item["challenge_id"])))
+            except (KeyError, TypeError, ValueError):
+                return jsonify({"message": "Each item needs integer user_id and challenge_id"}), 400
+
+        try:
+            issued, errors = issue_tokens(
+                app.config['MARKING_HUB_AUTOMARKER_SECRET'], pairs, expires_in_hours,
+                stateless=bool(data.get("stateless", app.config.get('MARKING_HUB_STATELESS_TOKENS'))),
+            )
+        except Exception as e:
+            app.logger.error(f"Error issuing submission tokens: {str(e)}")
+            return jsonify({"message": f"Failed to issue tokens: {str(e)}"}), 500
+        if any(entry["token_id"] is not None for entry in issued):
+            _schedule_token_compaction()
+
+        return jsonify({
+            "success": True,
+            "issued": len(issued),
+            "failed": len(errors),
+            "tokens": issued,
+            "errors": errors,
+        })
+
     # API: Post submission on behalf of student using secure token
     @app.route("/api/marking_hub/submissions/on-behalf-of", methods=["POST"])
     @bypass_csrf_protection
     def post_submission_on_behalf():
         import hmac
-        import hashlib
         from .models import SubmissionToken
+        from .utils.submission_tokens import (
+            consume_nonce,
+            is_stateless_token,
+            stateless_claims,
+            token_hash as make_token_hash,
+        )
         from CTFd.models import Submissions, Users, Challenges, Teams
+
+        admission_error = _admission_error("submissions", check_queue=True)
+        if admission_error:
+            return admission_error
         
         data = request.get_json() or {}
         user_id = data.get("user_id")
@@ -361,86 +547,99 @@ def load(app):
         if not provided_flag:
             return jsonify({"message": "flag cannot be empty"}), 400
 
+        # JSON clients may send the ids as strings ("5"); the batch endpoint
+        # coerces them the same way before hashing
+        try:
+            user_id, challenge_id = int(user_id), int(challenge_id)
+        except (TypeError, ValueError):
+            return jsonify({"message": "user_id and challenge_id must be integers"}), 400
+
         # Verify the token
         secret = app.config.get('MARKING_HUB_AUTOMARKER_SECRET')
         if not secret:
             return jsonify({"message": "Automarker secret not configured on server"}), 500
-        secret_bytes = secret.encode() if isinstance(secret, str) else secret
-        expected_hash = hmac.new(
-            secret_bytes,
-            f"{user_id}:{challenge_id}:{token}".encode(),
-            hashlib.sha256
-        ).hexdigest()
+        expected_hash = make_token_hash(secret, user_id, challenge_id, token)
 
         if not hmac.compare_digest(expected_hash, token_hash):
             return jsonify({"message": "Invalid security hash"}), 403
 
-        # Find and validate the token
-        submission_token = SubmissionToken.query.filter_by(
-            user_id=user_id,
-            challenge_id=challenge_id,
-            token_hash=token_hash
-        ).first()
+        # The query parameter wins over the body; strings ("false", "0") are
+        # parsed the same way in both
+        run_async = request.args.get("async", data.get("async"))
+        if run_async is None:
+            run_async = app.config.get('MARKING_HUB_ASYNC_SUBMISSIONS')
+        elif isinstance(run_async, str):
+            run_async = run_async.lower() in {"1", "true", "yes"}
+        if run_async:
+            # Only the HMAC is checked here; the queue worker does the rest
+            from .utils.submission_queue import enqueue, ensure_queue_worker
+            try:
+                item = enqueue(user_id, challenge_id, flag, str(token), expected_hash)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Error queueing submission for user {user_id}: {str(e)}")
+                return jsonify({"message": f"Failed to queue submission: {str(e)}"}), 500
+            ensure_queue_worker(app)
+            return jsonify({
+                "success": True,
+                "ticket": item.ticket,
+                "status": item.status,
+                "status_url": f"/api/marking_hub/submissions/queue?ticket={item.ticket}",
+            }), 202
+
+        submission_token = None
+        claim = None
+        if is_stateless_token(token):
+            # Stateless token: the verified hash signs its claims
+            claim, error = stateless_claims(token, user_id, challenge_id)
+            if error:
+                return jsonify({"message": error}), 404 if error == "Token not found or invalid" else 403
+        else:
+            # Find and validate the token
+            submission_token = SubmissionToken.query.filter_by(
+                user_id=user_id,
+                challenge_id=challenge_id,
+                token_hash=token_hash
+            ).first()
 
-        if not submission_token:
-            return jsonify({"message": "Token not found or invalid"}), 404
+            if not submission_token:
+                return jsonify({"message": "Token not found or invalid"}), 404
 
-        # Check if token is already used
-        if submission_token.used:
-            return jsonify({"message": "Token already used"}), 403
+            # Check if token is already used
+            if submission_token.used:
+                return jsonify({"message": "Token already used"}), 403
 
-        # Check if token is expired
-        if submission_token.expires_at < datetime.utcnow():
-            return jsonify({"message": "Token expired"}), 403
+            # Check if token is expired
+            if submission_token.expires_at < datetime.utcnow():
+                return jsonify({"message": "Token expired"}), 403
 
         # Verify user and challenge exist
         user = Users.query.filter_by(id=user_id).first_or_404()
         challenge = Challenges.query.filter_by(id=challenge_id).first_or_404()
 
-        try:
-            # Auto-evaluate the flag by checking against challenge flags
+        # Record a stateless token's nonce before anything else is written
+        if claim and not consume_nonce(*claim):
+            return jsonify({"message": "Token already used"}), 403
+
+        # Spend a stored token before anything else is written; a concurrent
+        # request that already spent it leaves no unused row to update
+        if submission_token is not None:
+            from .utils.submission_tokens import spend_tokens
             try:
-                import re
-                from CTFd.models import Flags
-                # Get all valid flags for this challenge
-                challenge_flags = Flags.query.filter_by(challenge_id=challenge_id).all()
-                is_correct = False
+                if spend_tokens([submission_token.id], datetime.utcnow()):
+                    db.session.rollback()
+                    return jsonify({"message": "Token already used"}), 403
+            except Exception:
+                db.session.rollback()
+                raise
 
-                app.logger.info(f"Validating flag for challenge {challenge_id}: '{provided_flag}'")
-                app.logger.info(f"Found {len(challenge_flags)} flags for challenge")
-
-                if challenge_flags:
-                    for challenge_flag in challenge_flags:
-                        # Log all attributes to understand the data structure
-                        flag_content = getattr(challenge_flag, 'content', None)  # CTFd uses 'content' attribute
-                        flag_type = getattr(challenge_flag, 'type', 'static')
-
-                        app.logger.info(f"Flag content: '{flag_content}', Type: {flag_type}")
-
-                        if not flag_content:
-                            continue
-
-                        # Handle different flag types
-                        if flag_type == 'regex':
-                            # Regex flag matching
-                            try:
-                                if re.match(flag_content, provided_flag):
-                                    app.logger.info("Flag matched regex pattern")
-                                    is_correct = True
-                                    break
-                            except re.error as e:
-                                app.logger.error(f"Invalid regex pattern: {str(e)}")
-                                continue
-                        else:
-                            # Literal flag matching (case-insensitive, trimmed)
-                            if flag_content.strip().lower() == provided_flag.lower():
-                                app.logger.info("Flag matched literal pattern")
-                                is_correct = True
-                                break
-
-                app.logger.info(f"Final result: correct={is_correct}")
+        try:
+            # Auto-evaluate the flag against the challenge's compiled flags
+            try:
+                from .utils.flags import get_flag_matchers
+                is_correct = get_flag_matchers([challenge_id])[challenge_id].matches(provided_flag)
             except Exception as e:
-                app.logger.error(f"Error validating flag: {str(e)}")
+                app.logger.error(f"Error validating flag for challenge {challenge_id}: {str(e)}")
                 import traceback
                 app.logger.error(traceback.format_exc())
                 is_correct = False
@@ -485,11 +684,14 @@ def load(app):
 
             db.session.add(marking_sub)
 
-            # Mark token as used
-            submission_token.used = True
-            submission_token.used_at = datetime.utcnow()
-
             db.session.commit()
+            invalidate_student_marks([user_id])
+            invalidate_timeseries_at(submission.date)
+            try:
+                from .utils.statistics_snapshot import refresh_for_marks
+                refresh_for_marks([challenge_id])
+            except Exception as e:
+                app.logger.error(f"Failed to refresh statistics snapshot: {str(e)}")
 
             return jsonify({
                 "success": True,
@@ -511,6 +713,65 @@ def load(app):
             return jsonify({"message": f"Failed to submit: {str(e)}"}), 500
 
 
+    # API: Outcome of queued submissions and the queue depth
+    @app.route("/api/marking_hub/submissions/queue", methods=["GET"])
+    def get_submission_queue_status():
+        from .utils.submission_queue import MAX_STATUS_TICKETS, ensure_queue_worker, queue_depth, ticket_status
+
+        if not is_admin():
+            auth_error = _automarker_auth_error()
+            if auth_error:
+                return auth_error
+
+        tickets = request.args.getlist("ticket")
+        if len(tickets) > MAX_STATUS_TICKETS:
+            return jsonify({"message": f"At most {MAX_STATUS_TICKETS} tickets per request"}), 400
+
+        ensure_queue_worker(app)
+        return jsonify({
+            "depth": queue_depth(),
+            "tickets": ticket_status(tickets) if tickets else [],
+        })
+
+    # API: Post many on-behalf submissions in one transaction
+    @app.route("/api/marking_hub/submissions/on-behalf-of/batch", methods=["POST"])
+    @bypass_csrf_protection
+    def post_submissions_on_behalf_batch():
+        from .utils.submission_tokens import MAX_BATCH_SUBMISSIONS, submit_on_behalf_batch
+
+        admission_error = _admission_error("submissions", check_queue=True)
+        if admission_error:
+            return admission_error
+
+        data = request.get_json(silent=True) or {}
+        items = data.get("items")
+        if not isinstance(items, list) or not items:
+            return jsonify({"message": "items must be a non-empty list"}), 400
+        if len(items) > MAX_BATCH_SUBMISSIONS:
+            return jsonify({"message": f"At most {MAX_BATCH_SUBMISSIONS} submissions per request"}), 400
+
+        secret = app.config.get('MARKING_HUB_AUTOMARKER_SECRET')
+        if not secret:
+            return jsonify({"message": "Automarker secret not configured on server"}), 500
+
+        try:
+            results = submit_on_behalf_batch(secret, items)
+        except Exception as e:
+            import traceback
+            app.logger.error(f"Error posting batch submissions: {str(e)}")
+            app.logger.error(traceback.format_exc())
+            return jsonify({"message": f"Failed to submit: {str(e)}"}), 500
+
+        accepted = [result for result in results if result["success"]]
+        invalidate_student_marks({result["user_id"] for result in accepted})
+        return jsonify({
+            "success": True,
+            "submitted": len(accepted),
+            "failed": len(results) - len(accepted),
+            "results": results,
+        })
+
+
     # API: Get all tutor assignments (many-to-many)
     @app.route("/api/marking_hub/assignments", methods=["GET"])
     @admins_only
@@ -655,6 +916,9 @@ def load(app):
         tutor = MarkingTutor(user_id=user.id)
         db.session.add(tutor)
         db.session.commit()
+
+        from .utils.statistics_snapshot import invalidate_snapshot
+        invalidate_snapshot()
         return jsonify(tutor.to_dict())
 
     # API: Remove tutor
@@ -666,6 +930,9 @@ def load(app):
         if tutor:
             db.session.delete(tutor)
             db.session.commit()
+
+            from .utils.statistics_snapshot import invalidate_snapshot
+            invalidate_snapshot()
         return jsonify({"message": "Tutor removed"})
 
     # API: Check current tutor status
@@ -747,17 +1014,37 @@ def load(app):
         else:
             return jsonify({"success": False, "message": message}), 400
 
+    def _send_report_pdf(report, filename):
+        """
+        Stream a report PDF with Content-Length, ETag and Range support.
+
+        Cached PDFs are sent straight from the cache file; otherwise the
+        rendered buffer is sent without copying it.
+        """
+        source, cache_hit = get_report_cache().get_or_render(report)
+        try:
+            response = send_file(
+                source, mimetype='application/pdf', download_name=filename,
+                conditional=True, max_age=0,
+            )
+        except FileNotFoundError:
+            # Evicted between lookup and send; render this one directly
+            from .utils.pdf_generator import generate_student_report_pdf
+            response = send_file(
+                generate_student_report_pdf(**report), mimetype='application/pdf',
+                download_name=filename, conditional=True, max_age=0,
+            )
+        response.headers['X-Report-Cache'] = 'hit' if cache_hit else 'miss'
+        return response
+
     # API: Download student report as PDF (admin only)
     @app.route("/api/marking_hub/reports/download/<int:user_id>", methods=["GET"])
     @admins_only
     def download_student_report(user_id):
         try:
-            import traceback
-            from io import BytesIO
             from CTFd.models import Users
             from .utils.report_generator import get_student_submissions_for_report
             from CTFd.utils import get_config
-            from flask import request
             
             # Get optional category parameter
             category = request.args.get('category', None)
@@ -765,55 +1052,52 @@ def load(app):
             student = Users.query.get_or_404(user_id)
             submissions = get_student_submissions_for_report(user_id, category=category)
             
-            print(f"[PDF DEBUG] Download for user {user_id}, category={category}: Found {len(submissions)} submissions", flush=True)
-            print(f"[PDF DEBUG] Submissions data: {submissions}", flush=True)
-            
             if not submissions:
                 category_msg = f" for {category}" if category else ""
                 return jsonify({"error": f"No marked submissions for this student{category_msg}"}), 404
             
             ctf_name = get_config('ctf_name', 'CTF')
-            subtitle = f"{category} Report" if category else "Full Performance Report"
-            pdf_buffer = generate_student_report_pdf(
-                student_name=student.name,
-                student_email=student.email,
-                submissions=submissions,
-                ctf_name=ctf_name,
-                subtitle=subtitle
-            )
-            
             filename = f"report_{student.name.replace(' ', '_')}_{category or 'full'}_{datetime.utcnow().strftime('%Y%m%d')}.pdf"
-            
-            print(f"[PDF DEBUG] Creating response for {filename}", flush=True)
-            
-            # Read entire buffer and create response
-            pdf_data = pdf_buffer.read()
-            print(f"[PDF DEBUG] PDF data size: {len(pdf_data)} bytes", flush=True)
-            print(f"[PDF DEBUG] First 20 bytes: {pdf_data[:20]}", flush=True)
-            
-            from flask import make_response
-            response = make_response(pdf_data)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
-            response.headers['Content-Length'] = str(len(pdf_data))
-            print(f"[PDF DEBUG] Response headers set, returning", flush=True)
-            return response
+            return _send_report_pdf(
+                _report_view_args(student.name, student.email, submissions, ctf_name, category),
+                filename,
+            )
         except Exception as e:
             import traceback
             app.logger.error(f"PDF download error for user {user_id}: {str(e)}")
             app.logger.error(traceback.format_exc())
             return jsonify({"error": f"Failed to generate report: {str(e)}", "traceback": traceback.format_exc()}), 500
 
+    # API: Download every student's report for a category as one ZIP (admin only)
+    @app.route("/api/marking_hub/reports/export.zip", methods=["GET"])
+    @admins_only
+    def export_reports_zip():
+        try:
+            from flask import Response, stream_with_context
+            from .utils.report_export import export_reports_zip as build_export
+
+            category = request.args.get('category', None)
+            has_reports, chunks = build_export(category)
+            if not has_reports:
+                category_msg = f" for {category}" if category else ""
+                return jsonify({"error": f"No student reports to export{category_msg}"}), 404
+
+            filename = f"reports_{category or 'full'}_{datetime.utcnow().strftime('%Y%m%d')}.zip"
+            response = Response(stream_with_context(chunks), mimetype='application/zip')
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        except Exception as e:
+            app.logger.error(f"Report export error: {str(e)}")
+            return jsonify({"error": f"Failed to export reports: {str(e)}"}), 500
+
     # API: View own report (students can view their own reports)
     @app.route("/api/marking_hub/reports/view/my-report", methods=["GET"])
     @authed_only
     def view_my_report():
         try:
-            from io import BytesIO
             from CTFd.models import Users
             from .utils.report_generator import get_student_submissions_for_report
             from CTFd.utils import get_config
-            from flask import request
             
             current_user = get_current_user()
             if not current_user:
@@ -831,32 +1115,45 @@ def load(app):
                 return jsonify({"error": f"No marked submissions available yet{category_msg}"}), 404
             
             ctf_name = get_config('ctf_name', 'CTF')
-            subtitle = f"{category} Report" if category else "Full Performance Report"
-            pdf_buffer = generate_student_report_pdf(
-                student_name=student.name,
-                student_email=student.email,
-                submissions=submissions,
-                ctf_name=ctf_name,
-                subtitle=subtitle
-            )
-            
             filename = f"report_{student.name.replace(' ', '_')}_{category or 'full'}_{datetime.utcnow().strftime('%Y%m%d')}.pdf"
-            
-            # Read entire buffer and create response
-            pdf_data = pdf_buffer.read()
-            
-            from flask import make_response
-            response = make_response(pdf_data)
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
-            response.headers['Content-Length'] = str(len(pdf_data))
-            return response
+            return _send_report_pdf(
+                _report_view_args(student.name, student.email, submissions, ctf_name, category),
+                filename,
+            )
         except Exception as e:
             import traceback
             app.logger.error(f"Student report view error for user {current_user.id}: {str(e)}")
             app.logger.error(traceback.format_exc())
             return jsonify({"error": f"Failed to generate report: {str(e)}"}), 500
 
+    def _report_history_page(user_id=None):
+        """
+        Report history as a JSON array, newest first: everything, or one
+        page when ``limit`` or ``cursor`` is given.
+
+        Query parameters: ``limit``, ``cursor``, ``category`` ("full" for full
+        reports), ``since``/``until`` and, when *user_id* isn't fixed by the
+        route, ``user_id``.  The next page's cursor is returned in the
+        ``X-Next-Cursor`` header so the body stays a plain list.
+        """
+        from .utils.report_history import list_reports
+
+        try:
+            reports, next_cursor = list_reports(
+                limit=request.args.get("limit", type=int),
+                cursor=request.args.get("cursor"),
+                user_id=user_id if user_id is not None else request.args.get("user_id", type=int),
+                category=request.args.get("category") or None,
+                since=_date_arg("since"),
+                until=_date_arg("until"),
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        response = jsonify([report.to_dict() for report in reports])
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response
+
     # API: List available reports for current user
     @app.route("/api/marking_hub/reports/my-reports", methods=["GET"])
     @authed_only
@@ -865,22 +1162,19 @@ def load(app):
         if not current_user:
             return jsonify({"error": "Not authenticated"}), 401
         
-        reports = StudentReport.query.filter_by(user_id=current_user.id).order_by(StudentReport.sent_at.desc()).all()
-        return jsonify([report.to_dict() for report in reports])
+        return _report_history_page(user_id=current_user.id)
 
     # API: Get all student reports (admin only, for tracking)
     @app.route("/api/marking_hub/reports", methods=["GET"])
     @admins_only
     def get_student_reports():
-        reports = StudentReport.query.order_by(StudentReport.sent_at.desc()).all()
-        return jsonify([report.to_dict() for report in reports])
+        return _report_history_page()
 
     # API: Get reports for a specific student
     @app.route("/api/marking_hub/reports/student/<int:user_id>", methods=["GET"])
     @admins_only
     def get_student_reports_for_user(user_id):
-        reports = StudentReport.query.filter_by(user_id=user_id).order_by(StudentReport.sent_at.desc()).all()
-        return jsonify([report.to_dict() for report in reports])
+        return _report_history_page(user_id=user_id)
 
     # API: Trigger weekly reports for all students
     @app.route("/api/marking_hub/reports/send-weekly", methods=["POST"])
@@ -994,102 +1288,38 @@ def load(app):
                 "message": f"Error generating reports for {category}: {str(e)}"
             }), 500
 
+    def _date_arg(name):
+        """Parse an optional ``YYYY-MM-DD`` / ``YYYY-MM-DDTHH:MM`` query parameter."""
+        value = request.args.get(name)
+        if not value:
+            return None
+        for fmt in ("%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        raise ValueError(f"Invalid {name} format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM")
+
+    def _max_staleness():
+        """Parse the optional ``max_staleness`` (seconds) query parameter."""
+        value = request.args.get("max_staleness", type=float)
+        if value is None or value < 0:
+            return None
+        return value
+
     # API: Get tutor marking statistics
     @app.route("/api/marking_hub/statistics/tutors", methods=["GET"])
     @admins_only
     def get_tutor_statistics():
-        from CTFd.models import Submissions, Challenges
-        from sqlalchemy import func
-        
+        from .utils.statistics_snapshot import get_snapshot
+
         try:
-            # Get all tutors
-            tutors = MarkingTutor.query.all()
-            
-            stats = []
-            for tutor in tutors:
-                # Count submitted submissions assigned to this tutor
-                marked_subs = (
-                    MarkingSubmission.query
-                    .filter_by(marked_by=tutor.user_id)
-                    .all()
-                )
-                
-                marked_count = len(marked_subs)
-                # Calculate percentages: (mark / challenge.value) * 100
-                percentages = []
-                for s in marked_subs:
-                    if s.mark is not None:
-                        submission = Submissions.query.get(s.submission_id)
-                        if submission and submission.challenge:
-                            challenge_value = submission.challenge.value or 100
-                            percentage = (s.mark / challenge_value) * 100 if challenge_value else 0
-                            percentages.append(percentage)
-                
-                avg_mark = sum(percentages) / len(percentages) if percentages and len(percentages) > 0 else 0
-                
-                # Calculate standard deviation
-                std_dev = 0
-                if len(percentages) > 1:
-                    variance = sum((x - avg_mark) ** 2 for x in percentages) / len(percentages) if len(percentages) > 0 else 0
-                    std_dev = round(variance ** 0.5, 1)
-                
-                # Get last marked date
-                last_marked = None
-                if marked_subs:
-                    last_marked_sub = max(marked_subs, key=lambda x: x.marked_at or datetime.min)
-                    if last_marked_sub.marked_at:
-                        last_marked = last_marked_sub.marked_at.strftime("%Y-%m-%d %H:%M")
-                
-                stats.append({
-                    "tutor_id": tutor.user_id,
-                    "name": tutor.user.name if tutor.user else "Unknown",
-                    "email": tutor.user.email if tutor.user else "",
-                    "submissions_marked": marked_count,
-                    "avg_mark": round(avg_mark, 1),
-                    "std_dev": std_dev,
-                    "last_marked": last_marked,
-                })
-            
-            # Global stats
-            all_marked = MarkingSubmission.query.filter(MarkingSubmission.mark.isnot(None)).all()
-            all_subs = MarkingSubmission.query.all()
-            
-            # Count unique student/challenge pairs (not total submissions)
-            from CTFd.models import Submissions
-            # clean up any rows with NULL type before we load them
-            from .utils.report_generator import _cleanup_null_submission_types
-            _cleanup_null_submission_types()
-            all_submissions = Submissions.query.all()
-            unique_solutions = set()
-            for sub in all_submissions:
-                # Create unique key for each student/challenge combo
-                unique_solutions.add((sub.user_id, sub.challenge_id))
-            
-            # Count unique marked submissions (student/challenge pairs that have been marked)
-            unique_marked = set()
-            percentages_global = []
-            for marking_sub in all_marked:
-                submission = Submissions.query.get(marking_sub.submission_id)
-                if submission:
-                    unique_marked.add((submission.user_id, submission.challenge_id))
-                    if marking_sub.mark is not None and submission.challenge:
-                        challenge_value = submission.challenge.value or 100
-                        percentage = (marking_sub.mark / challenge_value) * 100 if challenge_value else 0
-                        percentages_global.append(percentage)
-            
-            avg_mark_overall = sum(percentages_global) / len(percentages_global) if percentages_global and len(percentages_global) > 0 else 0
-            
-            global_stats = {
-                "total_submitted": len(unique_solutions),
-                "total_marked": len(unique_marked),
-                "marking_percentage": round((len(unique_marked) / len(unique_solutions) * 100) if unique_solutions and len(unique_solutions) > 0 else 0, 1),
-                "avg_mark_overall": round(avg_mark_overall, 1),
-            }
-            
+            data, age = get_snapshot("tutors", max_staleness=_max_staleness())
             return jsonify({
                 "success": True,
-                "tutors": sorted(stats, key=lambda x: x["submissions_marked"], reverse=True),
-                "global": global_stats,
+                "tutors": data["tutors"],
+                "global": data["global"],
+                "snapshot_age": round(age, 1),
             })
         except Exception as e:
             return jsonify({
@@ -1101,64 +1331,14 @@ def load(app):
     @app.route("/api/marking_hub/statistics/categories", methods=["GET"])
     @admins_only
     def get_category_statistics():
-        from CTFd.models import Submissions, Challenges
-        
+        from .utils.statistics_snapshot import get_snapshot
+
         try:
-            # Get all challenges grouped by category
-            challenges = Challenges.query.all()
-            categories_dict = {}
-            
-            for challenge in challenges:
-                cat = challenge.category or "Uncategorized"
-                if cat not in categories_dict:
-                    categories_dict[cat] = []
-                categories_dict[cat].append(challenge.id)
-            
-            # For each category, count unique solutions and marked
-            category_stats = []
-            for category, challenge_ids in categories_dict.items():
-                # Get all submissions for challenges in this category
-                subs_in_cat = Submissions.query.filter(Submissions.challenge_id.in_(challenge_ids)).all()
-                
-                # Count unique student/challenge pairs
-                unique_solutions = set()
-                for sub in subs_in_cat:
-                    unique_solutions.add((sub.user_id, sub.challenge_id))
-                
-                # Get marking submissions for solutions in this category
-                marking_subs_in_cat = (
-                    MarkingSubmission.query
-                    .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
-                    .filter(Submissions.challenge_id.in_(challenge_ids))
-                    .all()
-                )
-                
-                # Count unique marked pairs and calculate percentages
-                unique_marked = set()
-                percentages = []
-                for marking_sub in marking_subs_in_cat:
-                    submission = Submissions.query.get(marking_sub.submission_id)
-                    if submission:
-                        unique_marked.add((submission.user_id, submission.challenge_id))
-                    if marking_sub.mark is not None and submission and submission.challenge:
-                        challenge_value = submission.challenge.value or 100
-                        percentage = (marking_sub.mark / challenge_value) * 100 if challenge_value else 0
-                        percentages.append(percentage)
-                
-                # Calculate stats for this category
-                avg_mark = sum(percentages) / len(percentages) if percentages and len(percentages) > 0 else 0
-                
-                category_stats.append({
-                    "category": category,
-                    "total_submitted": len(unique_solutions),
-                    "total_marked": len(unique_marked),
-                    "marking_percentage": round((len(unique_marked) / len(unique_solutions) * 100) if unique_solutions and len(unique_solutions) > 0 else 0, 1),
-                    "avg_mark": round(avg_mark, 1),
-                })
-            
+            data, age = get_snapshot("categories", max_staleness=_max_staleness())
             return jsonify({
                 "success": True,
-                "categories": sorted(category_stats, key=lambda x: x["category"]),
+                "categories": data["categories"],
+                "snapshot_age": round(age, 1),
             })
         except Exception as e:
             return jsonify({
@@ -1170,95 +1350,15 @@ def load(app):
     @app.route("/api/marking_hub/statistics/category/<category>/exercises", methods=["GET"])
     @admins_only
     def get_exercise_statistics_by_category(category):
-        from CTFd.models import Submissions, Challenges
-        
+        from .utils.statistics_snapshot import get_snapshot
+
         try:
-            # Get all challenges in this category
-            challenges = Challenges.query.filter_by(category=category).all()
-            challenge_ids = [c.id for c in challenges]
-            
-            if not challenge_ids:
-                return jsonify({
-                    "success": True,
-                    "category": category,
-                    "exercises": [],
-                })
-            
-            # Get all tutors for per-tutor stats
-            tutors = MarkingTutor.query.all()
-            
-            exercise_stats = []
-            for challenge in challenges:
-                # Get submissions for this exercise
-                subs = Submissions.query.filter_by(challenge_id=challenge.id).all()
-                
-                # Count unique students who submitted
-                unique_students = set(sub.user_id for sub in subs)
-                
-                # Get marking submissions for this exercise
-                marking_subs = (
-                    MarkingSubmission.query
-                    .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
-                    .filter(Submissions.challenge_id == challenge.id)
-                    .all()
-                )
-                
-                # Count unique marked students and calculate percentages
-                unique_marked_students = set()
-                percentages = []
-                for marking_sub in marking_subs:
-                    submission = Submissions.query.get(marking_sub.submission_id)
-                    if submission:
-                        unique_marked_students.add(submission.user_id)
-                    if marking_sub.mark is not None:
-                        challenge_value = challenge.value or 100
-                        percentage = (marking_sub.mark / challenge_value) * 100 if challenge_value else 0
-                        percentages.append(percentage)
-                
-                avg_mark = sum(percentages) / len(percentages) if percentages and len(percentages) > 0 else 0
-                
-                # Per-tutor breakdown
-                per_tutor_marks = []
-                for tutor in tutors:
-                    tutor_marking_subs = (
-                        MarkingSubmission.query
-                        .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
-                        .filter(Submissions.challenge_id == challenge.id)
-                        .filter(MarkingSubmission.marked_by == tutor.user_id)
-                        .all()
-                    )
-                    
-                    tutor_percentages = []
-                    for ms in tutor_marking_subs:
-                        if ms.mark is not None:
-                            challenge_value = challenge.value or 100
-                            percentage = (ms.mark / challenge_value) * 100 if challenge_value else 0
-                            tutor_percentages.append(percentage)
-                    
-                    tutor_avg_mark = sum(tutor_percentages) / len(tutor_percentages) if tutor_percentages and len(tutor_percentages) > 0 else None
-                    
-                    if tutor_percentages:  # Only include tutors who marked this exercise
-                        per_tutor_marks.append({
-                            "tutor_id": tutor.user_id,
-                            "tutor_name": tutor.user.name if tutor.user else "Unknown",
-                            "marked_count": len(tutor_percentages),
-                            "avg_mark": round(tutor_avg_mark, 1) if tutor_avg_mark else 0,
-                        })
-                
-                exercise_stats.append({
-                    "challenge_id": challenge.id,
-                    "challenge_name": challenge.name,
-                    "total_submitted": len(unique_students),
-                    "total_marked": len(unique_marked_students),
-                    "marking_percentage": round((len(unique_marked_students) / len(unique_students) * 100) if unique_students and len(unique_students) > 0 else 0, 1),
-                    "avg_mark": round(avg_mark, 1),
-                    "per_tutor": sorted(per_tutor_marks, key=lambda x: x["tutor_name"]),
-                })
-            
+            data, age = get_snapshot("exercises", category=category, max_staleness=_max_staleness())
             return jsonify({
                 "success": True,
                 "category": category,
-                "exercises": sorted(exercise_stats, key=lambda x: x["challenge_name"]),
+                "exercises": data["exercises"],
+                "snapshot_age": round(age, 1),
             })
         except Exception as e:
             return jsonify({
@@ -1266,6 +1366,96 @@ def load(app):
                 "message": f"Error fetching exercise statistics: {str(e)}"
             }), 500
 
+    # API: Inter-tutor marking consistency (calibration)
+    @app.route("/api/marking_hub/statistics/calibration", methods=["GET"])
+    @admins_only
+    def get_calibration_statistics():
+        from .utils.statistics import get_calibration_statistics as compute_calibration
+
+        category = request.args.get("category") or None
+        threshold = request.args.get("threshold", 0.5, type=float)
+        min_marks = request.args.get("min_marks", 5, type=int)
+        try:
+            results = compute_calibration(category=category, threshold=threshold, min_marks=min_marks)
+            return jsonify({
+                "success": True,
+                "category": category,
+                "threshold": threshold,
+                "min_marks": min_marks,
+                "tutors": results["tutors"],
+                "exercises": results["exercises"],
+            })
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "message": f"Error fetching calibration statistics: {str(e)}"
+            }), 500
+
+    # API: Time-bucketed marking throughput and backlog
+    @app.route("/api/marking_hub/statistics/timeseries", methods=["GET"])
+    @admins_only
+    def get_statistics_timeseries():
+        from datetime import timedelta
+        from .utils.timeseries import GRANULARITIES, get_throughput_series, get_backlog_series
+
+        granularity = request.args.get("granularity", "hour")
+        if granularity not in GRANULARITIES:
+            return jsonify({"success": False, "message": "granularity must be hour or day"}), 400
+
+        series = request.args.get("series")
+        if series not in (None, "throughput", "backlog"):
+            return jsonify({"success": False, "message": "series must be throughput or backlog"}), 400
+
+        try:
+            end = _date_arg("end") or datetime.utcnow()
+            default_span = timedelta(hours=48) if granularity == "hour" else timedelta(days=30)
+            start = _date_arg("start") or end - default_span
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        if start >= end:
+            return jsonify({"success": False, "message": "start must be before end"}), 400
+
+        try:
+            result = {
+                "success": True,
+                "granularity": granularity,
+                "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+                "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            if series in (None, "throughput"):
+                result["throughput"] = get_throughput_series(start, end, granularity)
+            if series in (None, "backlog"):
+                result["backlog"] = get_backlog_series(
+                    start, end, granularity, category=request.args.get("category") or None
+                )
+            return jsonify(result)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "message": f"Error fetching time series: {str(e)}"
+            }), 500
+
+    # API: Rebuild the statistics snapshot on demand
+    @app.route("/api/marking_hub/statistics/rebuild", methods=["POST"])
+    @admins_only
+    @bypass_csrf_protection
+    def rebuild_statistics_snapshot():
+        from .utils.statistics_snapshot import rebuild_snapshot
+
+        try:
+            results = rebuild_snapshot()
+            return jsonify({
+                "success": True,
+                "message": f"Statistics snapshot rebuilt for {results['categories']} categories",
+            })
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "message": f"Error rebuilding statistics: {str(e)}"
+            }), 500
+
     # -----------------------------------------------------------------------
     # MARKABLE EXERCISES — admin configuration
     # -----------------------------------------------------------------------
@@ -1277,10 +1467,7 @@ def load(app):
         from CTFd.models import Challenges
         challenges = Challenges.query.order_by(Challenges.category, Challenges.name).all()
         # Build a lookup map for quick access
-        markable_map = {
-            me.challenge_id: me
-            for me in MarkableExercise.query.all()
-        }
+        markable_map = load_markable_map()
         result = []
         for ch in challenges:
             me = markable_map.get(ch.id)
@@ -1331,6 +1518,7 @@ def load(app):
         me.assignment_name = assignment_name
         me.weight = weight
         db.session.commit()
+        invalidate_all_marks()
         return jsonify({"success": True, "exercise": me.to_dict()})
 
     @app.route("/api/marking_hub/markable/<int:challenge_id>", methods=["DELETE"])
@@ -1343,6 +1531,7 @@ def load(app):
             return jsonify({"success": False, "message": "Not found"}), 404
         db.session.delete(me)
         db.session.commit()
+        invalidate_all_marks()
         return jsonify({"success": True})
 
     # -----------------------------------------------------------------------
@@ -1373,9 +1562,15 @@ def load(app):
     @admins_only
     @bypass_csrf_protection
     def set_category_release(category):
-        """Toggle the released state of a category."""
+        """
+        Toggle the released state of a category.
+
+        With ``"prerender": true`` a release also renders every affected
+        student's category report into the report cache in the background.
+        """
         data = request.get_json(silent=True) or {}
         released = bool(data.get("released", False))
+        prerender = released and bool(data.get("prerender", False))
         user = get_current_user()
 
         r = MarkingCategoryRelease.query.filter_by(category=category).first()
@@ -1390,7 +1585,26 @@ def load(app):
             r.released_at = None
             r.released_by = None
         db.session.commit()
-        return jsonify({"success": True, "release": r.to_dict()})
+        invalidate_all_marks()
+        if prerender:
+            start_category_prerender(app, category)
+        return jsonify({"success": True, "release": r.to_dict(), "prerenderQueued": prerender})
+
+    @app.route("/api/marking_hub/gradebook.<any(csv, ndjson):fmt>", methods=["GET"])
+    @admins_only
+    def export_gradebook(fmt):
+        """Stream every student's homework and assignment totals as CSV or NDJSON."""
+        from flask import Response, stream_with_context
+        from .utils.grades import iter_gradebook_csv, iter_gradebook_ndjson
+
+        filename = f"gradebook_{datetime.utcnow().strftime('%Y%m%d')}.{fmt}"
+        if fmt == "csv":
+            rows, mimetype = iter_gradebook_csv(), "text/csv"
+        else:
+            rows, mimetype = iter_gradebook_ndjson(), "application/x-ndjson"
+        response = Response(stream_with_context(rows), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
     # -----------------------------------------------------------------------
     # STUDENT MARK VIEWER — page + API
@@ -1401,18 +1615,10 @@ def load(app):
     def student_mark_viewer():
         return render_template("plugins/CTFd_Marking_Hub/templates/mark_viewer.html")
 
-    @app.route("/api/marking_hub/my-marks", methods=["GET"])
-    @authed_only
-    def get_my_marks():
-        """
-        Return the current user's marked submissions for released categories only.
-        Groups results by category.  Includes markable type & assignment name.
-        Strictly scoped to current_user.id — no user_id query param accepted.
-        """
+    def _build_my_marks(user_id):
+        """Mark viewer payload for one student (see get_my_marks)."""
         from CTFd.models import Submissions, Challenges
 
-        user = get_current_user()
-
         # Build set of released categories
         released_categories = {
             r.category
@@ -1420,35 +1626,27 @@ def load(app):
         }
 
         if not released_categories:
-            return jsonify({"success": True, "categories": []})
+            return {"success": True, "categories": []}
 
-        # Fetch this student's marked MarkingSubmissions whose challenge is in a released category
-        # ordered by marked_at desc so we can keep only the latest per challenge
-        all_marked_subs = (
+        # Fetch this student's latest marked MarkingSubmission per challenge in a
+        # released category (deduplicated in SQL)
+        scope = (
+            Submissions.user_id == user_id,
+            Challenges.category.in_(list(released_categories)),
+        )
+        marking_subs = (
             MarkingSubmission.query
             .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
             .join(Challenges, Submissions.challenge_id == Challenges.id)
-            .filter(Submissions.user_id == user.id)
-            .filter(Challenges.category.in_(released_categories))
+            .filter(*scope)
             .filter(MarkingSubmission.mark.isnot(None))
-            .order_by(Challenges.category, Challenges.name, MarkingSubmission.marked_at.desc())
+            .filter(latest_attempt_filter(*scope, marked_only=True))
+            .order_by(Challenges.category, Challenges.name)
             .all()
         )
 
-        # Deduplicate: keep only the latest marked submission per challenge
-        seen_challenges = set()
-        marking_subs = []
-        for ms in all_marked_subs:
-            cid = ms.submission.challenge_id if ms.submission else None
-            if cid is not None and cid not in seen_challenges:
-                seen_challenges.add(cid)
-                marking_subs.append(ms)
-
         # Build MarkableExercise lookup
-        markable_map = {
-            me.challenge_id: me
-            for me in MarkableExercise.query.all()
-        }
+        markable_map = load_markable_map()
 
         # Group by category
         categories = {}
@@ -1483,69 +1681,28 @@ def load(app):
             for cat, subs in sorted(categories.items())
         ]
 
-        # Compute summed marks (earned and possible)
-        # Assignments use per-exercise weights (% contribution to final mark).
-        # If no weights are set, fall back to raw mark / possible scoring.
-        homework_earned = 0
-        homework_possible = 0
-        # assignment_name -> {weighted_score, total_weight, raw_earned, raw_possible}
-        assignment_data = {}
-        for ms in marking_subs:
-            challenge = ms.submission.challenge
-            me = markable_map.get(challenge.id) if challenge else None
-            if me is None or me.submission_type == "uncounted":
-                continue
-            possible = challenge.value if challenge and challenge.value else 100
-            if me.submission_type == "homework":
-                homework_earned += ms.mark
-                homework_possible += possible
-            elif me.submission_type == "assignment":
-                name = me.assignment_name or "Assignment"
-                if name not in assignment_data:
-                    assignment_data[name] = {"weighted_score": 0.0, "total_weight": 0.0,
-                                             "raw_earned": 0, "raw_possible": 0,
-                                             "has_weights": False}
-                d = assignment_data[name]
-                d["raw_earned"] += ms.mark
-                d["raw_possible"] += possible
-                if me.weight is not None:
-                    d["has_weights"] = True
-                    d["weighted_score"] += (ms.mark / possible * me.weight) if possible else 0
-                    d["total_weight"] += me.weight
-
-        def pct(earned, possible):
-            if not possible:
-                return 0.0
-            return round(earned / possible * 100, 1)
-
-        assignments_summary = []
-        for name in sorted(assignment_data.keys()):
-            d = assignment_data[name]
-            if d["has_weights"] and d["total_weight"]:
-                # Weighted percentage: sum of (mark/possible * weight) normalised by total weight
-                percentage = round(d["weighted_score"] / d["total_weight"] * 100, 1)
-                assignments_summary.append({
-                    "name": name,
-                    "percentage": percentage,
-                    "weightedScore": round(d["weighted_score"], 1),
-                    "totalWeight": round(d["total_weight"], 1),
-                    "isWeighted": True,
-                })
-            else:
-                assignments_summary.append({
-                    "name": name,
-                    "earned": d["raw_earned"],
-                    "possible": d["raw_possible"],
-                    "percentage": pct(d["raw_earned"], d["raw_possible"]),
-                    "isWeighted": False,
-                })
+        # Summed homework marks and weighted assignment scores
+        summary = summarize_marks(
+            (
+                (ms.submission.challenge_id, ms.submission.challenge.value, ms.mark)
+                for ms in marking_subs
+                if ms.submission.challenge
+            ),
+            markable_map,
+        )
 
-        summary = {
-            "homeworkEarned": homework_earned,
-            "homeworkPossible": homework_possible,
-            "homeworkPercentage": pct(homework_earned, homework_possible),
-            "assignments": assignments_summary,
-        }
+        return {"success": True, "categories": result, "summary": summary}
 
-        return jsonify({"success": True, "categories": result, "summary": summary})
+    @app.route("/api/marking_hub/my-marks", methods=["GET"])
+    @authed_only
+    def get_my_marks():
+        """
+        Return the current user's marked submissions for released categories only.
+        Groups results by category.  Includes markable type & assignment name.
+        Strictly scoped to current_user.id — no user_id query param accepted.
+        Served from the per-student cache until their marks, the markable
+        config or the released categories change.
+        """
+        user = get_current_user()
+        return jsonify(cached_student_marks(user.id, lambda: _build_my_marks(user.id)))
 
@@ -0,0 +1,29 @@
+"""Add marking_markable_exercises.weight and clean up NULL submission types
+
+Revision ID: marking_hub_008
+Revises: marking_hub_007
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from CTFd.plugins.migrations import get_columns_for_table
+
+# revision identifiers, used by Alembic.
+revision = 'marking_hub_008'
+down_revision = 'marking_hub_007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(op=op):
+    # Tables created before the weight column existed
+    if 'weight' not in get_columns_for_table(op, 'marking_markable_exercises', names_only=True):
+        op.add_column('marking_markable_exercises', sa.Column('weight', sa.Float(), nullable=True))
+
+    # Legacy submissions with a NULL type discriminator break polymorphic loads
+    op.execute(sa.text("UPDATE submissions SET type = 'incorrect' WHERE type IS NULL"))
+
+
+def downgrade(op=op):
+    op.drop_column('marking_markable_exercises', 'weight')
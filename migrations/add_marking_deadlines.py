@@ -8,6 +8,7 @@ Create Date: 2026-02-12
 from alembic import op
 import sqlalchemy as sa
 from sqlalchemy.sql import text
+from CTFd.plugins.migrations import get_all_tables
 
 # revision identifiers, used by Alembic.
 revision = 'marking_hub_003'
@@ -16,7 +17,10 @@ branch_labels = None
 depends_on = None
 
 
-def upgrade():
+def upgrade(op=op):
+    # Installs that predate the migrations got the table from db.create_all()
+    if 'marking_deadlines' in get_all_tables(op):
+        return
     # Create marking_deadlines table
     op.create_table(
         'marking_deadlines',
@@ -30,5 +34,5 @@ def upgrade():
     )
 
 
-def downgrade():
+def downgrade(op=op):
     op.drop_table('marking_deadlines')
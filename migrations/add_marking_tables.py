@@ -6,13 +6,17 @@ Create Date: 2026-02-10
 """
 from alembic import op
 import sqlalchemy as sa
+from CTFd.plugins.migrations import get_all_tables
 
 revision = 'marking_hub_001'
 down_revision = None
 branch_labels = None
 depends_on = None
 
-def upgrade():
+def upgrade(op=op):
+    # Installs that predate the migrations got the table from db.create_all()
+    if 'marking_submissions' in get_all_tables(op):
+        return
     op.create_table(
         'marking_submissions',
         sa.Column('id', sa.Integer(), nullable=False),
@@ -27,5 +31,5 @@ def upgrade():
         sa.UniqueConstraint('submission_id')
     )
 
-def downgrade():
+def downgrade(op=op):
     op.drop_table('marking_submissions')
\ No newline at end of file
@@ -0,0 +1,29 @@
+"""Add report history indexes
+
+Revision ID: marking_hub_004
+Revises: marking_hub_003
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'marking_hub_004'
+down_revision = 'marking_hub_003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(op=op):
+    # db.create_all() already indexed the table if it created it
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('student_reports')}
+    if 'ix_student_reports_sent_at' not in existing:
+        op.create_index('ix_student_reports_sent_at', 'student_reports', ['sent_at'])
+    if 'ix_student_reports_user_id_sent_at' not in existing:
+        op.create_index('ix_student_reports_user_id_sent_at', 'student_reports', ['user_id', 'sent_at'])
+
+
+def downgrade(op=op):
+    op.drop_index('ix_student_reports_user_id_sent_at', table_name='student_reports')
+    op.drop_index('ix_student_reports_sent_at', table_name='student_reports')
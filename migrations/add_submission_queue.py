@@ -0,0 +1,47 @@
+"""Add submission queue table
+
+Revision ID: marking_hub_007
+Revises: marking_hub_006
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from CTFd.plugins.migrations import get_all_tables
+
+# revision identifiers, used by Alembic.
+revision = 'marking_hub_007'
+down_revision = 'marking_hub_006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(op=op):
+    # db.create_all() may already have created the table (and its index)
+    if 'marking_submission_queue' in get_all_tables(op):
+        return
+    op.create_table(
+        'marking_submission_queue',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ticket', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('challenge_id', sa.Integer(), nullable=False),
+        sa.Column('flag', sa.Text(), nullable=False),
+        sa.Column('token', sa.String(length=256), nullable=False),
+        sa.Column('token_hash', sa.String(length=256), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('claim', sa.String(length=32), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('result', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('ticket')
+    )
+    op.create_index('ix_marking_submission_queue_status_id', 'marking_submission_queue', ['status', 'id'])
+
+
+def downgrade(op=op):
+    op.drop_index('ix_marking_submission_queue_status_id', table_name='marking_submission_queue')
+    op.drop_table('marking_submission_queue')
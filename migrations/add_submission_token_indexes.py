@@ -0,0 +1,29 @@
+"""Add submission token lookup and retention indexes
+
+Revision ID: marking_hub_006
+Revises: marking_hub_005
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'marking_hub_006'
+down_revision = 'marking_hub_005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(op=op):
+    # db.create_all() already indexed the table if it created it
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('submission_tokens')}
+    if 'ix_submission_tokens_lookup' not in existing:
+        op.create_index('ix_submission_tokens_lookup', 'submission_tokens', ['user_id', 'challenge_id', 'token_hash'])
+    if 'ix_submission_tokens_expires_at' not in existing:
+        op.create_index('ix_submission_tokens_expires_at', 'submission_tokens', ['expires_at'])
+
+
+def downgrade(op=op):
+    op.drop_index('ix_submission_tokens_expires_at', table_name='submission_tokens')
+    op.drop_index('ix_submission_tokens_lookup', table_name='submission_tokens')
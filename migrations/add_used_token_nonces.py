@@ -0,0 +1,35 @@
+"""Add used token nonces table
+
+Revision ID: marking_hub_005
+Revises: marking_hub_004
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from CTFd.plugins.migrations import get_all_tables
+
+# revision identifiers, used by Alembic.
+revision = 'marking_hub_005'
+down_revision = 'marking_hub_004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(op=op):
+    # db.create_all() may already have created the table (and its index)
+    if 'marking_used_token_nonces' in get_all_tables(op):
+        return
+    op.create_table(
+        'marking_used_token_nonces',
+        sa.Column('nonce', sa.String(length=64), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('used_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('nonce')
+    )
+    op.create_index('ix_marking_used_token_nonces_expires_at', 'marking_used_token_nonces', ['expires_at'])
+
+
+def downgrade(op=op):
+    op.drop_index('ix_marking_used_token_nonces_expires_at', table_name='marking_used_token_nonces')
+    op.drop_table('marking_used_token_nonces')
@@ -1,5 +1,6 @@
+import json
 from CTFd.models import db
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, UniqueConstraint, Boolean, Table
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, UniqueConstraint, Boolean, Table, Index
 from sqlalchemy.orm import relationship, backref
 from datetime import datetime
 
@@ -163,6 +164,11 @@ class StudentReport(db.Model):
     Tracks when student performance reports were generated and sent.
     """
     __tablename__ = "student_reports"
+    __table_args__ = (
+        # Back the newest-first history listing, overall and per student
+        Index("ix_student_reports_sent_at", "sent_at"),
+        Index("ix_student_reports_user_id_sent_at", "user_id", "sent_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -197,6 +203,11 @@ class SubmissionToken(db.Model):
     Uses HMAC-based security to prevent forgery.
     """
     __tablename__ = "submission_tokens"
+    __table_args__ = (
+        # Back the redemption lookup and the retention sweep
+        Index("ix_submission_tokens_lookup", "user_id", "challenge_id", "token_hash"),
+        Index("ix_submission_tokens_expires_at", "expires_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -230,6 +241,66 @@ class SubmissionToken(db.Model):
         return f"<SubmissionToken {self.id} - User {self.user_id} Challenge {self.challenge_id}>"
 
 
+class UsedTokenNonce(db.Model):
+    """
+    Replay guard for stateless submission tokens.
+    A stateless token's nonce is recorded when it is used; rows are only
+    needed until the token would have expired anyway and are pruned after.
+    """
+    __tablename__ = "marking_used_token_nonces"
+
+    nonce = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<UsedTokenNonce {self.nonce}>"
+
+
+class SubmissionQueueItem(db.Model):
+    """
+    On-behalf submission accepted in async mode and waiting to be recorded.
+    Only the HMAC is checked on enqueue; the drain worker runs the full
+    verification and stores the outcome (JSON) under the item's ticket.
+    status: "queued", "processing", "done" (recorded) or "failed"
+    """
+    __tablename__ = "marking_submission_queue"
+    __table_args__ = (
+        # Back the drain (oldest queued first) and the depth count
+        Index("ix_marking_submission_queue_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    ticket = Column(String(32), nullable=False, unique=True)
+    user_id = Column(Integer, nullable=False)
+    challenge_id = Column(Integer, nullable=False)
+    flag = Column(Text, nullable=False)
+    token = Column(String(256), nullable=False)
+    token_hash = Column(String(256), nullable=False)
+    status = Column(String(16), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    claim = Column(String(32), nullable=True)  # Drain round that owns the item
+    claimed_at = Column(DateTime, nullable=True)
+    result = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "ticket": self.ticket,
+            "status": self.status,
+            "userId": self.user_id,
+            "challengeId": self.challenge_id,
+            "attempts": self.attempts,
+            "result": json.loads(self.result) if self.result else None,
+            "createdAt": self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None,
+            "processedAt": self.processed_at.strftime("%Y-%m-%d %H:%M:%S") if self.processed_at else None,
+        }
+
+    def __repr__(self):
+        return f"<SubmissionQueueItem {self.ticket} {self.status}>"
+
+
 class MarkableExercise(db.Model):
     """
     Maps a CTFd challenge to a markable submission type.
@@ -0,0 +1,35 @@
+import pytest
+
+rate_limit = pytest.importorskip("CTFd.plugins.CTFd_Marking_Hub.utils.rate_limit")
+
+
+class _App:
+    def __init__(self, **config):
+        self.config = {
+            "MARKING_HUB_AUTOMARKER_SECRET": "real-secret",
+            "MARKING_HUB_RATE_LIMIT_KEY": "secret",
+        }
+        self.config.update(config)
+
+
+def test_valid_secret_is_the_key():
+    app = _App()
+    assert rate_limit.client_key(app, "real-secret", "10.0.0.1").startswith("secret:")
+    assert rate_limit.client_key(app, "real-secret", "10.0.0.2") == rate_limit.client_key(app, "real-secret", "10.0.0.1")
+
+
+def test_unverified_secret_falls_back_to_ip():
+    app = _App()
+    assert rate_limit.client_key(app, "made-up", "10.0.0.1") == "ip:10.0.0.1"
+    assert rate_limit.client_key(_App(MARKING_HUB_AUTOMARKER_SECRET=None), "made-up", "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_rotating_bogus_secrets_are_still_limited():
+    app = _App()
+    limiter = rate_limit.RateLimiter("tokens", rate=1, burst=3)
+    waits = [
+        limiter.acquire(rate_limit.client_key(app, f"bogus-{attempt}", "10.0.0.1"))
+        for attempt in range(5)
+    ]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert all(wait > 0 for wait in waits[3:])
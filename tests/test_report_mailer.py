@@ -0,0 +1,121 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+report_mailer = pytest.importorskip("CTFd.plugins.CTFd_Marking_Hub.utils.report_mailer")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    """Minimal local SMTP stand-in that records connections and messages."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_first=0):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+        # Number of messages to answer by closing the connection instead
+        self.drop_first = drop_first
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    body.append(data)
+                with server.lock:
+                    if server.drop_first:
+                        server.drop_first -= 1
+                        return
+                    server.messages.append(b"".join(body))
+                if b"REJECT" in b"".join(body):
+                    self.reply("554 Message rejected")
+                else:
+                    self.reply("250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Not implemented")
+
+
+@pytest.fixture
+def smtp_server(request):
+    server = _SMTPServer(**getattr(request, "param", {}))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _mailer(server, **options):
+    options.setdefault("connections", 1)
+    options.setdefault("backoff", 0)
+    return report_mailer.ReportMailer("127.0.0.1", server.server_address[1], "ctf@example.com", **options)
+
+
+def _messages(count, text="Your report"):
+    return [(n, f"student{n}@example.com", "Weekly report", text) for n in range(count)]
+
+
+def test_session_is_reused_for_the_batch(smtp_server):
+    results = _mailer(smtp_server).send_batch(_messages(3))
+
+    assert [success for _, success, _ in results] == [True, True, True]
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 3
+
+
+@pytest.mark.parametrize("smtp_server", [{"drop_first": 1}], indirect=True)
+def test_disconnect_is_retried_on_a_fresh_session(smtp_server):
+    results = _mailer(smtp_server).send_batch(_messages(2))
+
+    assert [success for _, success, _ in results] == [True, True]
+    assert smtp_server.connections == 2
+    assert len(smtp_server.messages) == 2
+
+
+def test_permanent_error_fails_without_retry_and_drops_the_session(smtp_server):
+    messages = [(0, "a@example.com", "Weekly report", "REJECT me")] + _messages(1)[0:1]
+    results = _mailer(smtp_server).send_batch(messages)
+
+    assert results[0][1] is False and "554" in results[0][2]
+    assert results[1][1] is True
+    # The rejected message was not retried; the next one opened a new session
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 2
+
+
+def test_rate_limit_spaces_sends(smtp_server):
+    started = time.monotonic()
+    results = _mailer(smtp_server, connections=2, rate_per_minute=600).send_batch(_messages(4))
+
+    assert all(success for _, success, _ in results)
+    # 600/minute is one send every 0.1s: the fourth waits for three intervals
+    assert time.monotonic() - started >= 0.3
@@ -0,0 +1,60 @@
+import pytest
+
+statistics = pytest.importorskip("CTFd.plugins.CTFd_Marking_Hub.utils.statistics")
+
+
+class _Challenge:
+    def __init__(self, id, value, name="Exercise"):
+        self.id = id
+        self.value = value
+        self.name = name
+
+
+def _group(challenge_id, mark_counts):
+    return statistics.MarkGroup(
+        challenge_id=challenge_id, marked_by=1, entries=sum(mark_counts.values()),
+        mark_count=sum(mark_counts.values()),
+        mark_total=sum(mark * count for mark, count in mark_counts.items()),
+        mark_total_sq=sum(mark * mark * count for mark, count in mark_counts.items()),
+        last_marked_at=None, mark_counts=mark_counts,
+    )
+
+
+def test_tutor_marks_are_banded_as_stored():
+    # A "good" mark is stored as 60 whatever the challenge is worth
+    challenges = {1: _Challenge(1, 200), 2: _Challenge(2, 50)}
+    groups = [_group(1, {60: 2, 100: 1}), _group(2, {30: 1, 90: 1})]
+
+    distribution = statistics._distribution(groups, challenges)
+
+    assert distribution["bands"] == {"0": 0, "30": 1, "60": 2, "90": 1, "100": 1}
+    assert distribution["median"] == 60.0
+
+
+def test_tech_auto_marks_are_scaled_by_the_challenge_value():
+    # Auto-marks store 0 or the challenge value
+    challenges = {1: _Challenge(1, 200, "TECH: Buffer overflow"), 2: _Challenge(2, 50, "TECH: SQLi")}
+    groups = [_group(1, {200: 1, 0: 1}), _group(2, {50: 2})]
+
+    distribution = statistics._distribution(groups, challenges)
+
+    assert distribution["bands"] == {"0": 1, "30": 0, "60": 0, "90": 0, "100": 3}
+    assert distribution["p90"] == 100.0
+
+
+def test_average_uses_the_same_normalisation():
+    challenges = {1: _Challenge(1, 200), 2: _Challenge(2, 200, "TECH Exploit")}
+    groups = [_group(1, {60: 1, 150: 1}), _group(2, {200: 1})]
+
+    n, total, _ = statistics._percentage_moments(groups, challenges)
+
+    # 60, 150 clamped to 100, and the full auto-mark as 100
+    assert n == 3
+    assert total == pytest.approx(260.0)
+
+
+def test_groups_outside_the_challenges_are_ignored():
+    distribution = statistics._distribution([_group(3, {60: 1})], {1: _Challenge(1, 100)})
+
+    assert distribution == {"bands": {"0": 0, "30": 0, "60": 0, "90": 0, "100": 0},
+                            "median": None, "p10": None, "p90": None}
@@ -0,0 +1,140 @@
+"""
+Flag checking for submissions made on a student's behalf.
+
+Regex flags must match from the start of the provided flag (``re.match``);
+any other flag type is compared literally, trimmed and case-insensitively.
+
+Each worker keeps a compiled :class:`FlagMatcher` per challenge (a set of
+normalised static flags plus precompiled regexes).  Committing a change to
+``Flags`` bumps a version in CTFd's cache; workers compare it on every lookup
+and drop their matchers when it moves, so flag edits apply everywhere.
+"""
+
+import re
+import threading
+import uuid
+from CTFd.cache import cache
+from CTFd.models import db, Flags
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import logging
+
+logger = logging.getLogger(__name__)
+
+_VERSION_KEY = "marking_hub:flag_matchers:version"
+_SESSION_FLAG = "marking_hub_flags_changed"
+
+_lock = threading.Lock()
+_matchers = {}
+_matchers_version = None
+
+
+class FlagMatcher:
+    """Compiled flags of one challenge."""
+
+    def __init__(self, flags):
+        self.static = set()
+        self.patterns = []
+        for flag_content, flag_type in flags:
+            if not flag_content:
+                continue
+            if flag_type == 'regex':
+                try:
+                    self.patterns.append(re.compile(flag_content))
+                except re.error as e:
+                    logger.error(f"Invalid regex pattern: {str(e)}")
+            else:
+                self.static.add(flag_content.strip().lower())
+
+    def matches(self, provided_flag):
+        """Whether *provided_flag* (already stripped) matches any flag."""
+        if provided_flag.lower() in self.static:
+            return True
+        return any(pattern.match(provided_flag) for pattern in self.patterns)
+
+
+def _current_version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(_VERSION_KEY, version, timeout=0)
+    return version
+
+
+def get_flag_matchers(challenge_ids):
+    """
+    Matchers for several challenges, loading any missing ones in one query.
+
+    Returns:
+        dict: challenge_id (int) -> FlagMatcher
+
+    Raises:
+        ValueError: if an id is not an integer
+    """
+    global _matchers_version
+
+    challenge_ids = {int(cid) for cid in challenge_ids}
+    version = _current_version()
+    with _lock:
+        if version != _matchers_version:
+            _matchers.clear()
+            _matchers_version = version
+        found = {cid: _matchers[cid] for cid in challenge_ids if cid in _matchers}
+
+    missing = challenge_ids - set(found)
+    if missing:
+        flags = {cid: [] for cid in missing}
+        rows = (
+            db.session.query(Flags.challenge_id, Flags.content, Flags.type)
+            .filter(Flags.challenge_id.in_(list(missing)))
+            .all()
+        )
+        for challenge_id, content, flag_type in rows:
+            flags[challenge_id].append((content, flag_type or "static"))
+        loaded = {cid: FlagMatcher(challenge_flags) for cid, challenge_flags in flags.items()}
+        with _lock:
+            # Only keep them if no flag change was seen meanwhile
+            if version == _matchers_version:
+                _matchers.update(loaded)
+        found.update(loaded)
+    return found
+
+
+def invalidate_flag_matchers():
+    """Drop compiled matchers in every worker."""
+    global _matchers_version
+
+    cache.set(_VERSION_KEY, uuid.uuid4().hex, timeout=0)
+    with _lock:
+        _matchers.clear()
+        _matchers_version = None
+
+
+def _note_flag_change(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info[_SESSION_FLAG] = True
+
+
+def _after_commit(session):
+    if session.info.pop(_SESSION_FLAG, False):
+        invalidate_flag_matchers()
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_FLAG, None)
+
+
+def register_flag_listeners():
+    """
+    Invalidate matchers whenever a commit inserts, updates or deletes a flag.
+
+    The version is bumped after commit (not at flush) so no worker can
+    rebuild a matcher from uncommitted rows under the new version.
+    """
+    for name in ("after_insert", "after_update", "after_delete"):
+        if not event.contains(Flags, name, _note_flag_change):
+            event.listen(Flags, name, _note_flag_change, propagate=True)
+    if not event.contains(Session, "after_commit", _after_commit):
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
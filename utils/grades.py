@@ -0,0 +1,278 @@
+"""
+Homework and assignment grade summaries.
+
+The same rules back the student mark viewer (one student, released
+categories) and the admin gradebook export (every student):
+
+* only the latest marked submission per challenge counts;
+* "homework" exercises are summed as earned / possible points;
+* "assignment" exercises are grouped by assignment name and, when any of
+  them has a weight, scored as the weight-normalised sum of
+  ``mark / possible * weight``; otherwise as raw earned / possible;
+* "uncounted" and unconfigured exercises are ignored.
+
+A student's mark viewer payload is cached in CTFd's cache under two version
+tokens: one per student (bumped when their marks change) and one shared
+(bumped by markable config, category release and bulk mark changes), so a
+repeat view costs one cache lookup and any relevant change forces a rebuild.
+"""
+
+import csv
+import io
+import json
+import uuid
+from itertools import groupby
+from CTFd.cache import cache
+from CTFd.models import db, Users, Submissions, Challenges
+from ..models import MarkingSubmission, MarkableExercise
+from .latest_attempts import latest_attempt_filter
+
+# Rows fetched per round trip when streaming the gradebook
+GRADEBOOK_BATCH_SIZE = 1000
+
+# Cached mark viewer payloads also expire on their own, which bounds
+# staleness from changes made outside the plugin (e.g. challenge values)
+MY_MARKS_TIMEOUT = 60 * 60
+
+_KEY_PREFIX = "marking_hub:my_marks"
+_SHARED_VERSION_KEY = f"{_KEY_PREFIX}:version"
+
+
+def load_markable_map():
+    """
+    Markable configuration for every configured challenge.
+
+    Returns:
+        dict: challenge_id -> row with submission_type, assignment_name, weight
+    """
+    rows = db.session.query(
+        MarkableExercise.challenge_id,
+        MarkableExercise.submission_type,
+        MarkableExercise.assignment_name,
+        MarkableExercise.weight,
+    ).all()
+    return {row.challenge_id: row for row in rows}
+
+
+def _pct(earned, possible):
+    if not possible:
+        return 0.0
+    return round(earned / possible * 100, 1)
+
+
+def summarize_marks(marks, markable_map):
+    """
+    Homework and per-assignment totals for one student.
+
+    Args:
+        marks (iterable): (challenge_id, challenge_value, mark) for the latest
+            marked submission of each challenge
+        markable_map (dict): from :func:`load_markable_map` (or any mapping of
+            challenge id to an object with the same attributes)
+
+    Returns:
+        dict: the ``summary`` object of ``/api/marking_hub/my-marks``
+    """
+    homework_earned = 0
+    homework_possible = 0
+    # assignment_name -> {weighted_score, total_weight, raw_earned, raw_possible}
+    assignment_data = {}
+    for challenge_id, value, mark in marks:
+        me = markable_map.get(challenge_id)
+        if me is None or me.submission_type == "uncounted":
+            continue
+        possible = value if value else 100
+        if me.submission_type == "homework":
+            homework_earned += mark
+            homework_possible += possible
+        elif me.submission_type == "assignment":
+            name = me.assignment_name or "Assignment"
+            if name not in assignment_data:
+                assignment_data[name] = {"weighted_score": 0.0, "total_weight": 0.0,
+                                         "raw_earned": 0, "raw_possible": 0,
+                                         "has_weights": False}
+            d = assignment_data[name]
+            d["raw_earned"] += mark
+            d["raw_possible"] += possible
+            if me.weight is not None:
+                d["has_weights"] = True
+                d["weighted_score"] += (mark / possible * me.weight) if possible else 0
+                d["total_weight"] += me.weight
+
+    assignments_summary = []
+    for name in sorted(assignment_data.keys()):
+        d = assignment_data[name]
+        if d["has_weights"] and d["total_weight"]:
+            # Weighted percentage: sum of (mark/possible * weight) normalised by total weight
+            percentage = round(d["weighted_score"] / d["total_weight"] * 100, 1)
+            assignments_summary.append({
+                "name": name,
+                "percentage": percentage,
+                "weightedScore": round(d["weighted_score"], 1),
+                "totalWeight": round(d["total_weight"], 1),
+                "isWeighted": True,
+            })
+        else:
+            assignments_summary.append({
+                "name": name,
+                "earned": d["raw_earned"],
+                "possible": d["raw_possible"],
+                "percentage": _pct(d["raw_earned"], d["raw_possible"]),
+                "isWeighted": False,
+            })
+
+    return {
+        "homeworkEarned": homework_earned,
+        "homeworkPossible": homework_possible,
+        "homeworkPercentage": _pct(homework_earned, homework_possible),
+        "assignments": assignments_summary,
+    }
+
+
+def iter_student_summaries():
+    """
+    Grade summaries for every student with a marked, counted submission.
+
+    One streamed query returns the latest marked submission per counted
+    challenge, ordered by student; students are summarised one at a time as
+    their rows arrive.
+
+    Yields:
+        tuple: (user_id, name, email, summary)
+    """
+    markable_map = load_markable_map()
+    counted = [cid for cid, me in markable_map.items() if me.submission_type != "uncounted"]
+    if not counted:
+        return
+
+    scope = (Submissions.challenge_id.in_(counted),)
+    query = (
+        db.session.query(
+            Submissions.user_id,
+            Users.name,
+            Users.email,
+            Submissions.challenge_id,
+            Challenges.value,
+            MarkingSubmission.mark,
+        )
+        .select_from(MarkingSubmission)
+        .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
+        .join(Challenges, Submissions.challenge_id == Challenges.id)
+        .join(Users, Submissions.user_id == Users.id)
+        .filter(*scope)
+        .filter(MarkingSubmission.mark.isnot(None))
+        .filter(latest_attempt_filter(*scope, marked_only=True))
+        .order_by(Submissions.user_id)
+    )
+
+    for user_id, rows in groupby(query.yield_per(GRADEBOOK_BATCH_SIZE), key=lambda row: row.user_id):
+        rows = list(rows)
+        marks = [(row.challenge_id, row.value, row.mark) for row in rows]
+        yield user_id, rows[0].name, rows[0].email, summarize_marks(marks, markable_map)
+
+
+def _assignment_names():
+    names = {
+        me.assignment_name or "Assignment"
+        for me in load_markable_map().values()
+        if me.submission_type == "assignment"
+    }
+    return sorted(names)
+
+
+def iter_gradebook_csv():
+    """
+    Stream the gradebook as CSV, one line per student.
+
+    Columns are the student, homework totals and one percentage column per
+    configured assignment (empty when the student has no marks for it).
+
+    Yields:
+        str: CSV text, header first
+    """
+    assignments = _assignment_names()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(
+        ["user_id", "name", "email", "homework_earned", "homework_possible", "homework_percentage"]
+        + [f"{name} (%)" for name in assignments]
+    )
+    yield flush()
+
+    for user_id, name, email, summary in iter_student_summaries():
+        percentages = {a["name"]: a["percentage"] for a in summary["assignments"]}
+        writer.writerow(
+            [user_id, name, email, summary["homeworkEarned"], summary["homeworkPossible"],
+             summary["homeworkPercentage"]]
+            + [percentages.get(a, "") for a in assignments]
+        )
+        yield flush()
+
+
+def iter_gradebook_ndjson():
+    """
+    Stream the gradebook as newline-delimited JSON, one object per student.
+
+    Yields:
+        str: ``{"userId", "name", "email", "summary"}`` lines
+    """
+    for user_id, name, email, summary in iter_student_summaries():
+        yield json.dumps({"userId": user_id, "name": name, "email": email, "summary": summary}) + "\n"
+
+
+def _student_version_key(user_id):
+    return f"{_KEY_PREFIX}:version:{user_id}"
+
+
+def _versions(user_id):
+    """Current (student, shared) version tokens, creating missing ones."""
+    keys = [_student_version_key(user_id), _SHARED_VERSION_KEY]
+    versions = cache.get_many(*keys)
+    missing = {key: uuid.uuid4().hex for key, version in zip(keys, versions) if version is None}
+    if missing:
+        # A fresh token (rather than a default) means an evicted version can
+        # never match a payload cached under an older token
+        cache.set_many(missing, timeout=0)
+    return [version if version is not None else missing[key] for key, version in zip(keys, versions)]
+
+
+def cached_student_marks(user_id, build):
+    """
+    The mark viewer payload for *user_id*, from the cache when current.
+
+    Args:
+        user_id (int): Student
+        build (callable): Computes the payload on a miss
+
+    Returns:
+        dict: the payload
+    """
+    student_version, shared_version = _versions(user_id)
+    key = f"{_KEY_PREFIX}:{user_id}:{student_version}:{shared_version}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, timeout=MY_MARKS_TIMEOUT)
+    return payload
+
+
+def invalidate_student_marks(user_ids):
+    """Force a rebuild of the given students' cached mark viewer payloads."""
+    keys = {_student_version_key(user_id) for user_id in user_ids if user_id is not None}
+    if keys:
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, timeout=0)
+
+
+def invalidate_all_marks():
+    """
+    Force a rebuild of every cached mark viewer payload (markable config,
+    category releases or bulk mark changes).
+    """
+    cache.set(_SHARED_VERSION_KEY, uuid.uuid4().hex, timeout=0)
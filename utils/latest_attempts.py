@@ -0,0 +1,93 @@
+"""
+Latest attempt per (student, challenge), selected in SQL.
+
+Students can submit a challenge several times and each attempt gets its own
+marking entry.  Views that show one line per challenge only want the latest
+one: marked attempts win over unmarked ones, then the most recently marked,
+then the newest row.  ``ROW_NUMBER() OVER (PARTITION BY user, challenge)``
+picks it in the database; databases without window functions (SQLite before
+3.25, MySQL before 8.0) get an equivalent correlated ``LIMIT 1`` subquery.
+"""
+
+import sqlite3
+from CTFd.models import db, Submissions, Challenges
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from ..models import MarkingSubmission
+
+
+def _attempt_order(marking):
+    # Booleans sort False first: marked attempts, then ones with a marked_at
+    # (spelled out because NULL ordering differs between databases)
+    return (
+        marking.mark.is_(None),
+        marking.marked_at.is_(None),
+        marking.marked_at.desc(),
+        marking.id.desc(),
+    )
+
+
+def supports_window_functions():
+    """Whether the configured database supports ``ROW_NUMBER() OVER``."""
+    dialect = db.engine.dialect
+    if dialect.name == "sqlite":
+        return sqlite3.sqlite_version_info >= (3, 25, 0)
+    if dialect.name in ("mysql", "mariadb"):
+        version = dialect.server_version_info or ()
+        if getattr(dialect, "is_mariadb", False):
+            return version >= (10, 2)
+        return version >= (8, 0)
+    return True
+
+
+def latest_attempt_filter(*criteria, marked_only=False):
+    """
+    Condition keeping only the latest attempt per (student, challenge).
+
+    Apply it to a query whose FROM already includes ``MarkingSubmission``
+    joined to ``Submissions``.  *criteria* (on ``MarkingSubmission``,
+    ``Submissions`` or ``Challenges``) narrow the window to the rows the
+    query is about, e.g. one student or one category; they should select
+    whole (student, challenge) groups rather than individual attempts.
+
+    Args:
+        *criteria: SQL conditions restricting the ranked rows
+        marked_only (bool): Only consider marked attempts
+
+    Returns:
+        SQL condition on ``MarkingSubmission.id``
+    """
+    if marked_only:
+        criteria = criteria + (MarkingSubmission.mark.isnot(None),)
+
+    if supports_window_functions():
+        ranked = (
+            select(
+                MarkingSubmission.id.label("id"),
+                func.row_number().over(
+                    partition_by=(Submissions.user_id, Submissions.challenge_id),
+                    order_by=_attempt_order(MarkingSubmission),
+                ).label("attempt_rank"),
+            )
+            .select_from(MarkingSubmission)
+            .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
+            .join(Challenges, Submissions.challenge_id == Challenges.id)
+            .where(*criteria)
+            .subquery()
+        )
+        return MarkingSubmission.id.in_(select(ranked.c.id).where(ranked.c.attempt_rank == 1))
+
+    # Correlated fallback: the outer row must be the first of its group
+    other_marking = aliased(MarkingSubmission)
+    other_submission = aliased(Submissions)
+    latest_id = (
+        select(other_marking.id)
+        .join(other_submission, other_marking.submission_id == other_submission.id)
+        .where(other_submission.user_id == Submissions.user_id)
+        .where(other_submission.challenge_id == Submissions.challenge_id)
+        .order_by(*_attempt_order(other_marking))
+        .limit(1)
+    )
+    if marked_only:
+        latest_id = latest_id.where(other_marking.mark.isnot(None))
+    return MarkingSubmission.id == latest_id.scalar_subquery()
@@ -6,6 +6,9 @@ Creates a PDF with student's marking feedback for each submission.
 from io import BytesIO
 from datetime import datetime
 from html import escape as html_escape
+import logging
+
+logger = logging.getLogger(__name__)
 
 try:
     from reportlab.lib.pagesizes import letter, A4
@@ -42,7 +45,7 @@ def generate_student_report_pdf(student_name, student_email, submissions, ctf_na
     if not REPORTLAB_AVAILABLE:
         raise ImportError("reportlab is required for PDF generation. Install with: pip install reportlab")
     
-    print(f"[PDF GEN] Starting PDF generation for {student_name}, {len(submissions)} submissions", flush=True)
+    logger.debug(f"Starting PDF generation for {student_name}, {len(submissions)} submissions")
     
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=0.75*inch, leftMargin=0.75*inch,
@@ -138,7 +141,7 @@ def generate_student_report_pdf(student_name, student_email, submissions, ctf_na
             90: "Great",
             100: "HoF",
         }
-        print(f"[PDF GEN] Rendering section '{section_title}' with {len(section_submissions)} submissions", flush=True)
+        logger.debug(f"Rendering section '{section_title}' with {len(section_submissions)} submissions")
         if not section_submissions:
             content.append(Paragraph(f"{section_title}: None", normal_style))
             content.append(Spacer(1, 0.15*inch))
@@ -147,7 +150,6 @@ def generate_student_report_pdf(student_name, student_email, submissions, ctf_na
         content.append(Paragraph(section_title, heading_style))
 
         for idx, sub in enumerate(section_submissions, 1):
-            print(f"[PDF GEN] Processing submission {idx}: {sub.get('challenge')}", flush=True)
             challenge = html_escape(sub.get('challenge', 'Unknown Challenge'))
             mark = sub.get('mark')
             mark_name = sub.get('mark_name') or percent_to_name.get(mark, str(mark) if mark is not None else None)
@@ -213,12 +215,12 @@ def generate_student_report_pdf(student_name, student_email, submissions, ctf_na
 
     # Submissions sections
     if submissions:
-        print(f"[PDF GEN] Building detailed feedback section with {len(submissions)} submissions", flush=True)
+        logger.debug(f"Building detailed feedback section with {len(submissions)} submissions")
         content.append(Paragraph("Detailed Feedback", heading_style))
         technical_subs = [s for s in submissions if s.get('is_technical')]
         non_technical_subs = [s for s in submissions if not s.get('is_technical')]
         
-        print(f"[PDF GEN] Technical: {len(technical_subs)}, Non-technical: {len(non_technical_subs)}", flush=True)
+        logger.debug(f"Technical: {len(technical_subs)}, Non-technical: {len(non_technical_subs)}")
 
         render_submissions_section("non-technical", non_technical_subs)
         
@@ -238,14 +240,71 @@ def generate_student_report_pdf(student_name, student_email, submissions, ctf_na
     ))
     
     # Build PDF
-    print(f"[PDF GEN] Building PDF with {len(content)} content elements", flush=True)
+    logger.debug(f"Building PDF with {len(content)} content elements")
     try:
         doc.build(content)
-        print(f"[PDF GEN] PDF build successful, buffer size: {buffer.tell()}", flush=True)
+        logger.debug(f"PDF build successful, buffer size: {buffer.tell()}")
     except Exception as e:
-        print(f"[PDF GEN ERROR] Failed to build PDF: {e}", flush=True)
-        import traceback
-        print(f"[PDF GEN ERROR] Traceback: {traceback.format_exc()}", flush=True)
+        logger.exception(f"Failed to build PDF: {e}")
         raise
     buffer.seek(0)
     return buffer
+
+
+def render_report_pdf_bytes(report):
+    """
+    Render one report to PDF bytes.
+
+    Module-level (and taking a plain dict of
+    :func:`generate_student_report_pdf` keyword arguments) so it can be sent
+    to a worker process.
+    """
+    return generate_student_report_pdf(**report).getvalue()
+
+
+def render_report_pdfs(reports, max_workers=None):
+    """
+    Render many reports, in worker processes when *max_workers* > 1.
+
+    ReportLab rendering is CPU-bound, so bulk runs spread it over a
+    ``ProcessPoolExecutor``.  At most ``max_workers * 4`` renders are in
+    flight at once so a large cohort never piles up in memory, and results
+    are yielded strictly in input order.
+
+    Args:
+        reports (iterable): (key, report dict) pairs
+        max_workers (int): Worker processes; ``None``/``0``/``1`` renders
+            serially in this process
+
+    Yields:
+        tuple: (key, pdf_bytes or None, error message or None)
+    """
+    if not max_workers or max_workers <= 1:
+        for key, report in reports:
+            try:
+                yield key, render_report_pdf_bytes(report), None
+            except Exception as e:
+                yield key, None, str(e)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    window = max_workers * 4
+    pending = deque()
+    reports = iter(reports)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            while len(pending) < window:
+                try:
+                    key, report = next(reports)
+                except StopIteration:
+                    break
+                pending.append((key, pool.submit(render_report_pdf_bytes, report)))
+            if not pending:
+                return
+            key, future = pending.popleft()
+            try:
+                yield key, future.result(), None
+            except Exception as e:
+                yield key, None, str(e)
@@ -0,0 +1,229 @@
+"""
+Admission control for the automarker endpoints.
+
+Every client (its IP address, or the valid automarker secret it presents)
+gets a token bucket per endpoint group: ``rate`` tokens per second refill it
+up to ``burst``, and each request takes one.  An empty bucket rejects the request
+with the time until a token is available, which callers send as
+``Retry-After``.  On top of that, submissions are refused while the async
+submission queue is deeper than ``MARKING_HUB_MAX_QUEUE_DEPTH``: the database
+is already behind and more work would only lengthen the backlog.
+
+Buckets live in each worker process by default, so the effective limit is
+per worker.  With ``MARKING_HUB_RATE_LIMIT_BACKEND=cache`` they are kept in
+CTFd's cache instead and shared by all workers; the read-modify-write is not
+atomic, so under heavy contention the shared limit is approximate.
+
+Allowed and rejected requests are counted per process (and, with the cache
+backend, across workers) for tuning the limits.
+"""
+
+import hashlib
+import hmac
+import math
+import threading
+import time
+from CTFd.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Idle buckets are dropped once a process tracks more clients than this
+MAX_LOCAL_BUCKETS = 10000
+
+# Seconds a queue depth reading is reused before counting again
+QUEUE_DEPTH_TTL = 1.0
+
+_KEY_PREFIX = "marking_hub:rate_limit"
+GROUPS = ("tokens", "submissions")
+OUTCOMES = ("allowed", "limited", "overloaded")
+
+_lock = threading.Lock()
+_limiters = {}
+_counters = {}
+_queue_depth = (0.0, 0)
+
+
+class TokenBucket:
+    """Bucket refilled at *rate* tokens per second, holding at most *burst*."""
+
+    def __init__(self, rate, burst, tokens=None, updated=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst if tokens is None else tokens
+        self.updated = updated
+
+    def take(self, now, cost=1):
+        """
+        Take *cost* tokens if available.
+
+        Returns:
+            float: 0 when taken, otherwise seconds until they would be
+        """
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by client, in this process or in CTFd's cache.
+
+    Args:
+        name (str): Endpoint group, part of the cache keys
+        rate (float): Tokens per second (0 disables limiting)
+        burst (int): Bucket size
+        shared (bool): Keep buckets in CTFd's cache
+    """
+
+    def __init__(self, name, rate, burst, shared=False):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.shared = shared
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def acquire(self, client):
+        """
+        Returns:
+            float: 0 when admitted, otherwise seconds to wait
+        """
+        if not self.rate:
+            return 0.0
+        if self.shared:
+            return self._acquire_shared(client)
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                if len(self.buckets) >= MAX_LOCAL_BUCKETS:
+                    self._drop_idle(now)
+                bucket = self.buckets[client] = TokenBucket(self.rate, self.burst)
+            return bucket.take(now)
+
+    def _drop_idle(self, now):
+        # A bucket that would have refilled completely carries no state
+        full_after = self.burst / self.rate
+        for client in [c for c, b in self.buckets.items() if now - b.updated >= full_after]:
+            del self.buckets[client]
+
+    def _acquire_shared(self, client):
+        key = f"{_KEY_PREFIX}:{self.name}:{client}"
+        now = time.time()
+        state = cache.get(key)
+        bucket = TokenBucket(self.rate, self.burst, *(state or (None, None)))
+        wait = bucket.take(now)
+        # Nothing worth keeping once the bucket would be full again
+        cache.set(key, (bucket.tokens, bucket.updated), timeout=math.ceil(self.burst / self.rate) + 1)
+        return wait
+
+
+def client_key(app, secret_header, ip):
+    """
+    Rate-limit key for a request.
+
+    With ``MARKING_HUB_RATE_LIMIT_KEY=secret`` a presented automarker secret
+    that matches the configured one (hashed) is the key, so every automarker
+    sharing it shares one budget.  Otherwise the client IP is: keying by an
+    unverified header would give every made-up secret a fresh bucket.
+    """
+    configured = app.config.get('MARKING_HUB_AUTOMARKER_SECRET')
+    if (
+        secret_header
+        and configured
+        and app.config['MARKING_HUB_RATE_LIMIT_KEY'] == "secret"
+        and hmac.compare_digest(secret_header, configured)
+    ):
+        return "secret:" + hashlib.sha256(secret_header.encode()).hexdigest()[:16]
+    return f"ip:{ip}"
+
+
+def get_limiter(app, name):
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = _limiters[name] = RateLimiter(
+                    name,
+                    app.config['MARKING_HUB_RATE_LIMIT'],
+                    app.config['MARKING_HUB_RATE_LIMIT_BURST'],
+                    shared=app.config['MARKING_HUB_RATE_LIMIT_BACKEND'] == "cache",
+                )
+    return limiter
+
+
+def current_queue_depth():
+    """Queued plus in-progress async submissions, re-counted at most every QUEUE_DEPTH_TTL."""
+    global _queue_depth
+
+    checked, depth = _queue_depth
+    if time.monotonic() - checked >= QUEUE_DEPTH_TTL:
+        from .submission_queue import queue_depth
+        counts = queue_depth()
+        depth = counts["queued"] + counts["processing"]
+        _queue_depth = (time.monotonic(), depth)
+    return depth
+
+
+def _count(app, name, outcome):
+    with _lock:
+        _counters[(name, outcome)] = _counters.get((name, outcome), 0) + 1
+    if app.config['MARKING_HUB_RATE_LIMIT_BACKEND'] == "cache":
+        try:
+            cache.inc(f"{_KEY_PREFIX}:counter:{name}:{outcome}")
+        except Exception as e:
+            logger.debug(f"Could not update shared rate limit counter: {e}")
+
+
+def admit(app, name, client, check_queue=False):
+    """
+    Decide whether to serve a request.
+
+    Args:
+        app: Flask app (for the limits)
+        name (str): Endpoint group
+        client (str): From :func:`client_key`
+        check_queue (bool): Also refuse while the submission queue is too deep
+
+    Returns:
+        tuple: (None, 0) when admitted, otherwise ("limited" or "overloaded",
+        seconds the client should wait)
+    """
+    if check_queue:
+        max_depth = app.config['MARKING_HUB_MAX_QUEUE_DEPTH']
+        if max_depth and current_queue_depth() >= max_depth:
+            _count(app, name, "overloaded")
+            return "overloaded", app.config['MARKING_HUB_OVERLOAD_RETRY_AFTER']
+    wait = get_limiter(app, name).acquire(client)
+    if wait:
+        _count(app, name, "limited")
+        return "limited", wait
+    _count(app, name, "allowed")
+    return None, 0
+
+
+def counters(app):
+    """
+    Returns:
+        dict: ``process`` counts and, with the cache backend, ``shared``
+        counts, each endpoint group -> outcome -> count
+    """
+    with _lock:
+        snapshot = dict(_counters)
+    names = sorted(set(GROUPS) | {name for name, _ in snapshot})
+    result = {
+        "process": {name: {outcome: snapshot.get((name, outcome), 0) for outcome in OUTCOMES} for name in names},
+    }
+    if app.config['MARKING_HUB_RATE_LIMIT_BACKEND'] == "cache":
+        shared = {}
+        for name in names:
+            keys = [f"{_KEY_PREFIX}:counter:{name}:{outcome}" for outcome in OUTCOMES]
+            shared[name] = {outcome: int(value or 0) for outcome, value in zip(OUTCOMES, cache.get_many(*keys))}
+        result["shared"] = shared
+    return result
@@ -0,0 +1,190 @@
+"""
+Content-addressed on-disk cache for generated student report PDFs.
+
+A report PDF is a pure function of its inputs (student name/email, the
+submissions list, subtitle and CTF name), so the cache key is a SHA-256 of
+those inputs.  Any mark or comment change alters the submissions list and
+therefore the key, which makes explicit invalidation unnecessary: stale
+entries simply stop being requested and age out of the LRU.
+
+Files are written atomically (temp file + ``os.replace``) so several workers
+can share one cache directory.  Recency is tracked through file mtimes,
+which are bumped on every hit.
+
+A cache directory that can't be created or written to disables the cache
+(logged once per directory) rather than failing: lookups miss and stores
+are skipped, so reports are rendered directly.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Directories already reported as unusable, so the warning is logged once
+_unavailable = set()
+
+
+def report_cache_key(report):
+    """
+    Hash the inputs of :func:`generate_student_report_pdf`.
+
+    Args:
+        report (dict): student_name, student_email, submissions, ctf_name, subtitle
+
+    Returns:
+        str: hex digest
+    """
+    canonical = json.dumps(
+        {
+            "student_name": report.get("student_name"),
+            "student_email": report.get("student_email"),
+            "submissions": report.get("submissions"),
+            "subtitle": report.get("subtitle"),
+            "ctf_name": report.get("ctf_name"),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ReportCache:
+    """
+    Size-bounded LRU cache of PDF files keyed by :func:`report_cache_key`.
+
+    Args:
+        directory (str): Cache directory (created if missing)
+        max_bytes (int): Total size above which least recently used files
+            are evicted
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if not os.access(directory, os.W_OK):
+                raise PermissionError(f"{directory} is not writable")
+            self.available = True
+        except OSError as e:
+            self.available = False
+            if directory not in _unavailable:
+                _unavailable.add(directory)
+                logger.warning(f"Report PDF cache disabled, rendering reports directly: {e}")
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key):
+        """Return the cached file path for *key* (marking it recently used), or None."""
+        if not self.available:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Report cache lookup failed: {e}")
+            return None
+        return path
+
+    def put(self, key, data):
+        """
+        Store *data* under *key* and evict old entries if over budget.
+
+        Returns:
+            str: path of the cached file, or None when the cache is disabled
+
+        Raises:
+            OSError: if the file couldn't be written
+        """
+        if not self.available:
+            return None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.evict()
+        return self.path(key)
+
+    def evict(self):
+        """Delete least recently used PDFs until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            if total <= self.max_bytes:
+                break
+        logger.debug(f"Evicted {removed} cached report PDFs")
+        return removed
+
+    def get_or_render(self, report):
+        """
+        Find the cached PDF for *report*, rendering and storing it on a miss.
+
+        Args:
+            report (dict): keyword arguments for generate_student_report_pdf
+
+        Returns:
+            tuple: (path to the cached file, or the rendered ``BytesIO`` when it
+            couldn't be cached; hit: bool)
+        """
+        from .pdf_generator import generate_student_report_pdf
+
+        key = report_cache_key(report)
+        path = self.get(key)
+        if path is not None:
+            return path, True
+        pdf_buffer = generate_student_report_pdf(**report)
+        try:
+            path = self.put(key, pdf_buffer.getbuffer())
+            if path is not None:
+                return path, False
+        except OSError as e:
+            logger.warning(f"Could not cache report PDF: {e}")
+        pdf_buffer.seek(0)
+        return pdf_buffer, False
+
+
+def get_report_cache():
+    """The report cache configured for the current app."""
+    from flask import current_app
+
+    return ReportCache(
+        current_app.config["MARKING_HUB_REPORT_CACHE_DIR"],
+        current_app.config.get("MARKING_HUB_REPORT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES),
+    )
@@ -0,0 +1,152 @@
+"""
+Streamed ZIP export of student report PDFs.
+
+The archive is produced by :mod:`zipfile` writing into a non-seekable sink
+that is drained after every entry, so the response body is generated while
+it is sent and memory use doesn't grow with the cohort.  Students stream in
+from the cohort query a window at a time; cached PDFs are copied from the
+report cache and missing ones are rendered (in worker processes when
+configured), cached and added as they complete.
+"""
+
+import itertools
+import re
+import zipfile
+from datetime import datetime
+from CTFd.utils import get_config
+from .report_cache import get_report_cache, report_cache_key
+from .report_generator import (
+    _pdf_workers,
+    _report_view_args,
+    iter_cohort_report_data,
+    report_student_ids,
+)
+from .pdf_generator import render_report_pdfs
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied from a cached PDF per write
+COPY_CHUNK_SIZE = 64 * 1024
+
+# Students looked up in the cache and rendered together
+EXPORT_WINDOW = 50
+
+
+class _ZipSink:
+    """Write-only, non-seekable file object collecting zipfile output."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Yield everything written since the last drain (nothing if empty)."""
+        if self.chunks:
+            chunks, self.chunks = self.chunks, []
+            yield b"".join(chunks)
+
+
+def _entry_name(student_name, user_id, category=None):
+    safe_name = re.sub(r"[^\w.-]+", "_", student_name or "student").strip("_") or "student"
+    return f"{safe_name}_{user_id}_{category or 'full'}.pdf"
+
+
+def _zip_info(name):
+    info = zipfile.ZipInfo(name, date_time=datetime.utcnow().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _student_reports(category, ctf_name):
+    """Yield (entry name, report) for every student with something to report."""
+    for user_id, student in iter_cohort_report_data(category=category, user_ids=report_student_ids(category)):
+        if not student["submissions"]:
+            continue
+        yield (
+            _entry_name(student["name"], user_id, category),
+            _report_view_args(student["name"], student["email"], student["submissions"], ctf_name, category),
+        )
+
+
+def export_reports_zip(category=None):
+    """
+    Stream a ZIP of every student's report PDF for *category*.
+
+    Students are streamed from the cohort query and handled in windows of
+    EXPORT_WINDOW: cached PDFs in the window are copied into the archive and
+    the rest are rendered together (in worker processes when configured),
+    cached and added, so at most one window of reports is held at a time.
+    Students whose report fails to render are listed in an ``errors.txt``
+    entry at the end of the archive.
+
+    Args:
+        category (str): Optional category; the full report otherwise
+
+    Returns:
+        tuple: (whether there is any report to export, generator of ZIP bytes)
+    """
+    ctf_name = get_config('ctf_name', 'CTF')
+    report_cache = get_report_cache()
+    max_workers = _pdf_workers()
+
+    students = _student_reports(category, ctf_name)
+    first = next(students, None)
+    if first is None:
+        return False, iter(())
+
+    def copy_cached(archive, sink, name, key):
+        with open(report_cache.path(key), "rb") as pdf_file:
+            with archive.open(_zip_info(name), mode="w") as entry:
+                while True:
+                    chunk = pdf_file.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    yield from sink.drain()
+
+    def generate():
+        sink = _ZipSink()
+        errors = []
+        with zipfile.ZipFile(sink, mode="w") as archive:
+            window = itertools.chain([first], students)
+            while True:
+                batch = list(itertools.islice(window, EXPORT_WINDOW))
+                if not batch:
+                    break
+                missing = []
+                for name, report in batch:
+                    key = report_cache_key(report)
+                    if report_cache.get(key) is None:
+                        missing.append(((name, key), report))
+                        continue
+                    try:
+                        yield from copy_cached(archive, sink, name, key)
+                    except FileNotFoundError:
+                        # Evicted since the lookup; render it with the others
+                        missing.append(((name, key), report))
+                    yield from sink.drain()
+
+                for (name, key), pdf_data, error in render_report_pdfs(missing, max_workers=max_workers):
+                    if error is not None:
+                        logger.error(f"Report export failed for {name}: {error}")
+                        errors.append(f"{name}: {error}")
+                        continue
+                    try:
+                        report_cache.put(key, pdf_data)
+                    except OSError as e:
+                        logger.warning(f"Could not cache report PDF: {e}")
+                    archive.writestr(_zip_info(name), pdf_data)
+                    yield from sink.drain()
+
+            if errors:
+                archive.writestr(_zip_info("errors.txt"), "\n".join(errors) + "\n")
+        yield from sink.drain()
+
+    return True, generate()
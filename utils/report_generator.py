@@ -7,143 +7,264 @@ from CTFd.models import db, Users, Submissions
 from CTFd.utils.email import sendmail
 from CTFd.utils import get_config
 from ..models import MarkingSubmission, StudentReport
-from .pdf_generator import generate_student_report_pdf
+from .pdf_generator import render_report_pdfs
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def get_student_submissions_for_report(user_id, category=None):
+# Mark percentage to name mapping
+PERCENT_TO_NAME = {
+    0: "Incomplete",
+    30: "Attempted",
+    60: "Good",
+    90: "Great",
+    100: "HoF",
+}
+
+# Rows fetched per round trip when streaming a whole cohort
+COHORT_BATCH_SIZE = 1000
+
+# Reports missing from the cache rendered together by the category pre-render
+PRERENDER_WINDOW = 50
+
+# Placeholder rows inserted per statement batch during zero-fill
+ZERO_FILL_BATCH_SIZE = 500
+
+# Sent reports recorded per commit during bulk runs
+HISTORY_COMMIT_BATCH_SIZE = 25
+
+
+def _report_display_name(challenge_name):
+    """Return (display_name, is_technical) for a challenge name."""
+    challenge_name = challenge_name or "Unknown"
+    stripped_name = challenge_name.lstrip()
+    is_technical = stripped_name.upper().startswith("TECH")
+    if is_technical:
+        remainder = stripped_name[4:].lstrip(" :-_")
+        return remainder or challenge_name, True
+    return challenge_name, False
+
+
+def _report_rows_query(category=None, user_ids=None):
     """
-    Get all marked submissions for a student.
+    Column query of (student, marking submission, challenge) rows for reports.
 
-    When a category/week is specified this also ensures the returned list
-    includes **every challenge** in that category.  If the student has not
-    submitted an exercise the corresponding entry is injected with a 0 mark
-    and a special "0% (non-submission_)" label so the report can display the
-    missing work as part of the week.  This mirrors the behaviour of the
-    student-facing report UI and allows PDFs to show unattempted exercises.
+    Selecting plain columns avoids loading ORM objects and their lazy
+    relationships, so one query carries everything the report needs.  Only
+    the latest attempt per challenge is returned.  Rows come in a total order
+    (per student, then submission time, challenge and submission), so a
+    student's report is identical whether built alone or with the cohort.
 
     Args:
-        user_id (int): Student user ID
         category (str): Optional category to filter by
-        
-    Returns:
-        list: of dicts with submission info (including placeholders)
+        user_ids (iterable): Optional students to filter by
     """
-    from CTFd.models import Submissions, Users, Challenges
-    
-    # Debug: Log received user_id and category
-    print(f"[REPORT DEBUG] Called with user_id={user_id}, category='{category}'", flush=True)
-    student = Users.query.get(user_id)
-    if not student:
-        print(f"[REPORT DEBUG] Student {user_id} not found", flush=True)
-        return []
-    
+    from CTFd.models import Challenges
+    from .latest_attempts import latest_attempt_filter
+
     query = (
-        MarkingSubmission.query
+        db.session.query(
+            Submissions.user_id.label("user_id"),
+            Users.name.label("user_name"),
+            Users.email.label("user_email"),
+            Challenges.id.label("challenge_id"),
+            Challenges.name.label("challenge_name"),
+            Challenges.value.label("challenge_value"),
+            MarkingSubmission.mark.label("mark"),
+            MarkingSubmission.comment.label("comment"),
+            Submissions.date.label("date"),
+            Submissions.provided.label("provided"),
+        )
+        .select_from(MarkingSubmission)
         .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
         .join(Challenges, Submissions.challenge_id == Challenges.id)
-        .filter(Submissions.user_id == user_id)
+        .join(Users, Submissions.user_id == Users.id)
         # avoid the polymorphic loading error by skipping any row whose type
         # column is unexpectedly NULL; such a record is corrupt and should be
         # fixed, but this prevents the entire report from crashing.
         .filter(Submissions.type.isnot(None))
     )
-    
+    criteria = []
     if category:
-        query = query.filter(Challenges.category == category)
-    
-    marking_subs = query.all()
-    print(f"[REPORT DEBUG] Found {len(marking_subs)} marking submissions for user {user_id} in category '{category}'", flush=True)
-    for ms in marking_subs:
-        print(f"[REPORT DEBUG] marking_sub id={ms.id}, mark={ms.mark}, submission_id={ms.submission_id}", flush=True)
-    
-    report_data = []
-    # Mark percentage to name mapping
-    percent_to_name = {
-        0: "Incomplete",
-        30: "Attempted",
-        60: "Good",
-        90: "Great",
-        100: "HoF",
-    }
+        criteria.append(Challenges.category == category)
+    if user_ids is not None:
+        criteria.append(Submissions.user_id.in_(list(user_ids)))
+    return (
+        query.filter(*criteria)
+        .filter(latest_attempt_filter(*criteria))
+        .order_by(Submissions.user_id, Submissions.date, Challenges.id, Submissions.id)
+    )
 
-    # keep track of which challenges we've already accounted for (used when injecting missing ones)
-    existing_challenge_ids = set()
 
-    for marking_sub in marking_subs:
-        sub = marking_sub.submission
-        challenge = sub.challenge
-        challenge_name = challenge.name if challenge else "Unknown"
-        stripped_name = challenge_name.lstrip()
-        is_technical = stripped_name.upper().startswith("TECH")
+def _category_challenges(category):
+    """(id, name, value) of every challenge in *category*."""
+    from CTFd.models import Challenges
 
-        print(f"[REPORT DEBUG] Processing submission {marking_sub.id}: challenge={challenge_name}, mark={marking_sub.mark}, is_technical={is_technical}", flush=True)
+    return (
+        db.session.query(Challenges.id, Challenges.name, Challenges.value)
+        .filter(Challenges.category == category)
+        .order_by(Challenges.id)
+        .all()
+    )
 
-        if challenge:
-            existing_challenge_ids.add(challenge.id)
 
-        if not is_technical and marking_sub.mark is None:
-            print(f"[REPORT DEBUG] Skipping unmarked non-technical submission {marking_sub.id}", flush=True)
-            continue
+def _build_report_entries(rows, category_challenges=None):
+    """
+    Turn one student's report rows into the list consumed by the PDF/email.
 
-        display_name = challenge_name
-        if is_technical:
-            remainder = stripped_name[4:].lstrip(" :-_")
-            display_name = remainder or challenge_name
+    Unmarked non-technical submissions are skipped.  When
+    *category_challenges* is given, every challenge the student has no row
+    for is injected as a 0 mark labelled "0% (non-submission_)".
+
+    Args:
+        rows (iterable): rows from :func:`_report_rows_query`
+        category_challenges (list): (id, name, value) of the category's challenges
 
-        # Map mark percentage to name if possible
-        mark_name = percent_to_name.get(marking_sub.mark, str(marking_sub.mark) if marking_sub.mark is not None else None)
+    Returns:
+        list: of report entry dicts sorted by submission time, then challenge
+        (a total order: the report cache key hashes the list as ordered)
+    """
+    report_data = []
+    # keep track of which challenges we've already accounted for (used when injecting missing ones)
+    existing_challenge_ids = set()
 
-        report_data.append({
+    for row in rows:
+        existing_challenge_ids.add(row.challenge_id)
+        display_name, is_technical = _report_display_name(row.challenge_name)
+
+        if not is_technical and row.mark is None:
+            continue
+
+        report_data.append((row.challenge_id, {
             'challenge': display_name,
-            'submitted_at': sub.date.strftime("%Y-%m-%d %H:%M") if sub.date else 'N/A',
-            'flag': sub.provided or '',
-            'mark': marking_sub.mark,
-            'mark_name': mark_name,
-            'challengeValue': challenge.value if challenge else 100,  # Max points for the challenge
-            'comment': marking_sub.comment or '',
+            'submitted_at': row.date.strftime("%Y-%m-%d %H:%M") if row.date else 'N/A',
+            'flag': row.provided or '',
+            'mark': row.mark,
+            'mark_name': PERCENT_TO_NAME.get(row.mark, str(row.mark) if row.mark is not None else None),
+            'challengeValue': row.challenge_value,  # Max points for the challenge
+            'comment': row.comment or '',
             'is_technical': is_technical,
-        })
+        }))
+
     # if category-specific request, include any challenges in that bucket which the student
     # never submitted. These should show up as 0% with a non-submission marker.
-    if category:
-        from CTFd.models import Challenges
-        all_challenges = Challenges.query.filter(Challenges.category == category).all()
-        print(f"[REPORT DEBUG] Category '{category}' has {len(all_challenges)} total challenges", flush=True)
-        for challenge in all_challenges:
-            if challenge.id in existing_challenge_ids:
-                continue
-            challenge_name = challenge.name or "Unknown"
-            stripped_name = challenge_name.lstrip()
-            is_technical = stripped_name.upper().startswith("TECH")
-            display_name = challenge_name
-            if is_technical:
-                remainder = stripped_name[4:].lstrip(" :-_")
-                display_name = remainder or challenge_name
-
-                    # treat non-submission as 0 mark
-            mark = 0
+    for challenge_id, challenge_name, challenge_value in category_challenges or []:
+        if challenge_id in existing_challenge_ids:
+            continue
+        display_name, is_technical = _report_display_name(challenge_name)
+        report_data.append((challenge_id, {
+            'challenge': display_name,
+            'submitted_at': '',
+            'flag': '',
+            'mark': 0,
             # use the requested wording with trailing underscore
-            mark_name = "0% (non-submission_)"  # explicit label for phantom entries
+            'mark_name': "0% (non-submission_)",  # explicit label for phantom entries
+            'challengeValue': challenge_value,
+            'comment': '',
+            'is_technical': is_technical,
+        }))
+
+    # Minute-resolution times tie often (zero-fill rows share one, placeholders
+    # have none), so the challenge id breaks ties
+    report_data.sort(key=lambda item: (item[1]['submitted_at'], item[0]))
+    return [entry for _, entry in report_data]
+
+
+def get_student_submissions_for_report(user_id, category=None):
+    """
+    Get all marked submissions for a student.
+
+    When a category/week is specified this also ensures the returned list
+    includes **every challenge** in that category.  If the student has not
+    submitted an exercise the corresponding entry is injected with a 0 mark
+    and a special "0% (non-submission_)" label so the report can display the
+    missing work as part of the week.  This mirrors the behaviour of the
+    student-facing report UI and allows PDFs to show unattempted exercises.
+
+    Args:
+        user_id (int): Student user ID
+        category (str): Optional category to filter by
+        
+    Returns:
+        list: of dicts with submission info (including placeholders)
+    """
+    if not Users.query.get(user_id):
+        logger.debug(f"Report requested for missing student {user_id}")
+        return []
+
+    rows = _report_rows_query(category, user_ids=[user_id]).all()
+    report_data = _build_report_entries(rows, _category_challenges(category) if category else None)
+    logger.debug(f"Report for user {user_id} (category={category}): {len(report_data)} entries")
+    return report_data
+
+
+def iter_cohort_report_data(category=None, user_ids=None):
+    """
+    Stream report data for a cohort, one student at a time.
+
+    Every (student, marking submission, challenge) row is streamed ordered by
+    student and each student's rows are turned into report entries as soon
+    as the next student starts, so only one student's report is held at a
+    time.  Students without any rows follow, loaded in batches.
+
+    Args:
+        category (str): Optional category to filter by
+        user_ids (iterable): Students to load; students without any rows are
+            still yielded (with only non-submission placeholders, if any)
+
+    Yields:
+        tuple: (user_id, {"name", "email", "submissions"})
+    """
+    from itertools import groupby
+
+    category_challenges = _category_challenges(category) if category else None
+    user_ids = set(user_ids) if user_ids is not None else None
+
+    query = _report_rows_query(category, user_ids=user_ids)
+
+    seen = set()
+    for user_id, rows in groupby(query.yield_per(COHORT_BATCH_SIZE), key=lambda row: row.user_id):
+        rows = list(rows)
+        seen.add(user_id)
+        yield user_id, {
+            "name": rows[0].user_name,
+            "email": rows[0].user_email,
+            "submissions": _build_report_entries(rows, category_challenges),
+        }
+
+    # Students with no marking rows at all still get their placeholders
+    missing = sorted(user_ids - seen) if user_ids is not None else []
+    for offset in range(0, len(missing), COHORT_BATCH_SIZE):
+        for user_id, name, email in (
+            db.session.query(Users.id, Users.name, Users.email)
+            .filter(Users.id.in_(missing[offset:offset + COHORT_BATCH_SIZE]))
+            .order_by(Users.id)
+            .all()
+        ):
+            yield user_id, {
+                "name": name,
+                "email": email,
+                "submissions": _build_report_entries([], category_challenges),
+            }
+
+
+def load_cohort_report_data(category=None, user_ids=None):
+    """
+    Load report data for a whole cohort in one streamed query.
+
+    Building reports for N students costs a constant number of queries
+    instead of several per student (see :func:`iter_cohort_report_data`).
 
-            report_data.append({
-                'challenge': display_name,
-                'submitted_at': '',
-                'flag': '',
-                'mark': mark,
-                'mark_name': mark_name,
-                'challengeValue': challenge.value if challenge else 100,
-                'comment': '',
-                'is_technical': is_technical,
-            })
-        print(f"[REPORT DEBUG] Added {len(all_challenges) - len(existing_challenge_ids)} missing challenges for user {user_id}", flush=True)
-    print(f"[REPORT DEBUG] report_data length={len(report_data)}", flush=True)
-    for rd in report_data:
-        print(f"[REPORT DEBUG] report_data: {rd}", flush=True)
-    print(f"[REPORT DEBUG] Returning {len(report_data)} submissions for report", flush=True)
-    return sorted(report_data, key=lambda x: x['submitted_at'])
+    Args:
+        category (str): Optional category to filter by
+        user_ids (iterable): Students to load; students without any rows are
+            still returned (with only non-submission placeholders, if any)
+
+    Returns:
+        dict: user_id -> {"name", "email", "submissions"}
+    """
+    return dict(iter_cohort_report_data(category, user_ids))
 
 
 
@@ -174,6 +295,104 @@ def _cleanup_null_submission_types():
         db.session.commit()
 
 
+def ensure_zero_marks_for_category(category, user_ids):
+    """Insert placeholder submissions/marks for every (student, challenge) gap
+    in *category*.
+
+    All missing pairs are found with a single ``NOT EXISTS`` anti-join of
+    students x category challenges against existing marking entries.  The
+    placeholder submissions and zero marks are then bulk-inserted in chunks
+    of :data:`ZERO_FILL_BATCH_SIZE` inside one transaction, so the cost no
+    longer scales with students x challenges round trips: per chunk, one
+    executemany INSERT of submissions, one SELECT for their new ids (keyed on
+    student, challenge and the shared timestamp) and one executemany INSERT
+    of marks.
+
+    Existing submissions (marked or unmarked) are left alone.  If the student
+    later submits a real answer, the auto-sync logic will either update or
+    create a proper MarkingSubmission and the pair will no longer match.
+
+    Args:
+        category (str): Challenge category (e.g. 'Week1')
+        user_ids (iterable): Students to fill gaps for
+
+    Returns:
+        int: number of zero marks created
+    """
+    from CTFd.models import Challenges
+    from sqlalchemy import and_, exists
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+
+    has_entry = exists().where(and_(
+        MarkingSubmission.submission_id == Submissions.id,
+        Submissions.user_id == Users.id,
+        Submissions.challenge_id == Challenges.id,
+    ))
+    missing = (
+        db.session.query(Users.id, Challenges.id)
+        .filter(Users.id.in_(user_ids))
+        .filter(Challenges.category == category)
+        .filter(~has_entry)
+        .order_by(Users.id, Challenges.id)
+        .all()
+    )
+    if not missing:
+        return 0
+
+    # Whole seconds, so the id lookup below matches on databases that drop
+    # fractional seconds
+    now = datetime.utcnow().replace(microsecond=0)
+    try:
+        for offset in range(0, len(missing), ZERO_FILL_BATCH_SIZE):
+            chunk = missing[offset:offset + ZERO_FILL_BATCH_SIZE]
+            # the Submissions model uses a polymorphic "type" column that
+            # must not be null; "incorrect" is used elsewhere in the codebase
+            # for non-flag submissions, so it's a safe default.  Without
+            # return_defaults this is a single executemany, not a round trip
+            # per row to fetch its id.
+            db.session.bulk_insert_mappings(Submissions, [
+                {"user_id": user_id, "challenge_id": challenge_id, "provided": "", "date": now, "type": "incorrect"}
+                for user_id, challenge_id in chunk
+            ])
+            wanted = set(chunk)
+            new_ids = {}
+            for submission_id, user_id, challenge_id in (
+                db.session.query(Submissions.id, Submissions.user_id, Submissions.challenge_id)
+                .filter(Submissions.user_id.in_({user_id for user_id, _ in chunk}))
+                .filter(Submissions.challenge_id.in_({challenge_id for _, challenge_id in chunk}))
+                .filter(Submissions.date == now, Submissions.provided == "", Submissions.type == "incorrect")
+                .filter(~exists().where(MarkingSubmission.submission_id == Submissions.id))
+                .order_by(Submissions.id)
+            ):
+                if (user_id, challenge_id) in wanted:
+                    new_ids[(user_id, challenge_id)] = submission_id
+            db.session.bulk_insert_mappings(MarkingSubmission, [
+                {
+                    "submission_id": submission_id,
+                    "mark": 0,
+                    "comment": "Auto-generated 0 for missing submission",
+                    "marked_at": now,
+                }
+                for submission_id in new_ids.values()
+            ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logger.info(f"Inserted {len(missing)} zero marks for {category}")
+    from .statistics_snapshot import invalidate_snapshot
+    from .grades import invalidate_all_marks
+    from .timeseries import invalidate_timeseries_at
+    invalidate_snapshot()
+    invalidate_all_marks()
+    invalidate_timeseries_at(now)
+    return len(missing)
+
+
 def _ensure_zero_for_user_category(user_id, category):
     """Insert placeholder submissions/marks for any challenges in *category* that a
     student never submitted.
@@ -181,13 +400,7 @@ def _ensure_zero_for_user_category(user_id, category):
     This is called just before generating a report so that the database will
     contain explicit zero-mark entries for missing work.  Those records show up
     in the various exercise statistics pages and persist for auditing.
-
-    Existing submissions (marked or unmarked) are left alone.  If the student
-    later submits a real answer, the auto-sync logic will either update or
-    create a proper MarkingSubmission and this helper will no longer match.
     """
-    from CTFd.models import Submissions, Challenges
-
     # Make sure we don't have stray NULLs for this student/category either; if
     # there are any, upgrade them to "incorrect" before proceeding.
     db.session.query(Submissions).filter(
@@ -195,48 +408,184 @@ def _ensure_zero_for_user_category(user_id, category):
         Submissions.type.is_(None)
     ).update({"type": "incorrect"}, synchronize_session="fetch")
 
-    # Fetch all challenges for the category; nothing to do otherwise
-    challenges = Challenges.query.filter(Challenges.category == category).all()
-    if not challenges:
-        return
+    return ensure_zero_marks_for_category(category, [user_id])
 
-    for challenge in challenges:
-        # has the student already got a marking entry for this challenge?
-        existing_mark = (
-            MarkingSubmission.query
-            .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
-            .filter(Submissions.user_id == user_id)
-            .filter(Submissions.challenge_id == challenge.id)
-            .first()
-        )
-        if existing_mark:
-            continue
 
-        # No marking at all: create a dummy submission and give it a zero mark
-        # the Submissions model uses a polymorphic "type" column that
-        # must not be null; choose a generic value so SQLAlchemy can load the
-        # object later.  "incorrect" is used elsewhere in the codebase for
-        # non-flag submissions, so it's a safe default.
-        dummy = Submissions(
-            user_id=user_id,
-            challenge_id=challenge.id,
-            provided="",
-            date=datetime.utcnow(),
-            type="incorrect",
-        )
-        db.session.add(dummy)
-        db.session.flush()  # ensure dummy.id is populated
-
-        zero_mark = MarkingSubmission(
-            submission_id=dummy.id,
-            mark=0,
-            comment="Auto-generated 0 for missing submission",
-            marked_at=datetime.utcnow(),
-        )
-        db.session.add(zero_mark)
-        logger.debug(f"Inserted zero mark for user {user_id}, challenge {challenge.id}")
+def _report_base_url():
+    """Base URL used for the "view your report" link in emails."""
+    from flask import request, has_request_context
+
+    # Try to get URL from config first
+    base_url = get_config('ctf_url')
+
+    # If not in config, try to build from request context
+    if not base_url and has_request_context():
+        base_url = request.url_root.rstrip('/')
+
+    # Fall back to production URL if nothing else available
+    if not base_url:
+        return 'https://ctfd.quang.tech'
+    # Remove trailing slash if present
+    return base_url.rstrip('/')
+
+
+def _report_view_args(student_name, student_email, submissions, ctf_name, category=None):
+    """
+    Keyword arguments for the on-demand report download/view PDFs.
+
+    Shared with release pre-rendering and bulk report runs so they all
+    produce the same report cache key.
+    """
+    return {
+        "student_name": student_name,
+        "student_email": student_email,
+        "submissions": submissions,
+        "ctf_name": ctf_name,
+        "subtitle": f"{category} Report" if category else "Full Performance Report",
+    }
+
+
+def _pdf_workers():
+    """Configured number of PDF rendering processes for bulk runs."""
+    from flask import current_app, has_app_context
+
+    if not has_app_context():
+        return None
+    return current_app.config.get('MARKING_HUB_PDF_WORKERS')
+
+
+def _compose_report_email(student_name, submissions, category=None, ctf_name=None, base_url=None):
+    """
+    Build the plain-text report email.
+
+    Returns:
+        tuple: (subject, text)
+    """
+    ctf_name = ctf_name or get_config('ctf_name', 'CTF')
+    base_url = base_url or _report_base_url()
+    category_label = f" - {category}" if category else ""
+
+    # Note: CTFd's sendmail doesn't support attachments directly,
+    # so we'll send a plain text summary with a link to view the full report
+    subject = f"{ctf_name} - Your{category_label} Performance Report"
+
+    # Include category in URL if specified
+    if category:
+        report_url = f"{base_url}/api/marking_hub/reports/view/my-report?category={category}"
+    else:
+        report_url = f"{base_url}/api/marking_hub/reports/view/my-report"
+
+    email_text = f"""Hello {student_name},
+
+Here's your performance report from {ctf_name}{category_label}.
+
+Submissions Reviewed: {len(submissions)}
+Marked: {sum(1 for s in submissions if s['mark'] is not None)}
+
+Summary:
+"""
+    for s in submissions[:10]:
+        mark_name = s.get('mark_name', str(s.get('mark')))
+        email_text += f"\n- {s['challenge']}: {mark_name}"
+
+    # Calculate overall percentage for all exercises
+    total_marks = sum(s['mark'] for s in submissions if s['mark'] is not None)
+    total_possible = sum(s.get('challengeValue', 100) for s in submissions)
+    if total_possible > 0:
+        overall_percentage = (total_marks / total_possible) * 100
+        email_text += f"\n\nOverall Homework Percentage: {overall_percentage:.1f}%"
+    else:
+        email_text += f"\n\nOverall Homework Percentage: N/A"
+
+    email_text += f"""
+
+View your full detailed report here:
+{report_url}
+
+(You must be logged in to view your report)
+
+Best regards,
+{ctf_name} Team
+"""
+    return subject, email_text
+
+
+def _record_student_report(user_id, student_email, submissions, category=None, triggered_by_user_id=None):
+    """Add (without committing) the StudentReport row for a sent report."""
+    db.session.add(StudentReport(
+        user_id=user_id,
+        category=category,
+        sent_by=triggered_by_user_id,
+        email_sent=student_email,
+        submission_count=len(submissions),
+        marked_count=sum(1 for s in submissions if s.get('mark') is not None),
+    ))
+
+
+def _deliver_student_report(user_id, student_name, student_email, submissions,
+                            triggered_by_user_id=None, category=None,
+                            ctf_name=None, base_url=None):
+    """
+    Render, email and record one student's report from already-loaded data.
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not submissions:
+        return False, f"No marked submissions for this student{f' in {category}' if category else ''}"
+
+    ctf_name = ctf_name or get_config('ctf_name', 'CTF')
+
+    # Render the PDF into the report cache, so the student's download is a hit
+    from .report_cache import get_report_cache
+    get_report_cache().get_or_render(
+        _report_view_args(student_name, student_email, submissions, ctf_name, category)
+    )
+
+    subject, email_text = _compose_report_email(student_name, submissions, category, ctf_name, base_url)
+
+    # Send email (basic text version)
+    success, message = sendmail(student_email, email_text, subject)
+
+    if not success:
+        return False, f"Failed to send email: {message}"
+
+    # Record in database
+    _record_student_report(user_id, student_email, submissions, category, triggered_by_user_id)
     db.session.commit()
 
+    category_label = f" - {category}" if category else ""
+    logger.info(f"Report sent to {student_email} ({student_name}){category_label}")
+    return True, f"Report sent to {student_email}"
+
+
+def _send_report_emails(outgoing):
+    """
+    Send a batch of report emails, yielding each result as it is known.
+
+    Uses a pooled :class:`ReportMailer` when CTFd is configured for SMTP and
+    falls back to CTFd's ``sendmail`` one message at a time otherwise.
+
+    Args:
+        outgoing (list): (user_id, addr, subject, text) tuples
+
+    Yields:
+        tuple: (user_id, success, message), in completion order
+    """
+    from .report_mailer import ReportMailer
+
+    mailer = ReportMailer.from_ctfd_config()
+    if mailer is not None:
+        for _, result in mailer.iter_send(outgoing):
+            yield result
+        return
+    for user_id, addr, subject, text in outgoing:
+        try:
+            success, message = sendmail(addr, text, subject)
+        except Exception as e:
+            success, message = False, f"Error: {e}"
+        yield user_id, success, message
+
 
 def generate_and_send_student_report(user_id, triggered_by_user_id=None, category=None):
     """
@@ -277,112 +626,15 @@ def generate_and_send_student_report(user_id, triggered_by_user_id=None, categor
 
         # Get submissions (optionally filtered by category)
         submissions = get_student_submissions_for_report(user_id, category=category)
-        
-        if not submissions:
-            return False, f"No marked submissions for this student{f' in {category}' if category else ''}"
-        
-        # Generate PDF
-        ctf_name = get_config('ctf_name', 'CTF')
-        category_label = f" - {category}" if category else ""
-        pdf_buffer = generate_student_report_pdf(
-            student_name=student.name,
-            student_email=student.email,
-            submissions=submissions,
-            ctf_name=ctf_name,
-            subtitle=f"Performance Report{category_label}"
-        )
-        
-        # Create email with PDF attachment
-        # Note: CTFd's sendmail doesn't support attachments directly,
-        # so we'll send a plain text summary with a link to view the full report
-        subject = f"{ctf_name} - Your{category_label} Performance Report"
-        
-        # Get the base URL for the report link
-        from flask import request, has_request_context
-        
-        # Try to get URL from config first
-        base_url = get_config('ctf_url')
-        
-        # If not in config, try to build from request context
-        if not base_url and has_request_context():
-            base_url = request.url_root.rstrip('/')
-        
-        # Fall back to production URL if nothing else available
-        if not base_url:
-            base_url = 'https://ctfd.quang.tech'
-        else:
-            # Remove trailing slash if present
-            base_url = base_url.rstrip('/')
-        
-        # Include category in URL if specified
-        if category:
-            report_url = f"{base_url}/api/marking_hub/reports/view/my-report?category={category}"
-        else:
-            report_url = f"{base_url}/api/marking_hub/reports/view/my-report"
-        
-        email_text = f"""Hello {student.name},
 
-Here's your performance report from {ctf_name}{category_label}.
-
-Submissions Reviewed: {len(submissions)}
-Marked: {sum(1 for s in submissions if s['mark'] is not None)}
-
-Summary:
-"""
-        for s in submissions[:10]:
-            mark_name = s.get('mark_name', str(s.get('mark')))
-            email_text += f"\n- {s['challenge']}: {mark_name}"
-
-        # Calculate overall percentage for all exercises
-        total_marks = sum(s['mark'] for s in submissions if s['mark'] is not None)
-        total_possible = sum(s.get('challengeValue', 100) for s in submissions)
-        if total_possible > 0:
-            overall_percentage = (total_marks / total_possible) * 100
-            email_text += f"\n\nOverall Homework Percentage: {overall_percentage:.1f}%"
-        else:
-            email_text += f"\n\nOverall Homework Percentage: N/A"
-        
-        email_text += f"""
-
-View your full detailed report here:
-{report_url}
-
-(You must be logged in to view your report)
-
-Best regards,
-{ctf_name} Team
-"""
-        
-        # Send email (basic text version)
-        success, message = sendmail(student.email, email_text, subject)
-        
-        if success:
-            # Record in database
-            report = StudentReport(
-                user_id=user_id,
-                category=category,
-                sent_by=triggered_by_user_id,
-                email_sent=student.email,
-                submission_count=len(submissions),
-                marked_count=sum(1 for s in submissions if s.get('mark') is not None),
-            )
-            db.session.add(report)
-            db.session.commit()
-            
-            logger.info(f"Report sent to {student.email} ({student.name}){category_label}")
-            return True, f"Report sent to {student.email}"
-        else:
-            return False, f"Failed to send email: {message}"
+        return _deliver_student_report(
+            user_id, student.name, student.email, submissions,
+            triggered_by_user_id=triggered_by_user_id, category=category,
+        )
             
     except Exception as e:
         logger.error(f"Error generating report for user {user_id}: {str(e)}")
         return False, f"Error: {str(e)}"
-        
-        if not submissions:
-            return False, "No marked submissions for this student"
-        
-        # Generate PDF
-        ctf_name = get_config('ctf_name', 'CTF')
 
 
 def get_available_categories():
@@ -420,62 +672,273 @@ def generate_weekly_reports(category=None):
         dict: Summary of reports sent
     """
     from CTFd.models import Users, Challenges
+    from .report_cache import get_report_cache, report_cache_key
     
     # Ensure there are no NULL type records in the whole table before we
     # start touching submissions; this avoids the polymorphic discriminator
     # error you were seeing during the global "send reports" operation.
     _cleanup_null_submission_types()
 
-    # Build query for marked submissions
+    # Students with marked submissions (in the category, if given)
     query = (
-        MarkingSubmission.query
+        db.session.query(Submissions.user_id)
+        .join(MarkingSubmission, MarkingSubmission.submission_id == Submissions.id)
         .filter(MarkingSubmission.mark.isnot(None))
-        .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
     )
-    
-    # Filter by category if specified
     if category:
         query = (
             query
             .join(Challenges, Submissions.challenge_id == Challenges.id)
             .filter(Challenges.category == category)
         )
-    
-    marked_submissions = query.all()
-    
-    student_ids = set(sub.submission.user_id for sub in marked_submissions)
+    student_ids = {user_id for (user_id,) in query.distinct().all()}
 
     # Also include students who have submitted but not yet been marked (so they
     # will get zeros created by the report generator).  This only applies when a
     # category filter is provided because we can't reasonably enumerate "all"
     # students otherwise.
     if category:
-        # use the global Submissions import, avoid local import that would
-        # shadow the name and cause UnboundLocalError when used earlier
         subs = (
-            Submissions.query
+            db.session.query(Submissions.user_id)
             .join(Challenges, Submissions.challenge_id == Challenges.id)
             .filter(Challenges.category == category)
+            .distinct()
             .all()
         )
-        student_ids.update(sub.user_id for sub in subs)
-    
+        student_ids.update(user_id for (user_id,) in subs)
+
     results = {
         'category': category,
         'total': len(student_ids),
         'sent': 0,
         'failed': 0,
+        'zeros_created': 0,
         'errors': []
     }
-    
-    for user_id in student_ids:
-        success, message = generate_and_send_student_report(user_id, category=category)
+
+    # Fill every missing exercise for the whole cohort in one pass; reports
+    # still go out (without the zeros) if that fails
+    if category:
+        try:
+            results['zeros_created'] = ensure_zero_marks_for_category(category, student_ids)
+        except Exception as e:
+            logger.exception(f"Zero-filling {category} failed: {e}")
+            results['errors'].append(f"Zero-filling {category} failed: {e}")
+
+    # One streamed query for the whole cohort, then per-student PDF/email
+    # stages run from memory
+    cohort = load_cohort_report_data(category=category, user_ids=student_ids)
+    ctf_name = get_config('ctf_name', 'CTF')
+    base_url = _report_base_url()
+
+    def record(user_id, success, message):
         if success:
             results['sent'] += 1
         else:
             results['failed'] += 1
             results['errors'].append(f"User {user_id}: {message}")
+
+    # Students that can't be rendered are reported straight away; the rest are
+    # rendered (in worker processes when configured) and delivered in order
+    renderable = []
+    for user_id in sorted(student_ids):
+        student = cohort.get(user_id)
+        if student is None:
+            record(user_id, False, "Student not found")
+        elif not student["email"]:
+            record(user_id, False, "Student has no email address")
+        elif not student["submissions"]:
+            record(user_id, False, f"No marked submissions for this student{f' in {category}' if category else ''}")
+        else:
+            renderable.append(user_id)
+
+    # Render the reports that aren't in the report cache yet and store them,
+    # so the bulk run warms the cache for downloads and ZIP exports
+    report_cache = get_report_cache()
+    keys = {}
+    to_render = []
+    for user_id in renderable:
+        student = cohort[user_id]
+        report = _report_view_args(student["name"], student["email"], student["submissions"], ctf_name, category)
+        key = report_cache_key(report)
+        try:
+            cached = report_cache.get(key) is not None
+        except OSError as e:
+            logger.warning(f"Report cache lookup failed for user {user_id}: {e}")
+            cached = False
+        if not cached:
+            keys[user_id] = key
+            to_render.append((user_id, report))
+
+    render_failed = set()
+    for user_id, pdf_data, error in render_report_pdfs(to_render, max_workers=_pdf_workers()):
+        if error is not None:
+            logger.error(f"PDF rendering failed for user {user_id}: {error}")
+            record(user_id, False, f"PDF rendering failed: {error}")
+            render_failed.add(user_id)
+            continue
+        try:
+            report_cache.put(keys[user_id], pdf_data)
+        except OSError as e:
+            logger.warning(f"Could not cache report PDF for user {user_id}: {e}")
+
+    outgoing = []
+    for user_id in renderable:
+        if user_id in render_failed:
+            continue
+        student = cohort[user_id]
+        try:
+            subject, email_text = _compose_report_email(
+                student["name"], student["submissions"], category, ctf_name, base_url
+            )
+        except Exception as e:
+            logger.exception(f"Composing the report email for user {user_id} failed: {e}")
+            record(user_id, False, f"Error: {e}")
+            continue
+        outgoing.append((user_id, student["email"], subject, email_text))
+
+    # Emails go out over a few persistent SMTP sessions; delivered reports are
+    # recorded as they go out and committed in small batches, so a run that
+    # dies midway keeps the history of every email already sent
+    unrecorded = []
+
+    def commit_history():
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Recording {len(unrecorded)} sent reports failed: {e}")
+            results['errors'].extend(
+                f"User {user_id}: report sent but not recorded: {e}" for user_id in unrecorded
+            )
+        unrecorded.clear()
+
+    for user_id, success, message in _send_report_emails(outgoing):
+        if not success:
+            record(user_id, False, f"Failed to send email: {message}")
+            continue
+        student = cohort[user_id]
+        record(user_id, True, f"Report sent to {student['email']}")
+        _record_student_report(user_id, student["email"], student["submissions"], category)
+        unrecorded.append(user_id)
+        if len(unrecorded) >= HISTORY_COMMIT_BATCH_SIZE:
+            commit_history()
+    if unrecorded:
+        commit_history()
     
     category_label = f" for {category}" if category else ""
     logger.info(f"Reports generated{category_label}: {results['sent']} sent, {results['failed']} failed")
     return results
+
+
+def report_student_ids(category=None):
+    """
+    Students who have a report to view: everyone who submitted in *category*,
+    or everyone with a marked submission when no category is given.
+
+    Returns:
+        set: user ids
+    """
+    from CTFd.models import Challenges
+
+    query = db.session.query(Submissions.user_id)
+    if category:
+        query = (
+            query
+            .join(Challenges, Submissions.challenge_id == Challenges.id)
+            .filter(Challenges.category == category)
+        )
+    else:
+        query = (
+            query
+            .join(MarkingSubmission, MarkingSubmission.submission_id == Submissions.id)
+            .filter(MarkingSubmission.mark.isnot(None))
+        )
+    return {user_id for (user_id,) in query.distinct().all()}
+
+
+def prerender_category_reports(category):
+    """
+    Render every affected student's report for *category* into the report cache.
+
+    Uses the same inputs as the student "view my report" endpoint so the
+    first view after a release is a cache hit.  Reports already in the cache
+    are skipped.
+
+    Args:
+        category (str): Released category
+
+    Returns:
+        dict: counts of students, rendered, cached (already present) and failed
+    """
+    from .report_cache import get_report_cache, report_cache_key
+
+    student_ids = report_student_ids(category)
+    ctf_name = get_config('ctf_name', 'CTF')
+    report_cache = get_report_cache()
+
+    results = {'category': category, 'students': len(student_ids), 'rendered': 0, 'cached': 0, 'failed': 0}
+
+    def render(pending):
+        for key, pdf_data, error in render_report_pdfs(pending, max_workers=_pdf_workers()):
+            if error is not None:
+                logger.error(f"Pre-rendering report failed for {category}: {error}")
+                results['failed'] += 1
+                continue
+            try:
+                report_cache.put(key, pdf_data)
+            except OSError as e:
+                logger.warning(f"Could not cache pre-rendered report PDF: {e}")
+                results['failed'] += 1
+                continue
+            results['rendered'] += 1
+
+    # Students stream from the cohort query; misses are rendered a window at
+    # a time so memory doesn't grow with the cohort
+    pending = []
+    for user_id, student in iter_cohort_report_data(category=category, user_ids=student_ids):
+        if not student["submissions"]:
+            continue
+        report = _report_view_args(student["name"], student["email"], student["submissions"], ctf_name, category)
+        key = report_cache_key(report)
+        if report_cache.get(key) is not None:
+            results['cached'] += 1
+        else:
+            pending.append((key, report))
+        if len(pending) >= PRERENDER_WINDOW:
+            render(pending)
+            pending = []
+    render(pending)
+
+    logger.info(
+        f"Pre-rendered {category} reports: {results['rendered']} rendered, "
+        f"{results['cached']} already cached, {results['failed']} failed"
+    )
+    return results
+
+
+def start_category_prerender(app, category):
+    """
+    Pre-render *category* reports on a background thread.
+
+    Args:
+        app: Flask app (the thread needs its own app context)
+        category (str): Released category
+
+    Returns:
+        threading.Thread: the started daemon thread
+    """
+    import threading
+
+    def run():
+        with app.app_context():
+            try:
+                prerender_category_reports(category)
+            except Exception as e:
+                logger.exception(f"Pre-rendering {category} reports failed: {e}")
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=run, name=f"report-prerender-{category}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,92 @@
+"""
+Keyset-paginated access to the sent-report history.
+
+Pages are ordered newest first by ``(sent_at, id)`` and continued with an
+opaque cursor holding the last row's key, so every page is an index range
+scan on ``student_reports(sent_at)`` / ``(user_id, sent_at)`` no matter how
+deep the client pages.  Paging is opt-in: without a limit or cursor the whole
+(filtered) history is returned, as it always was.
+"""
+
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+from ..models import StudentReport
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(report):
+    raw = f"{report.sent_at.isoformat()}|{report.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (sent_at, id)
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        sent_at, report_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(sent_at), int(report_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_reports(limit=None, cursor=None, user_id=None, category=None, since=None, until=None):
+    """
+    One page of sent reports, newest first.
+
+    Args:
+        limit (int): Page size (capped at MAX_PAGE_SIZE); None with no
+            *cursor* returns every matching report
+        cursor (str): ``next_cursor`` of the previous page (pages of
+            DEFAULT_PAGE_SIZE unless *limit* is given)
+        user_id (int): Only reports for this student
+        category (str): Only reports for this category ("full" for full reports)
+        since (datetime): Only reports sent at or after this time
+        until (datetime): Only reports sent before this time
+
+    Returns:
+        tuple: (list of StudentReport, next_cursor or None)
+    """
+    paginate = limit is not None or bool(cursor)
+    if paginate:
+        limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+    query = StudentReport.query.options(
+        joinedload(StudentReport.user),
+        joinedload(StudentReport.trigger_user),
+    )
+    if user_id is not None:
+        query = query.filter(StudentReport.user_id == user_id)
+    if category == "full":
+        query = query.filter(StudentReport.category.is_(None))
+    elif category:
+        query = query.filter(StudentReport.category == category)
+    if since is not None:
+        query = query.filter(StudentReport.sent_at >= since)
+    if until is not None:
+        query = query.filter(StudentReport.sent_at < until)
+    if cursor:
+        sent_at, report_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            StudentReport.sent_at < sent_at,
+            and_(StudentReport.sent_at == sent_at, StudentReport.id < report_id),
+        ))
+
+    query = query.order_by(StudentReport.sent_at.desc(), StudentReport.id.desc())
+    if not paginate:
+        return query.all(), None
+
+    # One extra row tells us whether another page exists
+    reports = query.limit(limit + 1).all()
+    if len(reports) > limit:
+        reports = reports[:limit]
+        return reports, encode_cursor(reports[-1])
+    return reports, None
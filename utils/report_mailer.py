@@ -0,0 +1,248 @@
+"""
+Pooled SMTP delivery for bulk report emails.
+
+CTFd's ``sendmail`` opens a new SMTP connection (and TLS handshake and login)
+for every message.  :class:`ReportMailer` instead keeps a small number of
+persistent sessions open for a whole batch, sends over them concurrently,
+retries transient failures with exponential backoff and can cap the send
+rate to what the mail relay tolerates.
+
+The mailer only needs a host and port, so it can be pointed at a local
+``aiosmtpd``/``smtpd`` debugging server.
+"""
+
+import queue
+import smtplib
+import socket
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying on a fresh connection (besides 4xx replies).  Kept
+# narrow: SMTPException subclasses OSError, so a bare socket.error here would
+# also retry permanent SMTP errors (e.g. SMTPNotSupportedError).  Any other
+# SMTP or socket error still drops the session, but fails the message
+_TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, socket.timeout)
+
+
+class _RateLimiter:
+    """Thread-safe limiter spacing sends evenly to at most *per_minute*."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class ReportMailer:
+    """
+    Send many plain-text emails over a few persistent SMTP sessions.
+
+    Args:
+        host (str): SMTP server
+        port (int): SMTP port
+        mailfrom (str): From address (already formatted)
+        username (str): Login username, when *password* is also given
+        password (str): Login password
+        tls (bool): Issue STARTTLS after connecting
+        ssl (bool): Connect with implicit TLS (SMTP_SSL)
+        connections (int): Persistent sessions, i.e. concurrent sends
+        max_retries (int): Retries per message after the first attempt
+        backoff (float): Initial retry delay in seconds, doubled each retry
+        rate_per_minute (int): Overall send cap; 0/None for no cap
+        timeout (float): Socket timeout per SMTP operation
+    """
+
+    def __init__(self, host, port, mailfrom, username=None, password=None, tls=False, ssl=False,
+                 connections=2, max_retries=3, backoff=1.0, rate_per_minute=None, timeout=10):
+        self.host = host
+        self.port = int(port)
+        self.mailfrom = mailfrom
+        self.username = username
+        self.password = password
+        self.tls = tls
+        self.ssl = ssl
+        self.connections = max(1, int(connections or 1))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.limiter = _RateLimiter(rate_per_minute)
+
+    @classmethod
+    def from_ctfd_config(cls, **overrides):
+        """
+        Build a mailer from CTFd's email settings, mirroring ``sendmail``.
+
+        Returns:
+            ReportMailer or None: None when CTFd isn't configured for SMTP
+            (e.g. it uses Mailgun), in which case callers fall back to
+            ``sendmail``.
+        """
+        from flask import current_app
+        from CTFd.utils import get_config, get_app_config
+
+        host = get_config("mail_server") or get_app_config("MAIL_SERVER")
+        port = get_config("mail_port") or get_app_config("MAIL_PORT")
+        if not host or not port:
+            return None
+
+        useauth = get_config("mail_useauth") or get_app_config("MAIL_USEAUTH")
+        options = {
+            "host": host,
+            "port": port,
+            "mailfrom": formataddr((
+                get_config("ctf_name"),
+                get_config("mailfrom_addr") or get_app_config("MAILFROM_ADDR"),
+            )),
+            "username": (get_config("mail_username") or get_app_config("MAIL_USERNAME")) if useauth else None,
+            "password": (get_config("mail_password") or get_app_config("MAIL_PASSWORD")) if useauth else None,
+            "tls": bool(get_config("mail_tls") or get_app_config("MAIL_TLS")),
+            "ssl": bool(get_config("mail_ssl") or get_app_config("MAIL_SSL")),
+            "connections": current_app.config.get("MARKING_HUB_SMTP_CONNECTIONS", 2),
+            "rate_per_minute": current_app.config.get("MARKING_HUB_MAIL_RATE_PER_MINUTE"),
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    def _connect(self):
+        if self.ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _message(self, addr, subject, text):
+        msg = EmailMessage()
+        msg.set_content(text)
+        msg["Subject"] = subject
+        msg["From"] = self.mailfrom
+        msg["To"] = addr
+        return msg
+
+    def _send_one(self, session, addr, subject, text):
+        """
+        Send one message on *session* (a one-item list holding the live
+        connection or None), reconnecting and retrying transient failures.
+
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        msg = self._message(addr, subject, text)
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                if session[0] is None:
+                    session[0] = self._connect()
+                self.limiter.wait()
+                session[0].send_message(msg)
+                return True, "Email sent"
+            except smtplib.SMTPRecipientsRefused as e:
+                return False, f"Recipient refused: {e.recipients}"
+            except (smtplib.SMTPException, OSError) as e:
+                error = e
+
+            # Drop the session, which may be dead (TLS or socket errors) or
+            # mid-transaction; the next message or attempt opens a fresh one
+            if session[0] is not None:
+                self._close(session[0])
+                session[0] = None
+            if isinstance(error, smtplib.SMTPResponseException):
+                # 5xx is permanent; 4xx is worth another try
+                if error.smtp_code >= 500:
+                    return False, f"SMTP error {error.smtp_code}: {error.smtp_error!r}"
+            elif not isinstance(error, _TRANSIENT_ERRORS):
+                return False, f"SMTP error: {error}"
+            if attempt < self.max_retries:
+                logger.warning(f"Retrying email to {addr} in {delay:.1f}s: {error}")
+                time.sleep(delay)
+                delay *= 2
+        return False, f"Failed after {self.max_retries + 1} attempts: {error}"
+
+    def iter_send(self, messages):
+        """
+        Send a batch of messages, yielding each result as its send finishes.
+
+        Args:
+            messages (iterable): (key, addr, subject, text) tuples
+
+        Yields:
+            tuple: (index in *messages*, (key, success, message)), in
+            completion order
+        """
+        messages = list(messages)
+        jobs = queue.Queue()
+        done = queue.Queue()
+        for index, message in enumerate(messages):
+            jobs.put((index, message))
+
+        def worker():
+            session = [None]
+            try:
+                while True:
+                    try:
+                        index, (key, addr, subject, text) = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        success, message = self._send_one(session, addr, subject, text)
+                    except Exception as e:
+                        success, message = False, f"Error: {e}"
+                    done.put((index, (key, success, message)))
+            finally:
+                if session[0] is not None:
+                    self._close(session[0])
+
+        threads = [
+            threading.Thread(target=worker, name=f"report-mailer-{n}", daemon=True)
+            for n in range(min(self.connections, len(messages)))
+        ]
+        for thread in threads:
+            thread.start()
+        for _ in range(len(messages)):
+            yield done.get()
+        for thread in threads:
+            thread.join()
+
+    def send_batch(self, messages):
+        """
+        Send a batch of messages.
+
+        Args:
+            messages (iterable): (key, addr, subject, text) tuples
+
+        Returns:
+            list: (key, success, message) in the same order as *messages*
+        """
+        messages = list(messages)
+        results = [None] * len(messages)
+        for index, result in self.iter_send(messages):
+            results[index] = result
+        return results
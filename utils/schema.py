@@ -0,0 +1,113 @@
+"""
+Run-once schema setup for the plugin.
+
+The schema is defined by the Alembic revisions in ``migrations/``, applied
+with CTFd's plugin migration runner.  Tables are first created from the
+models (as they always were, so installs that predate the revisions already
+have them); the revisions are written to skip what already exists and fill
+in what ``create_all()`` leaves out, such as new columns and indexes on
+existing tables.  CTFd records the applied revision in its config table
+(``CTFd_Marking_Hub_alembic_version``, read through CTFd's cached
+``get_config``), so a worker booting against an up-to-date database does a
+single version check and nothing else.
+
+When revisions are pending, the first worker to claim the upgrade in CTFd's
+cache runs them and the others wait until the version is current.  The
+claim is best effort (``cache.add`` is not atomic on every cache backend),
+so two workers may occasionally both upgrade; the revisions tolerate that.
+
+To change the schema, add a revision and point SCHEMA_VERSION at it.
+"""
+
+import os
+import time
+from CTFd.cache import cache
+from CTFd.models import db
+from CTFd.utils import get_config, set_config
+import logging
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_NAME = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+# Head revision in migrations/
+SCHEMA_VERSION = "marking_hub_008"
+
+# Config key CTFd's migration runner records the applied revision under
+_VERSION_CONFIG = f"{PLUGIN_NAME}_alembic_version"
+_CLAIM_KEY = "marking_hub:schema:claim"
+
+# Seconds before an upgrade claim is considered abandoned
+CLAIM_TIMEOUT = 10 * 60
+
+# Seconds between checks while another worker upgrades
+WAIT_INTERVAL = 0.5
+
+
+def schema_version():
+    """The applied revision (None for a database never migrated)."""
+    return get_config(_VERSION_CONFIG)
+
+
+def _upgrade_sqlite():
+    # CTFd's runner only calls create_all() on SQLite; apply the revisions
+    # here so older SQLite databases get the same columns and indexes
+    from alembic.config import Config
+    from alembic.operations import Operations
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    config.set_main_option("version_locations", MIGRATIONS_DIR)
+    script = ScriptDirectory.from_config(config)
+    revisions = list(script.iterate_revisions(upper=SCHEMA_VERSION, lower=schema_version()))
+    with db.engine.begin() as conn:
+        op = Operations(MigrationContext.configure(conn))
+        for revision in reversed(revisions):
+            revision.module.upgrade(op=op)
+    set_config(_VERSION_CONFIG, SCHEMA_VERSION)
+
+
+def _upgrade():
+    from CTFd.plugins.migrations import upgrade
+
+    started = time.monotonic()
+    previous = schema_version()
+    db.create_all()
+    if db.engine.dialect.name == "sqlite":
+        _upgrade_sqlite()
+    else:
+        upgrade(plugin_name=PLUGIN_NAME, revision=SCHEMA_VERSION)
+    logger.info(
+        f"Upgraded marking hub schema from {previous or 'base'} to {SCHEMA_VERSION} "
+        f"in {time.monotonic() - started:.2f}s"
+    )
+
+
+def ensure_schema():
+    """
+    Bring the plugin schema up to SCHEMA_VERSION, once across all workers.
+
+    Returns:
+        bool: whether this worker ran the upgrade
+    """
+    if schema_version() == SCHEMA_VERSION:
+        return False
+
+    while True:
+        if cache.add(_CLAIM_KEY, os.getpid(), timeout=CLAIM_TIMEOUT):
+            try:
+                _upgrade()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                cache.delete(_CLAIM_KEY)
+            return True
+        # Another worker is upgrading; serve once it is done (a claim left by
+        # a worker that died expires after CLAIM_TIMEOUT and is taken over)
+        time.sleep(WAIT_INTERVAL)
+        if schema_version() == SCHEMA_VERSION:
+            return False
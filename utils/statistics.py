@@ -0,0 +1,594 @@
+"""
+Aggregate queries backing the admin statistics endpoints.
+
+Everything here is computed from grouped SQL results rather than by walking
+ORM objects, so the number of queries per call is constant regardless of how
+many challenges, students or tutors are involved.  Each view is split into
+a loader (the ``get_*`` functions) and a pure ``build_*`` function over the
+per-challenge aggregates, so the statistics snapshot can cache the
+aggregates, re-read just the challenges touched by a mark change and fold
+the views from them.
+"""
+
+from collections import namedtuple
+from CTFd.models import db
+from sqlalchemy import func, case
+from ..models import MarkingSubmission, MarkingTutor
+from .submission_tokens import _is_technical
+
+# One row of the (challenge, marker) aggregate; mark_counts maps each raw
+# mark value to the number of submissions that received it
+MarkGroup = namedtuple(
+    "MarkGroup",
+    ["challenge_id", "marked_by", "entries", "mark_count", "mark_total", "mark_total_sq",
+     "last_marked_at", "mark_counts"],
+)
+
+# Challenge columns the views need; a plain tuple so aggregates can be cached
+ChallengeRow = namedtuple("ChallengeRow", ["id", "name", "value", "category"])
+
+# Lower bounds (percent) of the marking bands, matching the mark_map used
+# when tutors save a mark: incomplete/attempted/good/great/hof
+MARK_BANDS = (0, 30, 60, 90, 100)
+
+
+def _challenges(category=None, challenge_ids=None):
+    """Map of challenge id -> ChallengeRow."""
+    from CTFd.models import Challenges
+
+    query = db.session.query(Challenges.id, Challenges.name, Challenges.value, Challenges.category)
+    if category is not None:
+        query = query.filter(Challenges.category == category)
+    if challenge_ids is not None:
+        query = query.filter(Challenges.id.in_(challenge_ids))
+    return {row.id: ChallengeRow(*row) for row in query.all()}
+
+
+def _student_counts(challenge_ids=None):
+    """
+    Per-challenge distinct student counts from one ``GROUP BY challenge_id``.
+
+    Returns:
+        dict: challenge id -> (submitted, with_marking_entry, marked)
+    """
+    from CTFd.models import Submissions
+
+    query = (
+        db.session.query(
+            Submissions.challenge_id,
+            func.count(func.distinct(Submissions.user_id)),
+            func.count(func.distinct(case(
+                (MarkingSubmission.id.isnot(None), Submissions.user_id)
+            ))),
+            func.count(func.distinct(case(
+                (MarkingSubmission.mark.isnot(None), Submissions.user_id)
+            ))),
+        )
+        .outerjoin(MarkingSubmission, MarkingSubmission.submission_id == Submissions.id)
+    )
+    if challenge_ids is not None:
+        query = query.filter(Submissions.challenge_id.in_(challenge_ids))
+    return {
+        challenge_id: (submitted, with_entry, marked)
+        for challenge_id, submitted, with_entry, marked in query.group_by(Submissions.challenge_id).all()
+    }
+
+
+def _mark_groups(challenge_ids=None, marked_by=None):
+    """
+    Mark aggregates from one ``GROUP BY challenge_id, marked_by, mark`` query.
+
+    Grouping on the mark value as well keeps the result tiny (marks take a
+    handful of distinct values) while carrying the full distribution, so
+    counts, sums and histograms are all folded from the same rows.
+
+    Args:
+        challenge_ids (list): Optional challenge ids to restrict to
+        marked_by (list): Optional marker user ids to restrict to
+
+    Returns:
+        list: of MarkGroup rows, one per (challenge, marker)
+    """
+    from CTFd.models import Submissions
+
+    query = (
+        db.session.query(
+            Submissions.challenge_id,
+            MarkingSubmission.marked_by,
+            MarkingSubmission.mark,
+            func.count(MarkingSubmission.id),
+            func.max(MarkingSubmission.marked_at),
+        )
+        .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
+    )
+    if challenge_ids is not None:
+        query = query.filter(Submissions.challenge_id.in_(challenge_ids))
+    if marked_by is not None:
+        query = query.filter(MarkingSubmission.marked_by.in_(marked_by))
+
+    folded = {}
+    for cid, by, mark, count, last in (
+        query.group_by(Submissions.challenge_id, MarkingSubmission.marked_by, MarkingSubmission.mark).all()
+    ):
+        group = folded.setdefault((cid, by), {"entries": 0, "last": None, "marks": {}})
+        group["entries"] += count
+        if last is not None and (group["last"] is None or last > group["last"]):
+            group["last"] = last
+        if mark is not None:
+            group["marks"][mark] = count
+
+    return [
+        MarkGroup(
+            cid, by, group["entries"],
+            sum(group["marks"].values()),
+            sum(mark * count for mark, count in group["marks"].items()),
+            sum(mark * mark * count for mark, count in group["marks"].items()),
+            group["last"],
+            group["marks"],
+        )
+        for (cid, by), group in folded.items()
+    ]
+
+
+def _mark_percentage(mark, challenge):
+    """
+    A stored mark as a percentage, clamped to 0-100.
+
+    Tutors' marks are stored as the mark_map percentage itself (0/30/60/90/
+    100); TECH auto-marks store 0 or the challenge value, so they are scaled
+    by the value.
+    """
+    if _is_technical(challenge.name):
+        mark = mark * 100.0 / (challenge.value or 100)
+    return min(max(float(mark), 0.0), 100.0)
+
+
+def _percentages(groups, challenges):
+    """
+    Map of percentage -> count across *groups*, folded from their per-mark
+    counts.  Groups whose challenge no longer exists are skipped.
+    """
+    counts = {}
+    for group in groups:
+        challenge = challenges.get(group.challenge_id)
+        if challenge is None:
+            continue
+        for mark, count in group.mark_counts.items():
+            percentage = round(_mark_percentage(mark, challenge), 6)
+            counts[percentage] = counts.get(percentage, 0) + count
+    return counts
+
+
+def _percentage_moments(groups, challenges):
+    """
+    Combine mark groups into (n, sum, sum of squares) of percentages, with
+    the same normalisation as the distribution (:func:`_mark_percentage`).
+    """
+    n = 0
+    total = 0.0
+    total_sq = 0.0
+    for percentage, count in _percentages(groups, challenges).items():
+        n += count
+        total += percentage * count
+        total_sq += percentage * percentage * count
+    return n, total, total_sq
+
+
+def _percentile(values, n, q):
+    """
+    Linearly interpolated percentile of a sorted (value, count) list.
+
+    Equivalent to ``numpy.percentile`` on the expanded sample, without
+    expanding it.
+    """
+    position = (n - 1) * q
+    lower_index = int(position)
+    upper_index = min(lower_index + 1, n - 1)
+    lower = upper = None
+    seen = 0
+    for value, count in values:
+        seen += count
+        if lower is None and lower_index < seen:
+            lower = value
+        if upper_index < seen:
+            upper = value
+            break
+    return lower + (upper - lower) * (position - lower_index)
+
+
+def _distribution(groups, challenges):
+    """
+    Band counts and median/p10/p90 of percentage marks across *groups*
+    (normalised like the averages, see :func:`_mark_percentage`).
+
+    Returns:
+        dict: {"bands": {"0": n, "30": n, ...}, "median", "p10", "p90"}
+    """
+    counts = _percentages(groups, challenges)
+
+    bands = {str(band): 0 for band in MARK_BANDS}
+    for percentage, count in counts.items():
+        band = max((b for b in MARK_BANDS if percentage >= b), default=MARK_BANDS[0])
+        bands[str(band)] += count
+
+    n = sum(counts.values())
+    if not n:
+        return {"bands": bands, "median": None, "p10": None, "p90": None}
+    values = sorted(counts.items())
+    return {
+        "bands": bands,
+        "median": round(_percentile(values, n, 0.5), 1),
+        "p10": round(_percentile(values, n, 0.1), 1),
+        "p90": round(_percentile(values, n, 0.9), 1),
+    }
+
+
+def _mean(n, total):
+    return total / n if n else 0
+
+
+def _std_dev(n, total, total_sq):
+    """Population standard deviation (matches the original two-pass figure)."""
+    if n <= 1:
+        return 0
+    mean = total / n
+    return round(max(total_sq / n - mean * mean, 0) ** 0.5, 1)
+
+
+def _tutor_names(tutor_ids=None):
+    """Map of tutor user id -> (name, email) for registered tutors."""
+    from CTFd.models import Users
+
+    query = (
+        db.session.query(MarkingTutor.user_id, Users.name, Users.email)
+        .outerjoin(Users, MarkingTutor.user_id == Users.id)
+    )
+    if tutor_ids is not None:
+        query = query.filter(MarkingTutor.user_id.in_(tutor_ids))
+    return {user_id: (name, email) for user_id, name, email in query.all()}
+
+
+def _by_challenge(groups):
+    """Map of challenge id -> list of MarkGroup rows."""
+    mark_groups = {}
+    for group in groups:
+        mark_groups.setdefault(group.challenge_id, []).append(group)
+    return mark_groups
+
+
+def build_exercise_statistics(challenges, student_counts, mark_groups, tutors):
+    """
+    Per-exercise JSON for *challenges* from their aggregates.
+
+    Args:
+        challenges (dict): challenge id -> ChallengeRow, for one category
+        student_counts (dict): challenge id -> (submitted, with_entry, marked)
+        mark_groups (dict): challenge id -> list of MarkGroup
+        tutors (dict): tutor user id -> (name, email)
+
+    Returns:
+        list: of exercise dicts sorted by challenge name
+    """
+    exercise_stats = []
+    for challenge in challenges.values():
+        submitted, with_entry, _ = student_counts.get(challenge.id, (0, 0, 0))
+        groups = mark_groups.get(challenge.id, [])
+        n, total, _ = _percentage_moments(groups, challenges)
+
+        # Only registered tutors who marked this exercise are listed
+        per_tutor = []
+        for group in groups:
+            if group.marked_by not in tutors or not group.mark_count:
+                continue
+            tutor_n, tutor_total, _ = _percentage_moments([group], challenges)
+            tutor_avg = _mean(tutor_n, tutor_total)
+            per_tutor.append({
+                "tutor_id": group.marked_by,
+                "tutor_name": tutors[group.marked_by][0] or "Unknown",
+                "marked_count": group.mark_count,
+                "avg_mark": round(tutor_avg, 1) if tutor_avg else 0,
+            })
+
+        exercise_stats.append({
+            "challenge_id": challenge.id,
+            "challenge_name": challenge.name,
+            "total_submitted": submitted,
+            "total_marked": with_entry,
+            "marking_percentage": round((with_entry / submitted * 100) if submitted else 0, 1),
+            "avg_mark": round(_mean(n, total), 1),
+            "distribution": _distribution(groups, challenges),
+            "per_tutor": sorted(per_tutor, key=lambda x: x["tutor_name"]),
+        })
+
+    return sorted(exercise_stats, key=lambda x: x["challenge_name"])
+
+
+def build_category_statistics(challenges, student_counts, mark_groups, categories=None):
+    """
+    Per-category JSON from the aggregates of every challenge.
+
+    Distinct (student, challenge) pairs are summed from the per-challenge
+    distinct student counts, which is exact because pairs never span
+    challenges.
+
+    Args:
+        challenges (dict): challenge id -> ChallengeRow
+        student_counts (dict): challenge id -> (submitted, with_entry, marked)
+        mark_groups (dict): challenge id -> list of MarkGroup
+        categories (list): Optional category names to restrict to
+
+    Returns:
+        list: of category dicts sorted by category name
+    """
+    by_category = {}
+    for challenge in challenges.values():
+        by_category.setdefault(challenge.category or "Uncategorized", []).append(challenge.id)
+    if categories is not None:
+        by_category = {cat: ids for cat, ids in by_category.items() if cat in categories}
+
+    category_stats = []
+    for category, ids in by_category.items():
+        submitted = sum(student_counts.get(cid, (0, 0, 0))[0] for cid in ids)
+        with_entry = sum(student_counts.get(cid, (0, 0, 0))[1] for cid in ids)
+        groups = [group for cid in ids for group in mark_groups.get(cid, [])]
+        n, total, _ = _percentage_moments(groups, challenges)
+        category_stats.append({
+            "category": category,
+            "total_submitted": submitted,
+            "total_marked": with_entry,
+            "marking_percentage": round((with_entry / submitted * 100) if submitted else 0, 1),
+            "avg_mark": round(_mean(n, total), 1),
+            "distribution": _distribution(groups, challenges),
+        })
+
+    return sorted(category_stats, key=lambda x: x["category"])
+
+
+def build_tutor_statistics(tutors, mark_groups, challenges):
+    """
+    Per-tutor JSON from the mark aggregates.
+
+    Args:
+        tutors (dict): tutor user id -> (name, email)
+        mark_groups (dict): challenge id -> list of MarkGroup
+        challenges (dict): challenge id -> ChallengeRow
+
+    Returns:
+        list: of tutor dicts sorted by submissions marked (descending)
+    """
+    groups_by_tutor = {}
+    for groups in mark_groups.values():
+        for group in groups:
+            if group.marked_by in tutors:
+                groups_by_tutor.setdefault(group.marked_by, []).append(group)
+
+    stats = []
+    for tutor_id, (name, email) in tutors.items():
+        groups = groups_by_tutor.get(tutor_id, [])
+        n, total, total_sq = _percentage_moments(groups, challenges)
+        last_marked = max((g.last_marked_at for g in groups if g.last_marked_at), default=None)
+        stats.append({
+            "tutor_id": tutor_id,
+            "name": name or "Unknown",
+            "email": email or "",
+            "submissions_marked": sum(g.entries for g in groups),
+            "avg_mark": round(_mean(n, total), 1),
+            "std_dev": _std_dev(n, total, total_sq),
+            "distribution": _distribution(groups, challenges),
+            "last_marked": last_marked.strftime("%Y-%m-%d %H:%M") if last_marked else None,
+        })
+
+    return sorted(stats, key=lambda x: x["submissions_marked"], reverse=True)
+
+
+def build_global_statistics(student_counts, mark_groups, challenges):
+    """
+    Overall progress JSON from the aggregates of every challenge.
+
+    Returns:
+        dict: total_submitted, total_marked, marking_percentage, avg_mark_overall
+    """
+    submitted = sum(counts[0] for counts in student_counts.values())
+    marked = sum(counts[2] for counts in student_counts.values())
+    groups = [group for groups in mark_groups.values() for group in groups]
+    n, total, _ = _percentage_moments(groups, challenges)
+
+    return {
+        "total_submitted": submitted,
+        "total_marked": marked,
+        "marking_percentage": round((marked / submitted * 100) if submitted else 0, 1),
+        "avg_mark_overall": round(_mean(n, total), 1),
+    }
+
+
+def get_exercise_statistics(category):
+    """
+    Per-exercise marking progress and per-tutor averages for one category.
+
+    Served by two grouped queries: one ``GROUP BY challenge_id`` over
+    submissions for the submitted/marked student counts, and one
+    ``GROUP BY challenge_id, marked_by, mark`` over marks for the averages
+    and distributions.  The
+    per-exercise and per-tutor JSON is assembled from those rows in memory.
+
+    Args:
+        category (str): Challenge category (e.g. 'Week1')
+
+    Returns:
+        list: of exercise dicts sorted by challenge name
+    """
+    challenges = _challenges(category=category)
+    if not challenges:
+        return []
+    challenge_ids = list(challenges)
+
+    return build_exercise_statistics(
+        challenges,
+        _student_counts(challenge_ids),
+        _by_challenge(_mark_groups(challenge_ids)),
+        _tutor_names(),
+    )
+
+
+def get_category_statistics(categories=None):
+    """
+    Marking progress per challenge category.
+
+    Args:
+        categories (list): Optional category names to restrict to
+
+    Returns:
+        list: of category dicts sorted by category name
+    """
+    challenges = _challenges()
+    if categories is not None:
+        challenges = {
+            cid: challenge for cid, challenge in challenges.items()
+            if (challenge.category or "Uncategorized") in categories
+        }
+    if not challenges:
+        return []
+
+    challenge_ids = list(challenges)
+    return build_category_statistics(
+        challenges,
+        _student_counts(challenge_ids),
+        _by_challenge(_mark_groups(challenge_ids)),
+    )
+
+
+def get_tutor_statistics(tutor_ids=None):
+    """
+    Per-tutor marking volume, mean, spread and recency.
+
+    Args:
+        tutor_ids (list): Optional tutor user ids to restrict to
+
+    Returns:
+        list: of tutor dicts sorted by submissions marked (descending)
+    """
+    tutors = _tutor_names(tutor_ids)
+    if not tutors:
+        return []
+
+    mark_groups = _by_challenge(_mark_groups(marked_by=list(tutors)))
+    challenges = _challenges(challenge_ids=list(mark_groups))
+    return build_tutor_statistics(tutors, mark_groups, challenges)
+
+
+def get_global_statistics():
+    """
+    Overall marking progress across every challenge.
+
+    Returns:
+        dict: total_submitted, total_marked, marking_percentage, avg_mark_overall
+    """
+    return build_global_statistics(_student_counts(), _by_challenge(_mark_groups()), _challenges())
+
+
+def get_calibration_statistics(category=None, threshold=0.5, min_marks=5):
+    """
+    Compare how registered tutors mark the same challenges.
+
+    Only challenges marked by at least two tutors are considered.  For each
+    (tutor, challenge) cell the tutor's mean percentage is compared with the
+    mean of the *other* tutors on that challenge; the difference is the bias
+    and dividing it by the challenge's standard deviation gives the effect
+    size.  A tutor's overall bias and effect size are the cell values
+    weighted by the number of marks.  Everything is derived from the
+    per-group counts, sums and sums of squares of the single mark
+    aggregate, so the cost is one query plus arithmetic over the groups.
+
+    Args:
+        category (str): Optional category to restrict to
+        threshold (float): Absolute effect size at or above which a tutor or
+            cell is flagged as an outlier
+        min_marks (int): Minimum marks for a tutor or cell to be flagged
+
+    Returns:
+        dict: {"tutors": [...], "exercises": [...]}
+    """
+    tutors = _tutor_names()
+    if not tutors:
+        return {"tutors": [], "exercises": []}
+
+    challenges = _challenges(category=category)
+    groups = _mark_groups(
+        challenge_ids=list(challenges) if category is not None else None,
+        marked_by=list(tutors),
+    )
+
+    # (challenge, tutor) -> (n, sum, sum of squares) of percentages
+    cells = {}
+    for group in groups:
+        n, total, total_sq = _percentage_moments([group], challenges)
+        if n:
+            cells[(group.challenge_id, group.marked_by)] = (n, total, total_sq)
+
+    by_challenge = {}
+    for (cid, tid), moments in cells.items():
+        by_challenge.setdefault(cid, {})[tid] = moments
+
+    tutor_totals = {}
+    exercises = []
+    for cid, tutor_cells in by_challenge.items():
+        if len(tutor_cells) < 2:
+            continue
+        n_c = sum(m[0] for m in tutor_cells.values())
+        sum_c = sum(m[1] for m in tutor_cells.values())
+        sum_sq_c = sum(m[2] for m in tutor_cells.values())
+        mean_c = sum_c / n_c
+        std_c = max(sum_sq_c / n_c - mean_c * mean_c, 0) ** 0.5
+
+        tutor_rows = []
+        for tid, (n, total, _) in tutor_cells.items():
+            mean_t = total / n
+            mean_others = (sum_c - total) / (n_c - n)
+            bias = mean_t - mean_others
+            effect = bias / std_c if std_c else 0.0
+
+            totals = tutor_totals.setdefault(tid, {"n": 0, "bias": 0.0, "effect": 0.0, "challenges": 0})
+            totals["n"] += n
+            totals["bias"] += bias * n
+            totals["effect"] += effect * n
+            totals["challenges"] += 1
+
+            tutor_rows.append({
+                "tutor_id": tid,
+                "tutor_name": tutors[tid][0] or "Unknown",
+                "marked_count": n,
+                "mean": round(mean_t, 1),
+                "bias": round(bias, 1),
+                "effect_size": round(effect, 2),
+                "outlier": n >= min_marks and abs(effect) >= threshold,
+            })
+
+        challenge = challenges[cid]
+        exercises.append({
+            "challenge_id": cid,
+            "challenge_name": challenge.name,
+            "category": challenge.category or "Uncategorized",
+            "marked_count": n_c,
+            "mean": round(mean_c, 1),
+            "std_dev": round(std_c, 1),
+            "tutors": sorted(tutor_rows, key=lambda x: x["tutor_name"]),
+        })
+
+    tutor_stats = []
+    for tid, totals in tutor_totals.items():
+        bias = totals["bias"] / totals["n"]
+        effect = totals["effect"] / totals["n"]
+        tutor_stats.append({
+            "tutor_id": tid,
+            "tutor_name": tutors[tid][0] or "Unknown",
+            "marked_count": totals["n"],
+            "challenges_compared": totals["challenges"],
+            "bias": round(bias, 1),
+            "effect_size": round(effect, 2),
+            "outlier": totals["n"] >= min_marks and abs(effect) >= threshold,
+        })
+
+    return {
+        "tutors": sorted(tutor_stats, key=lambda x: abs(x["effect_size"]), reverse=True),
+        "exercises": sorted(exercises, key=lambda x: (x["category"], x["challenge_name"] or "")),
+    }
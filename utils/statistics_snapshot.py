@@ -0,0 +1,215 @@
+"""
+Precomputed snapshot of the admin statistics views.
+
+The snapshot stores the aggregates the views are folded from, in CTFd's
+cache (shared between workers, like the scoreboard standings): one key per
+challenge holding its distinct student counts and its (marker, mark) groups
+with their counts and sums, plus a meta key holding the challenge and tutor
+lists.  Reading a view fetches those keys and folds the tutor, category,
+exercise and global figures from them in memory, without touching the
+database.
+
+Recording marks patches the snapshot in place: the challenges the marks
+belong to are re-read with the same grouped queries scoped to those
+challenges, and only their keys are replaced.  A challenge's aggregate is
+re-read rather than adjusted by the mark's delta because a re-mark moves a
+count between mark values and the marked-student counts are distinct counts,
+which a delta cannot keep exact.
+
+Each challenge key records when it was read.  A view's age is that of its
+oldest challenge, and a view older than the caller's ``max_staleness`` is
+rebuilt from scratch, which also picks up what no patch covers (student
+submissions, new challenges, renamed tutors).  Bulk operations and tutor
+changes drop the snapshot so the next read rebuilds it.
+"""
+
+import time
+from CTFd.cache import cache
+from .statistics import (
+    _by_challenge,
+    _challenges,
+    _mark_groups,
+    _student_counts,
+    _tutor_names,
+    build_category_statistics,
+    build_exercise_statistics,
+    build_global_statistics,
+    build_tutor_statistics,
+    get_category_statistics,
+    get_exercise_statistics,
+    get_global_statistics,
+    get_tutor_statistics,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long an untouched snapshot lingers in the cache
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+_KEY_PREFIX = "marking_hub:statistics_snapshot"
+_META_KEY = f"{_KEY_PREFIX}:meta"
+
+
+def _challenge_key(challenge_id):
+    return f"{_KEY_PREFIX}:challenge:{challenge_id}"
+
+
+def _entry(read_at, counts, groups):
+    return {"read_at": read_at, "counts": counts, "groups": groups}
+
+
+def _rebuild():
+    """
+    Read every aggregate and store the snapshot.
+
+    Returns:
+        tuple: (meta: dict, entries: dict of challenge id -> entry)
+    """
+    read_at = time.time()
+    challenges = _challenges()
+    student_counts = _student_counts()
+    mark_groups = _by_challenge(_mark_groups())
+    tutors = _tutor_names()
+
+    entries = {
+        cid: _entry(read_at, student_counts.get(cid, (0, 0, 0)), mark_groups.get(cid, []))
+        for cid in challenges
+    }
+    if entries:
+        cache.set_many({_challenge_key(cid): entry for cid, entry in entries.items()}, timeout=SNAPSHOT_TIMEOUT)
+    # Written last: a patch only runs once the meta key exists, so it always
+    # finds the challenge keys in place
+    meta = {"built_at": read_at, "challenges": challenges, "tutors": tutors}
+    cache.set(_META_KEY, meta, timeout=SNAPSHOT_TIMEOUT)
+    return meta, entries
+
+
+def _load(challenge_ids, max_staleness):
+    """
+    Cached meta and entries for *challenge_ids*, rebuilt when any is missing
+    or older than *max_staleness*.
+
+    Returns:
+        tuple: (meta, entries, age_seconds)
+    """
+    meta = cache.get(_META_KEY)
+    if meta is not None:
+        ids = list(challenge_ids(meta))
+        cached = cache.get_many(*[_challenge_key(cid) for cid in ids]) if ids else []
+        if all(entry is not None for entry in cached):
+            entries = dict(zip(ids, cached))
+            read_at = min((entry["read_at"] for entry in cached), default=meta["built_at"])
+            age = max(time.time() - read_at, 0.0)
+            if age <= max_staleness:
+                return meta, entries, age
+
+    meta, entries = _rebuild()
+    return meta, entries, 0.0
+
+
+def _view(name, meta, entries):
+    challenges = {cid: meta["challenges"][cid] for cid in entries}
+    student_counts = {cid: entry["counts"] for cid, entry in entries.items()}
+    mark_groups = {cid: entry["groups"] for cid, entry in entries.items()}
+    if name == "tutors":
+        return {
+            "tutors": build_tutor_statistics(meta["tutors"], mark_groups, challenges),
+            "global": build_global_statistics(student_counts, mark_groups, challenges),
+        }
+    if name == "categories":
+        return {"categories": build_category_statistics(challenges, student_counts, mark_groups)}
+    return {"exercises": build_exercise_statistics(challenges, student_counts, mark_groups, meta["tutors"])}
+
+
+def _live(name, category=None):
+    if name == "tutors":
+        return {"tutors": get_tutor_statistics(), "global": get_global_statistics()}
+    if name == "categories":
+        return {"categories": get_category_statistics()}
+    return {"exercises": get_exercise_statistics(category)}
+
+
+def get_snapshot(name, category=None, max_staleness=None):
+    """
+    Return a statistics view, folded from the snapshot when fresh enough.
+
+    Args:
+        name (str): "tutors", "categories" or "exercises"
+        category (str): Category for the "exercises" view
+        max_staleness (float): Oldest acceptable snapshot age in seconds.
+            When omitted the view is computed live from the database.
+
+    Returns:
+        tuple: (data: dict, age_seconds: float)
+    """
+    if name not in ("tutors", "categories", "exercises"):
+        raise ValueError(f"Unknown statistics snapshot '{name}'")
+    if max_staleness is None:
+        return _live(name, category), 0.0
+
+    def challenge_ids(meta):
+        if name != "exercises":
+            return meta["challenges"]
+        return [cid for cid, challenge in meta["challenges"].items() if challenge.category == category]
+
+    meta, entries, age = _load(challenge_ids, max_staleness)
+    if name == "exercises":
+        entries = {cid: entries[cid] for cid in challenge_ids(meta)}
+    return _view(name, meta, entries), age
+
+
+def refresh_for_marks(challenge_ids):
+    """
+    Patch the snapshot for marks recorded on *challenge_ids*.
+
+    Only the given challenges' aggregates are re-read; every view is folded
+    from them on its next read.  Nothing is done when no snapshot is cached.
+
+    Args:
+        challenge_ids (iterable): Challenges whose marks changed
+    """
+    ids = sorted({int(cid) for cid in challenge_ids if cid is not None})
+    if not ids:
+        return
+    meta = cache.get(_META_KEY)
+    if meta is None:
+        return
+    if any(cid not in meta["challenges"] for cid in ids):
+        # A challenge created since the build; its category lists are stale
+        invalidate_snapshot()
+        return
+
+    read_at = time.time()
+    student_counts = _student_counts(ids)
+    mark_groups = _by_challenge(_mark_groups(ids))
+
+    current = cache.get_many(*[_challenge_key(cid) for cid in ids])
+    updates = {}
+    for cid, existing in zip(ids, current):
+        # A concurrent patch that read later already includes these marks
+        if existing is not None and existing["read_at"] > read_at:
+            continue
+        updates[_challenge_key(cid)] = _entry(
+            read_at, student_counts.get(cid, (0, 0, 0)), mark_groups.get(cid, [])
+        )
+    if updates:
+        cache.set_many(updates, timeout=SNAPSHOT_TIMEOUT)
+
+
+def invalidate_snapshot():
+    """Drop the cached statistics snapshot; the next read rebuilds it."""
+    cache.delete(_META_KEY)
+
+
+def rebuild_snapshot():
+    """
+    Rebuild the statistics snapshot from scratch.
+
+    Returns:
+        dict: number of categories covered
+    """
+    meta, _ = _rebuild()
+    categories = {challenge.category for challenge in meta["challenges"].values()}
+    logger.info(f"Rebuilt statistics snapshot ({len(categories)} categories)")
+    return {"categories": len(categories)}
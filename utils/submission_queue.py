@@ -0,0 +1,260 @@
+"""
+Durable queue for on-behalf submissions made in async mode.
+
+In async mode ``on-behalf-of`` only checks the HMAC, stores the item in
+``marking_submission_queue`` and answers 202 with a ticket, so a burst from
+the automarker costs each request one small insert.  A daemon thread in every
+worker process drains the queue: it claims a batch of the oldest queued items
+(``UPDATE ... WHERE status = 'queued'`` tagged with a per-round claim id, so
+workers never process the same item twice) and records them together through
+:func:`submit_on_behalf_batch`, which runs the full token, flag and solve
+checks.  Each item ends up "done" or "failed" with the same result object the
+batch endpoint returns.  If recording the batch raises, its items are retried
+one at a time so a single bad item cannot hold back the rest.
+
+Items left "processing" by a worker that died are requeued after
+CLAIM_TIMEOUT; finished items are deleted after the retention window.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from CTFd.models import db
+from sqlalchemy import func
+from ..models import SubmissionQueueItem
+from .grades import invalidate_student_marks
+from .submission_tokens import submit_on_behalf_batch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Items recorded per drain round (and transaction)
+DRAIN_BATCH_SIZE = 200
+
+# Seconds an idle worker waits before looking for items enqueued elsewhere
+POLL_INTERVAL = 2.0
+
+# Items claimed longer ago than this are assumed abandoned and requeued
+CLAIM_TIMEOUT = 5 * 60
+
+# Attempts before an item that keeps failing to record is given up
+MAX_ATTEMPTS = 3
+
+# Finished items are kept this long for status lookups
+RESULT_RETENTION = timedelta(hours=24)
+
+# Seconds between sweeps for abandoned claims and expired results
+HOUSEKEEPING_INTERVAL = 60
+
+# Most tickets accepted by one status lookup
+MAX_STATUS_TICKETS = 500
+
+_worker_lock = threading.Lock()
+_worker_pid = None
+_wakeup = threading.Event()
+
+
+def enqueue(user_id, challenge_id, flag, token, hashed):
+    """
+    Store one HMAC-verified submission for the drain worker.
+
+    Returns:
+        SubmissionQueueItem: the committed item
+    """
+    item = SubmissionQueueItem(
+        ticket=uuid.uuid4().hex,
+        user_id=user_id,
+        challenge_id=challenge_id,
+        flag=flag,
+        token=token,
+        token_hash=hashed,
+        status="queued",
+    )
+    db.session.add(item)
+    db.session.commit()
+    _wakeup.set()
+    return item
+
+
+def queue_depth():
+    """
+    Returns:
+        dict: number of "queued" and "processing" items
+    """
+    counts = dict(
+        db.session.query(SubmissionQueueItem.status, func.count(SubmissionQueueItem.id))
+        .filter(SubmissionQueueItem.status.in_(("queued", "processing")))
+        .group_by(SubmissionQueueItem.status)
+        .all()
+    )
+    return {"queued": counts.get("queued", 0), "processing": counts.get("processing", 0)}
+
+
+def ticket_status(tickets):
+    """
+    Returns:
+        list: item dicts for the known *tickets*, in request order
+    """
+    items = {
+        item.ticket: item
+        for item in SubmissionQueueItem.query.filter(SubmissionQueueItem.ticket.in_(list(set(tickets)))).all()
+    }
+    return [items[ticket].to_dict() for ticket in tickets if ticket in items]
+
+
+def _claim(batch_size):
+    """Claim up to *batch_size* of the oldest queued items for this round."""
+    ids = [
+        row[0] for row in
+        db.session.query(SubmissionQueueItem.id)
+        .filter(SubmissionQueueItem.status == "queued")
+        .order_by(SubmissionQueueItem.id)
+        .limit(batch_size)
+        .all()
+    ]
+    if not ids:
+        return []
+    claim = uuid.uuid4().hex
+    # Selecting ids first keeps the UPDATE portable (MySQL can't subquery
+    # its target table); the status guard loses races to other workers
+    SubmissionQueueItem.query.filter(
+        SubmissionQueueItem.id.in_(ids),
+        SubmissionQueueItem.status == "queued",
+    ).update(
+        {"status": "processing", "claim": claim, "claimed_at": datetime.utcnow(),
+         "attempts": SubmissionQueueItem.attempts + 1},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return (
+        SubmissionQueueItem.query
+        .filter(SubmissionQueueItem.id.in_(ids), SubmissionQueueItem.claim == claim)
+        .order_by(SubmissionQueueItem.id)
+        .all()
+    )
+
+
+def drain_once(secret, batch_size=DRAIN_BATCH_SIZE):
+    """
+    Record one batch of queued submissions.
+
+    Returns:
+        int: items processed (0 when the queue is empty)
+    """
+    items = _claim(batch_size)
+    if not items:
+        return 0
+
+    payload = [
+        {"user_id": item.user_id, "challenge_id": item.challenge_id, "flag": item.flag,
+         "token": item.token, "hash": item.token_hash}
+        for item in items
+    ]
+    try:
+        results = submit_on_behalf_batch(secret, payload)
+    except Exception as e:
+        logger.warning(f"Failed to record {len(items)} queued submissions together, retrying one by one: {e}")
+        results = _submit_each(secret, items, payload)
+
+    now = datetime.utcnow()
+    for item, result in zip(items, results):
+        if result is None:
+            continue
+        result.pop("index", None)
+        item.status = "done" if result["success"] else "failed"
+        item.result = json.dumps(result)
+        item.processed_at = now
+        item.claim = None
+    db.session.commit()
+    invalidate_student_marks({result["user_id"] for result in results if result and result["success"]})
+    return len(items)
+
+
+def _submit_each(secret, items, payload):
+    """
+    Record items one at a time after their batch failed, so one bad item
+    doesn't fail or requeue the rest.
+
+    Returns:
+        list: per-item results; None for items that failed to record and
+        were requeued (or given up on once they keep failing)
+    """
+    results = []
+    for item, entry in zip(items, payload):
+        try:
+            results.append(submit_on_behalf_batch(secret, [entry])[0])
+        except Exception as e:
+            db.session.rollback()
+            logger.exception(f"Failed to record queued submission {item.ticket}: {e}")
+            if item.attempts >= MAX_ATTEMPTS:
+                item.status = "failed"
+                item.result = json.dumps({"success": False, "message": f"Failed to submit: {str(e)}"})
+                item.processed_at = datetime.utcnow()
+            else:
+                item.status = "queued"
+            item.claim = None
+            db.session.commit()
+            results.append(None)
+    return results
+
+
+def housekeeping(now=None):
+    """Requeue abandoned claims and delete expired results."""
+    now = now or datetime.utcnow()
+    requeued = SubmissionQueueItem.query.filter(
+        SubmissionQueueItem.status == "processing",
+        SubmissionQueueItem.claimed_at < now - timedelta(seconds=CLAIM_TIMEOUT),
+    ).update({"status": "queued", "claim": None}, synchronize_session=False)
+    deleted = SubmissionQueueItem.query.filter(
+        SubmissionQueueItem.status.in_(("done", "failed")),
+        SubmissionQueueItem.processed_at < now - RESULT_RETENTION,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    if requeued:
+        logger.warning(f"Requeued {requeued} abandoned queued submissions")
+    if deleted:
+        logger.info(f"Deleted {deleted} finished queued submissions")
+
+
+def _run(app):
+    last_housekeeping = 0.0
+    while True:
+        processed = 0
+        with app.app_context():
+            try:
+                if time.monotonic() - last_housekeeping >= HOUSEKEEPING_INTERVAL:
+                    last_housekeeping = time.monotonic()
+                    housekeeping()
+                secret = app.config.get('MARKING_HUB_AUTOMARKER_SECRET')
+                if secret:
+                    processed = drain_once(secret)
+            except Exception as e:
+                db.session.rollback()
+                logger.exception(f"Submission queue worker error: {e}")
+            finally:
+                db.session.remove()
+        if not processed:
+            # Enqueues in this process wake the worker straight away
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+
+
+def ensure_queue_worker(app):
+    """
+    Start this process's drain thread if it isn't running.
+
+    Started lazily (not in ``load()``) because a thread started before a
+    pre-forking server forks does not survive into the workers.
+    """
+    global _worker_pid
+
+    if _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        threading.Thread(target=_run, args=(app,), name="submission-queue", daemon=True).start()
+        _worker_pid = os.getpid()
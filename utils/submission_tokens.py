@@ -0,0 +1,456 @@
+"""
+Single-use tokens letting the automarker submit flags on a student's behalf.
+
+A token is a random string handed to the automarker together with
+``HMAC(secret, "user_id:challenge_id:token")``; only the hash is stored.
+
+Stateless tokens (``s1.<user_id>.<challenge_id>.<expires>.<nonce>``) carry
+their own claims instead: the same HMAC over them is the signature, so
+issuing one writes nothing and verifying one is CPU-only apart from the
+replay check, which records the nonce in ``UsedTokenNonce`` until the token
+would have expired.
+"""
+
+import hashlib
+import hmac
+import secrets
+from datetime import datetime, timedelta
+from CTFd.models import db, Users, Challenges
+from sqlalchemy import exists, or_
+from sqlalchemy.exc import IntegrityError
+from ..models import SubmissionToken, UsedTokenNonce
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Largest number of tokens issued by one bulk request
+MAX_BULK_TOKENS = 5000
+
+STATELESS_PREFIX = "s1"
+
+# Expired nonces are deleted at most this often per worker
+NONCE_PRUNE_INTERVAL = 10 * 60
+
+_last_nonce_prune = None
+
+
+def token_hash(secret, user_id, challenge_id, token):
+    """HMAC-SHA256 binding *token* to a student and challenge."""
+    secret_bytes = secret.encode() if isinstance(secret, str) else secret
+    return hmac.new(
+        secret_bytes,
+        f"{user_id}:{challenge_id}:{token}".encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def stateless_token(user_id, challenge_id, expires_at):
+    """A new stateless token string (sign it with :func:`token_hash`)."""
+    return f"{STATELESS_PREFIX}.{user_id}.{challenge_id}.{int(expires_at.timestamp())}.{secrets.token_hex(16)}"
+
+
+def is_stateless_token(token):
+    return isinstance(token, str) and token.startswith(f"{STATELESS_PREFIX}.")
+
+
+def stateless_claims(token, user_id, challenge_id, now=None):
+    """
+    Check the claims of an (already HMAC-verified) stateless token.
+
+    Returns:
+        tuple: ((nonce, expires_at), None) or (None, error message)
+    """
+    try:
+        prefix, token_user, token_challenge, expires, nonce = token.split(".")
+        token_user, token_challenge = int(token_user), int(token_challenge)
+        expires_at = datetime.utcfromtimestamp(int(expires))
+    except ValueError:
+        return None, "Token not found or invalid"
+    if prefix != STATELESS_PREFIX or not nonce:
+        return None, "Token not found or invalid"
+    if token_user != int(user_id) or token_challenge != int(challenge_id):
+        return None, "Token not found or invalid"
+    if expires_at < (now or datetime.utcnow()):
+        return None, "Token expired"
+    return (nonce, expires_at), None
+
+
+def consume_nonce(nonce, expires_at):
+    """
+    Record *nonce* as used in the current transaction.
+
+    Flushes immediately so a replay is detected here rather than at commit.
+
+    Returns:
+        bool: False if the nonce was already used (the session is rolled back)
+    """
+    prune_used_nonces()
+    db.session.add(UsedTokenNonce(nonce=nonce, expires_at=expires_at))
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def prune_used_nonces(force=False):
+    """
+    Delete nonces of tokens that have expired (they can't be replayed anyway).
+
+    Runs at most every NONCE_PRUNE_INTERVAL seconds per worker unless *force*.
+
+    Returns:
+        int: rows deleted (0 when skipped)
+    """
+    global _last_nonce_prune
+
+    now = datetime.utcnow()
+    if not force and _last_nonce_prune and (now - _last_nonce_prune).total_seconds() < NONCE_PRUNE_INTERVAL:
+        return 0
+    _last_nonce_prune = now
+    deleted = (
+        UsedTokenNonce.query
+        .filter(UsedTokenNonce.expires_at < now)
+        .delete(synchronize_session=False)
+    )
+    if deleted:
+        logger.info(f"Pruned {deleted} expired token nonces")
+    return deleted
+
+
+def spend_tokens(token_ids, now):
+    """
+    Mark stored tokens used, only if they still are unused.
+
+    Runs in the caller's transaction; the rows stay locked until it commits,
+    so a concurrent request spending the same token sees it as used.
+
+    Args:
+        token_ids (list): SubmissionToken ids
+        now (datetime): used_at timestamp
+
+    Returns:
+        set: ids that were already used (nothing was spent for them)
+    """
+    if not token_ids:
+        return set()
+    unused = or_(SubmissionToken.used.is_(False), SubmissionToken.used.is_(None))
+    spent = SubmissionToken.query.filter(SubmissionToken.id.in_(token_ids), unused).update(
+        {"used": True, "used_at": now}, synchronize_session=False
+    )
+    if spent == len(token_ids):
+        return set()
+    if len(token_ids) == 1:
+        return set(token_ids)
+
+    # Lost a race for some of them: undo and spend one at a time to find which
+    db.session.rollback()
+    lost = set()
+    for token_id in token_ids:
+        spent = SubmissionToken.query.filter(SubmissionToken.id == token_id, unused).update(
+            {"used": True, "used_at": now}, synchronize_session=False
+        )
+        if not spent:
+            lost.add(token_id)
+    return lost
+
+
+def issue_tokens(secret, pairs, expires_in_hours=24, stateless=False):
+    """
+    Issue one token per (user_id, challenge_id) pair in a single transaction.
+
+    Students and challenges are validated with one ``IN`` query each; pairs
+    referring to unknown ids are reported as errors and skipped.
+
+    Args:
+        secret (str): Automarker secret used for the HMAC
+        pairs (list): (user_id, challenge_id) tuples
+        expires_in_hours (float): Token lifetime
+        stateless (bool): Issue stateless tokens (nothing is stored)
+
+    Returns:
+        tuple: (issued token dicts in input order, error dicts)
+    """
+    user_ids = list({user_id for user_id, _ in pairs})
+    challenge_ids = list({challenge_id for _, challenge_id in pairs})
+    users = dict(db.session.query(Users.id, Users.name).filter(Users.id.in_(user_ids)).all()) if user_ids else {}
+    challenges = dict(
+        db.session.query(Challenges.id, Challenges.name).filter(Challenges.id.in_(challenge_ids)).all()
+    ) if challenge_ids else {}
+
+    expires_at = datetime.utcnow() + timedelta(hours=expires_in_hours)
+    issued = []
+    errors = []
+    tokens = []
+    for index, (user_id, challenge_id) in enumerate(pairs):
+        if user_id not in users:
+            errors.append({"index": index, "user_id": user_id, "challenge_id": challenge_id, "message": "User not found"})
+            continue
+        if challenge_id not in challenges:
+            errors.append({"index": index, "user_id": user_id, "challenge_id": challenge_id, "message": "Challenge not found"})
+            continue
+        if stateless:
+            random_token = stateless_token(user_id, challenge_id, expires_at)
+        else:
+            random_token = secrets.token_urlsafe(32)
+        hashed = token_hash(secret, user_id, challenge_id, random_token)
+        if not stateless:
+            tokens.append(SubmissionToken(
+                user_id=user_id,
+                challenge_id=challenge_id,
+                token_hash=hashed,
+                created_by=None,  # System-generated token, not tied to a specific admin user
+                expires_at=expires_at,
+            ))
+        issued.append({
+            "index": index,
+            "token": random_token,
+            "user_id": user_id,
+            "user_name": users[user_id],
+            "challenge_id": challenge_id,
+            "challenge_name": challenges[challenge_id],
+            "hash": hashed,
+            "expires_at": expires_at.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    if tokens:
+        try:
+            db.session.bulk_save_objects(tokens, return_defaults=True)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for entry, token in zip(issued, tokens):
+            entry["token_id"] = token.id
+    for entry in issued:
+        entry.setdefault("token_id", None)
+    logger.info(f"Issued {len(issued)} submission tokens")
+
+    return issued, errors
+
+
+# Largest number of on-behalf submissions accepted by one batch request
+MAX_BATCH_SUBMISSIONS = 1000
+
+_SUBMISSION_FIELDS = ("user_id", "challenge_id", "flag", "token", "hash")
+
+
+def _is_technical(challenge_name):
+    return bool(challenge_name) and challenge_name.lstrip().upper().startswith("TECH")
+
+
+def submit_on_behalf_batch(secret, items):
+    """
+    Verify and record many on-behalf submissions in one transaction.
+
+    Tokens, students, challenges and existing solves are each loaded with a
+    single ``IN`` query; flags come from the compiled matcher cache.  Items that fail verification
+    are reported and skipped; all accepted items are written together
+    (``Solves``/``Fails``, their ``MarkingSubmission`` rows and the used
+    tokens) and committed once.
+
+    Args:
+        secret (str): Automarker secret used for the HMAC
+        items (list): dicts with user_id, challenge_id, flag, token, hash
+
+    Returns:
+        list: per-item result dicts, in input order
+    """
+    from CTFd.models import Solves, Submissions
+    from .flags import get_flag_matchers
+    from .statistics_snapshot import refresh_for_marks
+    from .timeseries import invalidate_timeseries_at
+    from ..models import MarkingSubmission
+
+    results = [None] * len(items)
+    candidates = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not all(item.get(field) for field in _SUBMISSION_FIELDS):
+            results[index] = {"index": index, "success": False,
+                              "message": "user_id, challenge_id, flag, token, and hash are required"}
+            continue
+        flag = item["flag"]
+        if not isinstance(flag, str) or not flag.strip():
+            results[index] = {"index": index, "success": False, "message": "flag must be a non-empty string"}
+            continue
+        try:
+            user_id, challenge_id = int(item["user_id"]), int(item["challenge_id"])
+        except (TypeError, ValueError):
+            results[index] = {"index": index, "success": False, "message": "user_id and challenge_id must be integers"}
+            continue
+        expected_hash = token_hash(secret, user_id, challenge_id, item["token"])
+        if not hmac.compare_digest(expected_hash, str(item["hash"])):
+            results[index] = {"index": index, "success": False, "message": "Invalid security hash"}
+            continue
+        candidates.append((index, user_id, challenge_id, flag, str(item["token"]), expected_hash))
+
+    if not candidates:
+        return results
+
+    now = datetime.utcnow()
+    stored_hashes = list({c[5] for c in candidates if not is_stateless_token(c[4])})
+    tokens = {
+        (token.user_id, token.challenge_id, token.token_hash): token
+        for token in SubmissionToken.query.filter(SubmissionToken.token_hash.in_(stored_hashes)).all()
+    } if stored_hashes else {}
+    claims = {}
+    for index, user_id, challenge_id, flag, token, hashed in candidates:
+        if is_stateless_token(token):
+            claims[index] = stateless_claims(token, user_id, challenge_id, now)
+    nonces = [claim[0][0] for claim in claims.values() if claim[0]]
+    used_nonces = {
+        nonce for (nonce,) in db.session.query(UsedTokenNonce.nonce).filter(UsedTokenNonce.nonce.in_(nonces)).all()
+    } if nonces else set()
+    user_ids = list({c[1] for c in candidates})
+    challenge_ids = list({c[2] for c in candidates})
+    users = {
+        row.id: row
+        for row in db.session.query(Users.id, Users.name, Users.team_id).filter(Users.id.in_(user_ids)).all()
+    }
+    challenges = {
+        row.id: row
+        for row in db.session.query(Challenges.id, Challenges.name, Challenges.value)
+        .filter(Challenges.id.in_(challenge_ids)).all()
+    }
+    matchers = get_flag_matchers(challenge_ids)
+    solved = set(
+        db.session.query(Solves.user_id, Solves.challenge_id)
+        .filter(Solves.user_id.in_(user_ids), Solves.challenge_id.in_(challenge_ids))
+        .all()
+    )
+
+    accepted = []
+    used_hashes = set()
+    for index, user_id, challenge_id, flag, token_string, hashed in candidates:
+        token = claim = message = None
+        if index in claims:
+            # Stateless token: (nonce, expires_at) claim, checked for replay
+            claim, message = claims[index]
+            if claim and (claim[0] in used_nonces or hashed in used_hashes):
+                message = "Token already used"
+        else:
+            token = tokens.get((user_id, challenge_id, hashed))
+            if token is None:
+                message = "Token not found or invalid"
+            elif token.used or hashed in used_hashes:
+                message = "Token already used"
+            elif token.expires_at < now:
+                message = "Token expired"
+        if message is None and user_id not in users:
+            message = "User not found"
+        elif message is None and challenge_id not in challenges:
+            message = "Challenge not found"
+        if message:
+            results[index] = {"index": index, "success": False, "message": message}
+            continue
+
+        provided_flag = flag.strip()
+        is_correct = matchers[challenge_id].matches(provided_flag)
+        if is_correct and (user_id, challenge_id) in solved:
+            results[index] = {"index": index, "success": False, "message": "Challenge already solved"}
+            continue
+        if is_correct:
+            solved.add((user_id, challenge_id))
+        used_hashes.add(hashed)
+        accepted.append((index, user_id, challenge_id, token, claim, provided_flag, is_correct))
+
+    if not accepted:
+        return results
+
+    # Spend the stored tokens first: a concurrent request may have used one
+    # since it was loaded, and only the request whose UPDATE flips it wins
+    try:
+        lost = spend_tokens([entry[3].id for entry in accepted if entry[3] is not None], now)
+    except Exception:
+        db.session.rollback()
+        raise
+    if lost:
+        for entry in accepted:
+            if entry[3] is not None and entry[3].id in lost:
+                results[entry[0]] = {"index": entry[0], "success": False, "message": "Token already used"}
+        accepted = [entry for entry in accepted if entry[3] is None or entry[3].id not in lost]
+        if not accepted:
+            db.session.rollback()
+            return results
+
+    # Whole seconds, so the id lookup below matches on databases that drop
+    # fractional seconds
+    submitted_at = now.replace(microsecond=0)
+    try:
+        # One executemany for the submissions (return_defaults would insert
+        # row by row to fetch ids), then one SELECT for their ids
+        db.session.bulk_insert_mappings(Submissions, [
+            {
+                "user_id": user_id,
+                "team_id": users[user_id].team_id,
+                "challenge_id": challenge_id,
+                "ip": '127.0.0.1',  # Internal submission
+                "provided": provided_flag,
+                "date": submitted_at,
+                "type": "correct" if is_correct else "incorrect",
+            }
+            for index, user_id, challenge_id, token, claim, provided_flag, is_correct in accepted
+        ])
+        new_ids = {}
+        for submission_id, user_id, challenge_id, provided in (
+            db.session.query(Submissions.id, Submissions.user_id, Submissions.challenge_id, Submissions.provided)
+            .filter(Submissions.user_id.in_({entry[1] for entry in accepted}))
+            .filter(Submissions.challenge_id.in_({entry[2] for entry in accepted}))
+            .filter(Submissions.date == submitted_at, Submissions.ip == '127.0.0.1')
+            .filter(~exists().where(MarkingSubmission.submission_id == Submissions.id))
+            .order_by(Submissions.id)
+        ):
+            new_ids.setdefault((user_id, challenge_id, provided), []).append(submission_id)
+        # Identical attempts in one batch each take one of the matching ids
+        submission_ids = [new_ids[(entry[1], entry[2], entry[5])].pop() for entry in accepted]
+        # Solves' joined table, keyed by the submission id
+        solve_rows = [
+            {"id": submission_id, "user_id": entry[1], "team_id": users[entry[1]].team_id, "challenge_id": entry[2]}
+            for entry, submission_id in zip(accepted, submission_ids)
+            if entry[6]
+        ]
+        if solve_rows:
+            db.session.execute(Solves.__table__.insert(), solve_rows)
+        marking_rows = []
+        for (index, user_id, challenge_id, token, claim, provided_flag, is_correct), submission_id in zip(
+            accepted, submission_ids
+        ):
+            challenge = challenges[challenge_id]
+            row = {"submission_id": submission_id, "mark": None, "comment": None}
+            # Auto-mark TECH submissions
+            if _is_technical(challenge.name):
+                row["mark"] = challenge.value if is_correct else 0
+                row["marked_at"] = now
+            marking_rows.append(row)
+        db.session.bulk_insert_mappings(MarkingSubmission, marking_rows)
+        used = [{"nonce": entry[4][0], "expires_at": entry[4][1], "used_at": now} for entry in accepted if entry[4]]
+        if used:
+            db.session.bulk_insert_mappings(UsedTokenNonce, used)
+        prune_used_nonces()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_timeseries_at(now)
+    try:
+        refresh_for_marks({entry[2] for entry in accepted})
+    except Exception as e:
+        logger.error(f"Failed to refresh statistics snapshot: {e}")
+
+    for (index, user_id, challenge_id, token, claim, provided_flag, is_correct), submission_id in zip(
+        accepted, submission_ids
+    ):
+        results[index] = {
+            "index": index,
+            "success": True,
+            "submission_id": submission_id,
+            "user_id": user_id,
+            "user_name": users[user_id].name,
+            "challenge_id": challenge_id,
+            "challenge_name": challenges[challenge_id].name,
+            "correct": is_correct,
+            "submitted_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    logger.info(f"Recorded {len(accepted)} of {len(items)} on-behalf submissions")
+    return results
@@ -0,0 +1,278 @@
+"""
+Time-bucketed marking throughput and backlog series.
+
+Buckets are formed in SQL (``strftime``/``DATE_FORMAT``/``to_char`` depending
+on the database) so each series is one grouped query.  Buckets that have
+closed (ended before now) are cached in CTFd's cache; only open or
+not-yet-cached buckets are queried.
+
+A closed bucket can still change: a re-mark moves a row out of the bucket of
+its old ``marked_at``, and sync inserts marking rows dated by old submission
+dates.  Saving a mark or recording a submission drops the buckets of the
+times involved (:func:`invalidate_timeseries_at`); bulk changes bump a version
+token that is part of every key (:func:`invalidate_timeseries`).
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from CTFd.cache import cache
+from CTFd.models import db
+from sqlalchemy import func, case, literal, and_, or_, select, union_all
+from ..models import MarkingSubmission
+
+# granularity -> (bucket width, Python/SQLite label format, PostgreSQL label format)
+GRANULARITIES = {
+    "hour": (timedelta(hours=1), "%Y-%m-%d %H:00", "YYYY-MM-DD HH24:00"),
+    "day": (timedelta(days=1), "%Y-%m-%d", "YYYY-MM-DD"),
+}
+
+# Refuse ranges that would produce more buckets than this
+MAX_BUCKETS = 2000
+
+# Cached closed buckets also expire on their own, which bounds staleness
+# from changes made outside the plugin (e.g. challenge categories)
+CLOSED_BUCKET_TIMEOUT = 6 * 60 * 60
+
+_KEY_PREFIX = "marking_hub:timeseries"
+_VERSION_KEY = f"{_KEY_PREFIX}:version"
+SERIES = ("throughput", "backlog")
+
+
+def _version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(_VERSION_KEY, version, timeout=0)
+    return version
+
+
+def _key(series, granularity, label, version):
+    return f"{_KEY_PREFIX}:{version}:{series}:{granularity}:{label}"
+
+
+def invalidate_timeseries():
+    """Drop every cached bucket (bulk marking changes)."""
+    cache.set(_VERSION_KEY, uuid.uuid4().hex, timeout=0)
+
+
+def invalidate_timeseries_at(*moments):
+    """Drop the cached buckets, of every series and granularity, containing *moments*."""
+    version = _version()
+    keys = [
+        _key(series, granularity, moment.strftime(fmt), version)
+        for moment in moments if moment is not None
+        for series in SERIES
+        for granularity, (_, fmt, _) in GRANULARITIES.items()
+    ]
+    if keys:
+        cache.delete_many(*keys)
+
+
+def _floor(dt, granularity):
+    if granularity == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_expr(column, granularity):
+    """SQL expression labelling *column* with its bucket, per dialect."""
+    _, fmt, pg_fmt = GRANULARITIES[granularity]
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        return func.strftime(fmt, column)
+    if dialect in ("mysql", "mariadb"):
+        return func.date_format(column, fmt)
+    if dialect == "postgresql":
+        return func.to_char(column, pg_fmt)
+    raise ValueError(f"Time series are not supported on {dialect}")
+
+
+def _buckets(start, end, granularity):
+    """List of (label, bucket_start) covering [start, end)."""
+    step, fmt, _ = GRANULARITIES[granularity]
+    buckets = []
+    current = _floor(start, granularity)
+    while current < end:
+        buckets.append((current.strftime(fmt), current))
+        current += step
+        if len(buckets) > MAX_BUCKETS:
+            raise ValueError(f"Range too large: more than {MAX_BUCKETS} {granularity} buckets")
+    return buckets
+
+
+def _missing_runs(buckets, cached, granularity):
+    """Contiguous (start, end) ranges of buckets not found in *cached*."""
+    step = GRANULARITIES[granularity][0]
+    runs = []
+    for label, bucket_start in buckets:
+        if label in cached:
+            continue
+        if runs and runs[-1][1] == bucket_start:
+            runs[-1] = (runs[-1][0], bucket_start + step)
+        else:
+            runs.append((bucket_start, bucket_start + step))
+    return runs
+
+
+def _window(column, runs):
+    return or_(*[and_(column >= run_start, column < run_end) for run_start, run_end in runs])
+
+
+def _load_cached(series, granularity, buckets, version):
+    keys = [_key(series, granularity, label, version) for label, _ in buckets]
+    values = cache.get_many(*keys) if keys else []
+    return {label: value for (label, _), value in zip(buckets, values) if value is not None}
+
+
+def _store_closed(series, granularity, buckets, computed, now, version):
+    step = GRANULARITIES[granularity][0]
+    closed = {
+        _key(series, granularity, label, version): computed.get(label, {})
+        for label, bucket_start in buckets
+        if bucket_start + step <= now
+    }
+    if closed:
+        cache.set_many(closed, timeout=CLOSED_BUCKET_TIMEOUT)
+
+
+def get_throughput_series(start, end, granularity="hour"):
+    """
+    Marks saved per bucket per marker.
+
+    Args:
+        start (datetime): Range start (UTC, inclusive)
+        end (datetime): Range end (UTC, exclusive)
+        granularity (str): "hour" or "day"
+
+    Returns:
+        dict: {"buckets": [labels], "tutors": [{"tutor_id", "tutor_name", "counts"}]}
+    """
+    from CTFd.models import Users
+
+    now = datetime.utcnow()
+    buckets = _buckets(start, end, granularity)
+    version = _version()
+    cached = _load_cached("throughput", granularity, buckets, version)
+    runs = _missing_runs(buckets, cached, granularity)
+
+    computed = {}
+    if runs:
+        # Group by label so the bound format string isn't repeated (PostgreSQL
+        # treats two copies of a parameterised expression as different)
+        bucket = _bucket_expr(MarkingSubmission.marked_at, granularity).label("bucket")
+        rows = (
+            db.session.query(bucket, MarkingSubmission.marked_by, func.count(MarkingSubmission.id))
+            .filter(MarkingSubmission.mark.isnot(None))
+            .filter(MarkingSubmission.marked_by.isnot(None))
+            .filter(_window(MarkingSubmission.marked_at, runs))
+            .group_by("bucket", MarkingSubmission.marked_by)
+            .all()
+        )
+        for label, marked_by, count in rows:
+            computed.setdefault(label, {})[marked_by] = count
+        _store_closed("throughput", granularity, [b for b in buckets if b[0] not in cached], computed, now, version)
+
+    per_bucket = [cached.get(label) or computed.get(label, {}) for label, _ in buckets]
+    tutor_ids = sorted({tid for counts in per_bucket for tid in counts})
+    names = dict(
+        db.session.query(Users.id, Users.name).filter(Users.id.in_(tutor_ids)).all()
+    ) if tutor_ids else {}
+
+    return {
+        "buckets": [label for label, _ in buckets],
+        "tutors": [
+            {
+                "tutor_id": tid,
+                "tutor_name": names.get(tid) or "Unknown",
+                "counts": [counts.get(tid, 0) for counts in per_bucket],
+            }
+            for tid in tutor_ids
+        ],
+    }
+
+
+def get_backlog_series(start, end, granularity="day", category=None):
+    """
+    Unmarked backlog per category at the end of each bucket.
+
+    Inflow counts marking entries by submission date and outflow counts
+    marked entries by ``marked_at``; the backlog is the opening backlog at
+    *start* plus the running difference.  Inflow, outflow and the opening
+    backlog come from one ``UNION ALL`` query.
+
+    Args:
+        start (datetime): Range start (UTC, inclusive)
+        end (datetime): Range end (UTC, exclusive)
+        granularity (str): "hour" or "day"
+        category (str): Optional category to restrict the output to
+
+    Returns:
+        dict: {"buckets": [labels], "categories": [{"category", "inflow", "outflow", "backlog"}]}
+    """
+    from CTFd.models import Submissions, Challenges
+
+    now = datetime.utcnow()
+    buckets = _buckets(start, end, granularity)
+    opening_start = buckets[0][1] if buckets else start
+    version = _version()
+    cached = _load_cached("backlog", granularity, buckets, version)
+    runs = _missing_runs(buckets, cached, granularity)
+
+    category_expr = func.coalesce(Challenges.category, "Uncategorized")
+
+    def flow(column, inflow):
+        # Rows before the range collapse into the '' bucket: the opening backlog
+        bucket = case((column < opening_start, literal("")), else_=_bucket_expr(column, granularity))
+        window = column < opening_start
+        if runs:
+            window = or_(window, _window(column, runs))
+        query = (
+            select(
+                category_expr.label("category"),
+                bucket.label("bucket"),
+                (func.count(MarkingSubmission.id) if inflow else literal(0)).label("inflow"),
+                (literal(0) if inflow else func.count(MarkingSubmission.id)).label("outflow"),
+            )
+            .select_from(MarkingSubmission)
+            .join(Submissions, MarkingSubmission.submission_id == Submissions.id)
+            .join(Challenges, Submissions.challenge_id == Challenges.id)
+            .where(window)
+            .group_by("category", "bucket")
+        )
+        if not inflow:
+            query = query.where(MarkingSubmission.mark.isnot(None))
+        return query
+
+    rows = db.session.execute(
+        union_all(flow(Submissions.date, True), flow(MarkingSubmission.marked_at, False))
+    ).fetchall()
+
+    opening = {}
+    computed = {}
+    for cat, label, inflow, outflow in rows:
+        if label == "":
+            opening[cat] = opening.get(cat, 0) + inflow - outflow
+            continue
+        flows = computed.setdefault(label, {}).setdefault(cat, [0, 0])
+        flows[0] += inflow
+        flows[1] += outflow
+    if runs:
+        _store_closed("backlog", granularity, [b for b in buckets if b[0] not in cached], computed, now, version)
+
+    per_bucket = [cached.get(label) or computed.get(label, {}) for label, _ in buckets]
+    categories = sorted(set(opening) | {cat for flows in per_bucket for cat in flows})
+    if category is not None:
+        categories = [cat for cat in categories if cat == category]
+
+    series = []
+    for cat in categories:
+        inflow = [flows.get(cat, (0, 0))[0] for flows in per_bucket]
+        outflow = [flows.get(cat, (0, 0))[1] for flows in per_bucket]
+        backlog = []
+        running = opening.get(cat, 0)
+        for bucket_in, bucket_out in zip(inflow, outflow):
+            running += bucket_in - bucket_out
+            backlog.append(running)
+        series.append({"category": cat, "inflow": inflow, "outflow": outflow, "backlog": backlog})
+
+    return {"buckets": [label for label, _ in buckets], "categories": series}
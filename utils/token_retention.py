@@ -0,0 +1,168 @@
+"""
+Retention for submission tokens.
+
+Used and expired tokens can never be redeemed again, so once they are older
+than the retention window they are deleted.  Compaction selects a bounded
+batch of primary keys and deletes them in its own short transaction, again
+and again until nothing is left, so the table is never locked for long and
+concurrent issuance keeps flowing.  Expired stateless-token nonces are pruned
+in the same run.
+
+Token issuance starts a compaction in the background at most once per
+interval across all workers (claimed through CTFd's cache); the outcome of
+the last run is kept there too for the admin status endpoint.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from CTFd.cache import cache
+from CTFd.models import db
+from sqlalchemy import and_, case, func, or_
+from ..models import SubmissionToken, UsedTokenNonce
+from .submission_tokens import prune_used_nonces
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tokens deleted per transaction
+COMPACTION_BATCH_SIZE = 1000
+
+_LAST_RUN_KEY = "marking_hub:token_compaction:last"
+_CLAIM_KEY = "marking_hub:token_compaction:claim"
+
+_next_check = 0.0
+
+
+def _removable(cutoff):
+    used_at = func.coalesce(SubmissionToken.used_at, SubmissionToken.created_at)
+    return or_(
+        and_(SubmissionToken.used.is_(True), used_at < cutoff),
+        SubmissionToken.expires_at < cutoff,
+    )
+
+
+def compact_tokens(retention_hours, batch_size=COMPACTION_BATCH_SIZE, max_batches=None):
+    """
+    Delete used and expired tokens older than the retention window.
+
+    Args:
+        retention_hours (float): How long used/expired tokens are kept
+        batch_size (int): Tokens deleted per transaction
+        max_batches (int): Stop after this many batches (None = until done)
+
+    Returns:
+        dict: summary of the run (also stored as the last compaction)
+    """
+    started = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    deleted = 0
+    batches = 0
+    complete = False
+    try:
+        while max_batches is None or batches < max_batches:
+            ids = [
+                row[0] for row in
+                db.session.query(SubmissionToken.id)
+                .filter(_removable(cutoff))
+                .order_by(SubmissionToken.id)
+                .limit(batch_size)
+                .all()
+            ]
+            if not ids:
+                complete = True
+                break
+            SubmissionToken.query.filter(SubmissionToken.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += len(ids)
+            batches += 1
+        nonces = prune_used_nonces(force=True)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    result = {
+        "finishedAt": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "cutoff": cutoff.strftime("%Y-%m-%d %H:%M:%S"),
+        "tokensDeleted": deleted,
+        "noncesDeleted": nonces,
+        "batches": batches,
+        "complete": complete,
+        "durationSeconds": round(time.monotonic() - started, 3),
+    }
+    cache.set(_LAST_RUN_KEY, result, timeout=0)
+    logger.info(f"Token compaction deleted {deleted} tokens and {nonces} nonces in {batches} batches")
+    return result
+
+
+def last_compaction():
+    """Summary of the last compaction run by any worker, or None."""
+    return cache.get(_LAST_RUN_KEY)
+
+
+def token_table_stats():
+    """
+    Row counts of the token tables.
+
+    Returns:
+        dict: total, used, expired (unused) tokens and stored nonces
+    """
+    now = datetime.utcnow()
+    total, used, expired = db.session.query(
+        func.count(SubmissionToken.id),
+        func.coalesce(func.sum(case((SubmissionToken.used.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(case(
+            (and_(SubmissionToken.used.isnot(True), SubmissionToken.expires_at < now), 1), else_=0
+        )), 0),
+    ).one()
+    nonces = db.session.query(func.count(UsedTokenNonce.nonce)).scalar()
+    return {
+        "tokens": total,
+        "usedTokens": int(used),
+        "expiredTokens": int(expired),
+        "usedNonces": nonces,
+    }
+
+
+def start_token_compaction(app, force=False):
+    """
+    Compact the token tables on a background thread when one is due.
+
+    A run is due once per ``MARKING_HUB_TOKEN_COMPACTION_INTERVAL`` seconds
+    across all workers (0 disables automatic runs); *force* starts one
+    regardless.
+
+    Args:
+        app: Flask app (the thread needs its own app context)
+        force (bool): Start even if a run happened within the interval
+
+    Returns:
+        bool: whether a run was started
+    """
+    global _next_check
+
+    interval = app.config['MARKING_HUB_TOKEN_COMPACTION_INTERVAL']
+    if force:
+        cache.set(_CLAIM_KEY, True, timeout=max(interval, 1))
+    elif interval <= 0:
+        return False
+    else:
+        # Skip the cache round trip while this worker knows nothing is due
+        if time.monotonic() < _next_check:
+            return False
+        _next_check = time.monotonic() + min(interval, 60)
+        if not cache.add(_CLAIM_KEY, True, timeout=interval):
+            return False
+
+    def run():
+        with app.app_context():
+            try:
+                compact_tokens(app.config['MARKING_HUB_TOKEN_RETENTION_HOURS'])
+            except Exception as e:
+                logger.exception(f"Token compaction failed: {e}")
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name="token-compaction", daemon=True).start()
+    return True